@@ -0,0 +1 @@
+"""Offline benchmarks; run each with ``python -m benchmarks.<name>`` from the repo root."""
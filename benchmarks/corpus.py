@@ -0,0 +1,137 @@
+"""Deterministic synthetic medical documents for offline benchmarks.
+
+Every report is generated from a seed, so runs on different machines see the
+same text, chunk boundaries and queries.
+"""
+import random
+
+LAB_TESTS = (
+    ("HbA1c", "%", 4.5, 9.5, "long-term blood sugar"),
+    ("Fasting glucose", "mg/dL", 70, 180, "blood sugar after fasting"),
+    ("LDL cholesterol", "mg/dL", 60, 200, "bad cholesterol"),
+    ("HDL cholesterol", "mg/dL", 30, 90, "good cholesterol"),
+    ("Triglycerides", "mg/dL", 50, 400, "blood fats"),
+    ("TSH", "mIU/L", 0.3, 6.0, "thyroid function"),
+    ("Creatinine", "mg/dL", 0.5, 1.6, "kidney function"),
+    ("Vitamin D", "ng/mL", 10, 80, "vitamin D level"),
+    ("Hemoglobin", "g/dL", 10, 18, "red blood cell oxygen carrier"),
+    ("ALT", "U/L", 7, 80, "liver enzyme"),
+)
+
+BOILERPLATE = (
+    "This report is intended for the ordering clinician. Results should be interpreted in the context of the "
+    "patient's clinical history, physical examination and other laboratory findings. Reference intervals are "
+    "method-specific and were established on a healthy adult population.",
+    "Specimen collected by venipuncture. Sample integrity was verified on receipt. Tests marked with an asterisk "
+    "were performed by a referral laboratory accredited under ISO 15189.",
+    "If you have questions about these results, please contact your healthcare provider. Do not change your "
+    "medication without consulting your doctor.",
+)
+
+NOTES = (
+    "Patient reports improved energy levels since starting a regular walking routine.",
+    "Advised to reduce intake of refined carbohydrates and sugary drinks.",
+    "Blood pressure measured at {sys}/{dia} mmHg in the clinic, seated, after five minutes of rest.",
+    "Follow-up visit recommended in {weeks} weeks to review medication tolerance.",
+    "Family history of type 2 diabetes and coronary artery disease noted.",
+    "Sleep averages {sleep} hours per night; patient describes moderate work-related stress.",
+)
+
+
+def synthetic_report(seed, pages=1):
+    """Return ``(page_texts, facts)`` where ``facts`` maps test name -> result line."""
+    rng = random.Random(seed)
+    facts = {}
+    page_texts = []
+    for page in range(pages):
+        lines = [f"Laboratory Report - Patient #{seed:05d} - Page {page + 1} of {pages}", rng.choice(BOILERPLATE)]
+        for name, unit, low, high, _ in rng.sample(LAB_TESTS, k=min(len(LAB_TESTS), 4 + page % 3)):
+            value = round(rng.uniform(low, high), 1)
+            line = f"{name}: {value} {unit} (reference {low}-{high})"
+            facts.setdefault(name, line)
+            lines.append(line)
+        for note in rng.sample(NOTES, k=3):
+            lines.append(note.format(
+                sys=rng.randint(105, 160), dia=rng.randint(65, 100), weeks=rng.choice((4, 6, 8, 12)),
+                sleep=rng.choice((5, 6, 7, 8)),
+            ))
+        lines.extend(BOILERPLATE)
+        page_texts.append("\n".join(lines))
+    return page_texts, facts
+
+
+def retrieval_cases(documents=5, pages=3, seed=7):
+    """Yield ``(document_text, queries)``; each query is ``(question, expected_substring)``."""
+    for doc in range(documents):
+        page_texts, facts = synthetic_report(seed + doc, pages)
+        queries = []
+        for name, unit, _, _, description in LAB_TESTS:
+            if name not in facts:
+                continue
+            expected = facts[name].split(" (reference")[0]
+            queries.append((f"What was my {name}?", expected))
+            queries.append((f"How does my {description} look in this report?", expected))
+        yield "\n\n".join(page_texts), queries
+
+
+def sample_profile(seed=0):
+    """A survey export (as written by pages/health_survey.py) drawn from the survey's options."""
+    rng = random.Random(seed)
+    return {
+        "age": rng.randint(18, 85),
+        "gender": rng.choice(["Male", "Female", "Other"]),
+        "height": rng.randint(150, 200),
+        "weight": rng.randint(45, 130),
+        "exercise": rng.choice(["Never", "1-2 times a week", "3-5 times a week", "Daily"]),
+        "sleep": rng.choice(["Less than 5", "5-7", "7-9", "More than 9"]),
+        "water": rng.choice(["Less than 1L", "1-2L", "More than 2L"]),
+        "diet": rng.choice(["Balanced", "Mostly Junk", "High in Sugar", "High in Processed Foods", "Vegetarian", "Vegan"]),
+        "alcohol": rng.choice(["No", "Occasionally", "Frequently"]),
+        "smoking": rng.choice(["No", "Occasionally", "Yes"]),
+        "chronic_conditions": rng.sample(["Diabetes", "Hypertension", "Heart Disease"], k=rng.randint(0, 2)) or ["None"],
+        "allergies": rng.choice(["Yes", "No"]),
+        "family_history": rng.sample(["Diabetes", "Heart disease", "Hypertension"], k=rng.randint(0, 2)) or ["None"],
+        "stress_level": rng.randint(1, 10),
+        "mental_health": rng.choice(["Yes", "No", "Occasionally"]),
+        "medications": [{"name": "Metformin", "dosage": "850mg", "frequency": "Twice a day"}] if rng.random() < 0.3 else [],
+        "supplements": rng.sample(["Vitamin D", "Omega-3", "Magnesium"], k=rng.randint(0, 2)),
+        "health_goals": rng.sample(["Improve energy levels", "Reduce stress", "Lose weight", "Sleep better"], k=2),
+    }
+
+
+def write_reference_corpus(folder, documents=20, pages=3, seed=0):
+    """Write ``documents`` synthetic reports as Markdown files into ``folder``; returns ``folder``."""
+    import os
+
+    os.makedirs(folder, exist_ok=True)
+    for doc in range(documents):
+        page_texts, _ = synthetic_report(seed + doc, pages)
+        with open(os.path.join(folder, f"report_{doc:03d}.md"), "w", encoding="utf-8") as out:
+            out.write("\n\n".join(page_texts))
+    return folder
+
+
+def nurse_queries():
+    """Symptom lookups a nurse agent would make, with near-duplicate phrasings."""
+    return [
+        "fasting glucose high",
+        "Fasting glucose HIGH?",
+        "ldl cholesterol reference range",
+        "LDL cholesterol - reference range",
+        "thyroid function TSH",
+        "kidney function creatinine",
+    ]
+
+
+def synthetic_pdf(pages, seed=0):
+    """Render ``pages`` pages of synthetic reports to PDF bytes (requires PyMuPDF)."""
+    import fitz
+
+    page_texts, _ = synthetic_report(seed, pages)
+    doc = fitz.open()
+    for text in page_texts:
+        page = doc.new_page()
+        page.insert_textbox(fitz.Rect(50, 50, 550, 800), text, fontsize=9)
+    data = doc.tobytes()
+    doc.close()
+    return data
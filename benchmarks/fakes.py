@@ -0,0 +1,141 @@
+"""Deterministic local stand-ins for the OpenAI LLM and embedder.
+
+``FakeLLM`` answers every prompt with pseudo-random but reproducible text in
+the ReAct "Final Answer" format CrewAI agents expect (or, when asked for a
+structured response, JSON filled with such text), after a configurable
+latency. ``FakeEmbeddings`` is the offline hashing embedder with an added
+per-request and per-text delay, to model a remote embedding API.
+``FakeSearchBackend`` models a web search API for ``health_twin.search``.
+"""
+import hashlib
+import json
+import random
+import threading
+import time
+import typing
+
+from crewai import BaseLLM
+from crewai.events.types.llm_events import LLMCallType
+from crewai.llms.base_llm import llm_call_context
+
+from health_twin.embeddings import HashingEmbeddings
+
+_WORDS = (
+    "sleep hydration exercise balanced diet stress blood pressure glucose cholesterol risk prevention "
+    "screening weight activity routine vegetables fiber protein recovery mindfulness check-up heart "
+    "metabolic habits goals weekly daily moderate improve reduce maintain monitor"
+).split()
+
+
+def _fake_value(annotation, rng, words):
+    """A value of type ``annotation`` (str, Literal, list or pydantic model) made of random words."""
+    origin = typing.get_origin(annotation)
+    if origin is typing.Literal:
+        return rng.choice(typing.get_args(annotation))
+    if origin is list:
+        (item,) = typing.get_args(annotation)
+        return [_fake_value(item, rng, words) for _ in range(3)]
+    if hasattr(annotation, "model_fields"):
+        return {name: _fake_value(field.annotation, rng, words) for name, field in annotation.model_fields.items()}
+    return " ".join(rng.choice(_WORDS) for _ in range(words))
+
+
+def _text_fields(annotation):
+    """Number of free-text values in a ``_fake_value`` of ``annotation``."""
+    origin = typing.get_origin(annotation)
+    if origin is typing.Literal:
+        return 0
+    if origin is list:
+        return 3 * _text_fields(typing.get_args(annotation)[0])
+    if hasattr(annotation, "model_fields"):
+        return sum(_text_fields(field.annotation) for field in annotation.model_fields.values())
+    return 1
+
+
+class FakeLLM(BaseLLM):
+    def __init__(self, latency=0.05, tokens=200, tokens_per_second=0.0, model="fake-llm"):
+        super().__init__(model=model)
+        self.latency = latency
+        self.tokens = tokens
+        self.tokens_per_second = tokens_per_second
+        self.calls = 0
+        self.prompt_tokens = 0
+        self._lock = threading.Lock()
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, from_task=None,
+             from_agent=None, response_model=None, **kwargs):
+        if isinstance(messages, str):
+            prompt = messages
+        else:
+            prompt = "\n".join(str(m.get("content", "")) for m in messages)
+        prompt_tokens = len(prompt.split())
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += prompt_tokens
+        # Emit the same call events as a real LLM, so telemetry sees durations and usage
+        with llm_call_context():
+            self._emit_call_started_event(messages=messages, from_task=from_task, from_agent=from_agent)
+            rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).digest())
+            delay = self.latency + (self.tokens / self.tokens_per_second if self.tokens_per_second else 0.0)
+            time.sleep(delay)
+            if response_model is not None:
+                # Every text field gets an equal share of the answer length
+                words = max(1, self.tokens // max(1, _text_fields(response_model)))
+                response = json.dumps(_fake_value(response_model, rng, words))
+            else:
+                text = " ".join(rng.choice(_WORDS) for _ in range(self.tokens))
+                response = f"Thought: I now can give a great answer\nFinal Answer: {text}"
+            self._emit_call_completed_event(
+                response=response,
+                call_type=LLMCallType.LLM_CALL,
+                from_task=from_task,
+                from_agent=from_agent,
+                messages=messages,
+                usage={"prompt_tokens": prompt_tokens, "completion_tokens": self.tokens},
+            )
+        return response
+
+    def supports_function_calling(self):
+        return False
+
+    def supports_stop_words(self):
+        return True
+
+    def get_context_window_size(self):
+        return 128000
+
+
+class FakeEmbeddings(HashingEmbeddings):
+    def __init__(self, dim=512, request_latency=0.02, per_text_latency=0.0005):
+        super().__init__(dim)
+        self.model = f"fake-{dim}"
+        self.request_latency = request_latency
+        self.per_text_latency = per_text_latency
+        self.requests = 0
+
+    def embed_documents(self, texts):
+        self.requests += 1
+        time.sleep(self.request_latency + self.per_text_latency * len(texts))
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        self.requests += 1
+        time.sleep(self.request_latency)
+        return super().embed_query(text)
+
+
+class FakeSearchBackend:
+    name = "fake-search"
+
+    def __init__(self, latency=0.3, words=80):
+        self.latency = latency
+        self.words = words
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def search(self, query):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        rng = random.Random(hashlib.sha256(query.encode("utf-8")).digest())
+        return " ".join(rng.choice(_WORDS) for _ in range(self.words))
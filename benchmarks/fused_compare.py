@@ -0,0 +1,135 @@
+"""Two-task versus fused (single structured call) crews, side by side.
+
+Runs the analysis and risk crews in both modes over the same sample profiles
+and reports, per crew and mode, the median latency, LLM calls and prompt and
+completion tokens (from the request traces), plus a rubric score of the
+report as the page shows it (every task's output in two-task mode, the
+rendered structured answer in fused mode)::
+
+    python -m benchmarks.fused_compare
+    python -m benchmarks.fused_compare --live --profiles 5 --output fused.json
+
+The rubric checks that a report covers every section the page promises
+(sleep and stress, diet, exercise and hydration, prevention and check-ups),
+names each chronic condition and family-history risk of the profile, and is
+long enough to be useful. Offline runs use ``benchmarks.fakes.FakeLLM``,
+whose answers are random words: they measure latency and token spend only.
+Use ``--live`` (needs ``OPENAI_API_KEY``) to compare quality.
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+os.environ["HEALTH_TWIN_CACHE_DIR"] = tempfile.mkdtemp(prefix="health-twin-fused-")
+os.environ.setdefault("HEALTH_TWIN_AGENT_MEMORY", "0")
+os.environ.setdefault("HEALTH_TWIN_STREAM_LLM", "0")
+
+from benchmarks.corpus import sample_profile  # noqa: E402
+from health_twin import agents, crews, telemetry  # noqa: E402
+from health_twin.profile import HealthProfile  # noqa: E402
+from health_twin.scoring import score_profile  # noqa: E402
+
+# crew -> (two-task specs, fused specs)
+CREWS = {
+    "analysis": (crews.analysis_task_specs, crews.fused_analysis_task_specs),
+    "risk": (crews.risk_task_specs, crews.fused_risk_task_specs),
+}
+
+# Sections a report must cover, each satisfied by any of its keywords
+SECTIONS = {
+    "sleep_stress": ("sleep", "stress"),
+    "diet": ("diet", "nutrition", "food", "meal"),
+    "exercise_hydration": ("exercise", "activity", "hydration", "water"),
+    "prevention": ("check-up", "checkup", "screening", "prevent"),
+}
+MIN_WORDS = 150
+
+
+def rubric(report, health_data):
+    """Share of rubric checks ``report`` passes, and the names of those it misses."""
+    text = report.lower()
+    checks = {f"covers_{name}": any(word in text for word in words) for name, words in SECTIONS.items()}
+    score = score_profile(health_data)
+    for condition in score["chronic_conditions"] + score["family_history"]:
+        checks[f"names_{condition.lower().replace(' ', '_')}"] = condition.lower().split()[0] in text
+    checks["long_enough"] = len(report.split()) >= MIN_WORDS
+    missed = sorted(name for name, passed in checks.items() if not passed)
+    return 1 - len(missed) / len(checks), missed
+
+
+def run_mode(make_specs, profile, health_data):
+    specs = make_specs(profile)
+    with telemetry.request("fused_compare") as trace:
+        started = time.perf_counter()
+        crew, output = crews.kickoff(specs, profile)
+        seconds = time.perf_counter() - started
+    calls = trace.breakdown().get("llm.call", {})
+    if crews.output_model(specs):
+        report = crews.render_result(specs, crews.output_text(output))
+    else:
+        # The page shows every task's output (analysis, then plan), not only the last one
+        report = "\n\n".join(task.output.raw for task in crew.tasks if task.output)
+    quality, missed = rubric(report, health_data)
+    return {
+        "ms": seconds * 1000,
+        "llm_calls": calls.get("count", 0),
+        "prompt_tokens": calls.get("prompt_tokens", 0),
+        "completion_tokens": calls.get("completion_tokens", 0),
+        "quality": quality,
+        "missed": missed,
+    }
+
+
+def run(profiles, names=tuple(CREWS)):
+    samples = [sample_profile(seed) for seed in range(profiles)]
+    rows = []
+    for name in names:
+        for mode, make_specs in zip(("two_task", "fused"), CREWS[name]):
+            results = [run_mode(make_specs, HealthProfile.from_dict(data), data) for data in samples]
+            missed = sorted({check for result in results for check in result["missed"]})
+            rows.append({
+                "crew": name,
+                "mode": mode,
+                "latency_ms_p50": round(statistics.median(r["ms"] for r in results), 3),
+                "llm_calls": round(statistics.mean(r["llm_calls"] for r in results), 2),
+                "prompt_tokens": round(statistics.mean(r["prompt_tokens"] for r in results), 1),
+                "completion_tokens": round(statistics.mean(r["completion_tokens"] for r in results), 1),
+                "quality": round(statistics.mean(r["quality"] for r in results), 3),
+                "missed": missed,
+            })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the two-task and fused analysis and risk crews.")
+    parser.add_argument("--profiles", type=int, default=3, help="Sample profiles per crew and mode")
+    parser.add_argument("--crews", nargs="+", choices=sorted(CREWS), default=sorted(CREWS))
+    parser.add_argument("--live", action="store_true", help="Call the configured OpenAI model instead of FakeLLM")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="FakeLLM seconds per call")
+    parser.add_argument("--llm-tokens", type=int, default=300, help="FakeLLM completion tokens per call")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    if not args.live:
+        from benchmarks.fakes import FakeLLM
+
+        agents.set_llm_factory(lambda: FakeLLM(latency=args.llm_latency, tokens=args.llm_tokens))
+
+    rows = run(args.profiles, args.crews)
+    print(f"{'crew':>8} {'mode':>8} {'p50 ms':>9} {'calls':>5} {'prompt':>7} {'compl.':>7} {'quality':>7}")
+    for row in rows:
+        print(
+            f"{row['crew']:>8} {row['mode']:>8} {row['latency_ms_p50']:>9.1f} {row['llm_calls']:>5.1f} "
+            f"{row['prompt_tokens']:>7.0f} {row['completion_tokens']:>7.0f} {row['quality']:>7.3f}"
+            + (f"  missed: {', '.join(row['missed'])}" if row["missed"] else "")
+        )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
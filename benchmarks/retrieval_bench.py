@@ -0,0 +1,115 @@
+"""Retrieval benchmark for the PDF chatbot.
+
+Indexes a fixed synthetic document set for every combination of chunk size,
+overlap and k, and reports recall@k and per-question latency for vector-only,
+BM25-only and hybrid retrieval::
+
+    python -m benchmarks.retrieval_bench
+    python -m benchmarks.retrieval_bench --embeddings openai --output retrieval.json
+
+Recall@k counts a question as answered when any retrieved chunk contains the
+expected result line. The default embedder is the offline hashing backend.
+"""
+import argparse
+import itertools
+import json
+import os
+import statistics
+import tempfile
+import time
+
+# Keep the embedding cache out of the real cache directory, so runs neither fill nor warm it
+os.environ["HEALTH_TWIN_CACHE_DIR"] = tempfile.mkdtemp(prefix="health-twin-retrieval-")
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter  # noqa: E402
+from langchain_community.vectorstores import FAISS  # noqa: E402
+
+from benchmarks.corpus import retrieval_cases  # noqa: E402
+from health_twin.embeddings import get_embeddings  # noqa: E402
+from health_twin.retrieval import BM25Index, HybridRetriever  # noqa: E402
+
+
+def _evaluate(search, queries):
+    hits, latencies = 0, []
+    for question, expected in queries:
+        started = time.perf_counter()
+        texts = search(question)
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += any(expected in text for text in texts)
+    return hits, latencies
+
+
+def run(chunk_sizes, overlaps, ks, embeddings, documents=5):
+    cases = list(retrieval_cases(documents))
+    rows = []
+    for chunk_size, overlap in itertools.product(chunk_sizes, overlaps):
+        if overlap >= chunk_size:
+            continue
+        splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=overlap)
+        indexed = []
+        index_ms = 0.0
+        for text, queries in cases:
+            started = time.perf_counter()
+            chunks = splitter.split_text(text)
+            bm25 = BM25Index()
+            for chunk in chunks:
+                bm25.add(chunk)
+            store = FAISS.from_texts(chunks, embeddings)
+            index_ms += (time.perf_counter() - started) * 1000
+            indexed.append((store, bm25, queries))
+
+        for k in ks:
+            totals = {mode: [0, []] for mode in ("vector", "bm25", "hybrid")}
+            total_queries = lexical_only = 0
+            for store, bm25, queries in indexed:
+                retriever = HybridRetriever(vector_store=store, bm25=bm25, k=k)
+                searches = {
+                    "vector": lambda q: [d.page_content for d in store.similarity_search(q, k=k)],
+                    "bm25": lambda q: [bm25.texts[i] for i, _ in bm25.search(q, k)],
+                    "hybrid": lambda q: [d.page_content for d in retriever.invoke(q)],
+                }
+                for mode, search in searches.items():
+                    hits, latencies = _evaluate(search, queries)
+                    totals[mode][0] += hits
+                    totals[mode][1].extend(latencies)
+                total_queries += len(queries)
+                lexical_only += retriever.lexical_only
+            for mode, (hits, latencies) in totals.items():
+                rows.append({
+                    "chunk_size": chunk_size,
+                    "chunk_overlap": overlap,
+                    "k": k,
+                    "mode": mode,
+                    "recall_at_k": round(hits / total_queries, 3),
+                    "latency_ms_p50": round(statistics.median(latencies), 3),
+                    "latency_ms_p95": round(sorted(latencies)[int(0.95 * (len(latencies) - 1))], 3),
+                    "index_ms": round(index_ms, 1),
+                    "embedding_calls_skipped": lexical_only if mode == "hybrid" else None,
+                })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark PDF chatbot retrieval settings.")
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[250, 500, 1000])
+    parser.add_argument("--overlaps", type=int, nargs="+", default=[0, 50, 100])
+    parser.add_argument("--k", type=int, nargs="+", default=[2, 4, 6])
+    parser.add_argument("--documents", type=int, default=5)
+    parser.add_argument("--embeddings", default="hashing", help="hashing (offline) or openai")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    rows = run(args.chunk_sizes, args.overlaps, args.k, get_embeddings(args.embeddings), args.documents)
+    print(f"{'size':>5} {'overlap':>7} {'k':>2} {'mode':>7} {'recall':>7} {'p50 ms':>8} {'p95 ms':>8}")
+    for row in rows:
+        print(
+            f"{row['chunk_size']:>5} {row['chunk_overlap']:>7} {row['k']:>2} {row['mode']:>7} "
+            f"{row['recall_at_k']:>7.3f} {row['latency_ms_p50']:>8.3f} {row['latency_ms_p95']:>8.3f}"
+        )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
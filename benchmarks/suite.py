@@ -0,0 +1,501 @@
+"""Offline performance suite for the crews, the nurse search, survey history, the PDF pipeline, page imports and reruns.
+
+Every benchmark runs against ``benchmarks.fakes`` (no OpenAI key or network
+needed), with caches in a throwaway directory::
+
+    python -m benchmarks.suite --save-baseline benchmarks/baseline.json
+    python -m benchmarks.suite --baseline benchmarks/baseline.json --tolerance 0.25
+
+With ``--baseline`` the run fails (exit status 1) when any timing is more
+than ``tolerance`` slower than the stored value.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+# Keep benchmark caches out of the real cache directory; must precede health_twin imports
+os.environ["HEALTH_TWIN_CACHE_DIR"] = tempfile.mkdtemp(prefix="health-twin-bench-")
+os.environ.setdefault("HEALTH_TWIN_AGENT_MEMORY", "0")
+os.environ.setdefault("HEALTH_TWIN_STREAM_LLM", "0")
+# Page runs must not start background imports that compete with the timed code
+os.environ.setdefault("HEALTH_TWIN_PRELOAD", "0")
+
+from benchmarks.corpus import nurse_queries, sample_profile, synthetic_pdf, write_reference_corpus  # noqa: E402
+from benchmarks.fakes import FakeEmbeddings, FakeLLM, FakeSearchBackend  # noqa: E402
+from health_twin import agents, crews  # noqa: E402
+from health_twin.profile import HealthProfile  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGES = (
+    "pages/health_survey.py",
+    "pages/health_analysis_agent.py",
+    "pages/risk_factor_agent.py",
+    "pages/full_assessment.py",
+    "pages/health_educator.py",
+    "pages/therapist.py",
+)
+
+
+def _timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def _p50(samples):
+    return round(statistics.median(samples), 3)
+
+
+def bench_crew_construction(args):
+    specs = crews.analysis_task_specs(HealthProfile.from_dict(sample_profile()))
+    names = crews.agent_names(specs)
+
+    def fresh():
+        crews.build_crew(specs, {name: agents.build_agent(name) for name in names})
+
+    def pooled():
+        with agents.lease_agents(*names) as leased:
+            crews.build_crew(specs, dict(zip(names, leased)))
+
+    pooled()  # fill the pools once, as the first page visit would
+    return {
+        "fresh_agents_ms": _p50(_timed(fresh, args.repeat)),
+        "registry_agents_ms": _p50(_timed(pooled, args.repeat)),
+    }
+
+
+def bench_crew_kickoff(args):
+    profiles = [HealthProfile.from_dict(sample_profile(seed)) for seed in range(args.repeat)]
+    # Distinct profiles miss the result cache; repeating the first one hits it
+    uncached = []
+    for profile in profiles:
+        started = time.perf_counter()
+        crews.run_crew(crews.analysis_task_specs(profile), profile)
+        uncached.append((time.perf_counter() - started) * 1000)
+    cached = _timed(lambda: crews.run_crew(crews.analysis_task_specs(profiles[0]), profiles[0]), args.repeat)
+
+    sequential, concurrent = [], []
+    for profile in profiles[:3]:
+        started = time.perf_counter()
+        for _, _, specs in crews.ASSESSMENT_SECTIONS:
+            crews.run_crew(specs(profile), profile, use_cache=False)
+        sequential.append((time.perf_counter() - started) * 1000)
+        started = time.perf_counter()
+        crews.run_full_assessment(profile, use_cache=False)
+        concurrent.append((time.perf_counter() - started) * 1000)
+
+    return {
+        "analysis_kickoff_ms": _p50(uncached),
+        "analysis_cached_ms": _p50(cached),
+        "assessment_sequential_ms": _p50(sequential),
+        "assessment_concurrent_ms": _p50(concurrent),
+    }
+
+
+def bench_pdf_pipeline(args):
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    from health_twin.pdf_pipeline import build_index, iter_chunks, iter_pages
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
+    results = {}
+    for pages in args.pdf_pages:
+        data = synthetic_pdf(pages)
+
+        started = time.perf_counter()
+        page_texts = list(iter_pages(io.BytesIO(data)))
+        extract_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        chunks = list(iter_chunks(page_texts, splitter))
+        chunk_ms = (time.perf_counter() - started) * 1000
+
+        embeddings = FakeEmbeddings(request_latency=args.embed_latency)
+        started = time.perf_counter()
+        build_index(iter_chunks(iter_pages(io.BytesIO(data)), splitter), embeddings)
+        pipeline_ms = (time.perf_counter() - started) * 1000
+
+        results[f"pdf_{pages}p_extract_ms"] = round(extract_ms, 3)
+        results[f"pdf_{pages}p_chunk_ms"] = round(chunk_ms, 3)
+        results[f"pdf_{pages}p_pipeline_ms"] = round(pipeline_ms, 3)
+        results[f"pdf_{pages}p_chunks"] = len(chunks)
+    return results
+
+
+def bench_document_library(args):
+    from langchain_community.vectorstores import FAISS
+
+    from benchmarks.corpus import synthetic_report
+    from health_twin.library import DocumentLibrary
+    from health_twin.retrieval import BM25Index
+
+    embeddings = FakeEmbeddings(request_latency=args.embed_latency)
+    library = DocumentLibrary(
+        tempfile.mkdtemp(prefix="library-", dir=os.environ["HEALTH_TWIN_CACHE_DIR"]), embeddings, shard_chunks=200
+    )
+    documents = [synthetic_report(seed, 3)[0] for seed in range(50)]
+    add_ms = []
+    for seed, pages in enumerate(documents):
+        started = time.perf_counter()
+        library.add("bench", pages, f"report-{seed}.pdf", ("Lab report", "Discharge summary")[seed % 2],
+                    f"2024-{seed % 12 + 1:02d}-15", content_hash=str(seed))
+        add_ms.append((time.perf_counter() - started) * 1000)
+
+    # The same PDF uploaded by another user is taken from the shared chunks, without embedding
+    started = time.perf_counter()
+    library.add("bench-other", documents[-1], "report.pdf", "Lab report", content_hash=str(len(documents) - 1))
+    add_shared_ms = (time.perf_counter() - started) * 1000
+
+    # What adding the 50th document cost before: one index rebuilt from every chunk
+    chunks = [doc.page_content for doc in library.iter_chunks("bench")]
+    started = time.perf_counter()
+    FAISS.from_texts(chunks, FakeEmbeddings(request_latency=args.embed_latency))
+    rebuild_ms = (time.perf_counter() - started) * 1000
+
+    # What building the page's retriever cost before: BM25 re-indexed from every stored chunk
+    started = time.perf_counter()
+    bm25 = BM25Index()
+    for chunk in chunks:
+        bm25.add(chunk)
+    bm25_rebuild_ms = (time.perf_counter() - started) * 1000
+
+    question = "What was my HbA1c?"
+    started = time.perf_counter()
+    retriever = library.retriever("bench")
+    retriever_first_ms = (time.perf_counter() - started) * 1000
+    results = {
+        "add_1st_ms": round(add_ms[0], 3),
+        "add_50th_ms": round(add_ms[-1], 3),
+        "add_shared_ms": round(add_shared_ms, 3),
+        "rebuild_50_docs_ms": round(rebuild_ms, 3),
+        "search_50_docs_ms": _p50(_timed(lambda: library.search("bench", question), args.repeat)),
+        "search_filtered_ms": _p50(_timed(
+            lambda: library.search("bench", question, doc_types=["Lab report"], since="2024-06-01"), args.repeat
+        )),
+        "bm25_rebuild_50_docs_ms": round(bm25_rebuild_ms, 3),
+        "retriever_first_ms": round(retriever_first_ms, 3),
+        "retriever_cached_ms": _p50(_timed(lambda: library.retriever("bench"), args.repeat)),
+        "hybrid_query_ms": _p50(_timed(lambda: retriever.invoke(question), args.repeat)),
+        "shards": library.stats("bench")["shards"],
+    }
+    # Deleting a document rebuilds only its own shard's BM25
+    doc_id = library.documents("bench")[0]["doc_id"]
+    started = time.perf_counter()
+    library.delete("bench", doc_id)
+    results["delete_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    return results
+
+
+def bench_nurse_search(args):
+    from concurrent.futures import ThreadPoolExecutor
+
+    from health_twin.search import CachedSearch, get_search, get_search_tool
+    from sample import build_nurse_agent, build_nurse_crew
+
+    results = {}
+    # Remote backend: first lookup pays the API latency, repeats and rephrasings hit the cache
+    remote = FakeSearchBackend(latency=args.search_latency)
+    search = CachedSearch(remote, os.path.join(os.environ["HEALTH_TWIN_CACHE_DIR"], "bench_search.sqlite3"))
+    queries = nurse_queries()
+    results["remote_first_ms"] = _p50(_timed(lambda: search.search(queries[0]), 1))
+    results["remote_cached_ms"] = _p50(_timed(lambda: [search.search(q) for q in queries[:2]], args.repeat))
+
+    # Identical concurrent lookups share one backend call
+    calls_before = remote.calls
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        started = time.perf_counter()
+        list(pool.map(search.search, ["chest tightness on exertion"] * 8))
+        results["remote_coalesced_8_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    results["remote_coalesced_8_backend_calls"] = remote.calls - calls_before
+
+    # Local reference corpus: no network at all
+    corpus = write_reference_corpus(os.path.join(os.environ["HEALTH_TWIN_CACHE_DIR"], "reference_docs"))
+    local = get_search("local", corpus)
+    results["local_first_ms"] = _p50(_timed(lambda: local.search(queries[2]), 1))
+    results["local_cached_ms"] = _p50(_timed(lambda: local.search(queries[3]), args.repeat))
+
+    # The whole nurse flow, offline: fake LLM, local corpus tool
+    nurse = build_nurse_agent(tools=[get_search_tool("local", corpus)], memory=False)
+    nurse.verbose = False
+
+    def consult():
+        build_nurse_crew("persistent headache and fatigue", "Metformin 850mg", nurse).kickoff()
+
+    results["nurse_crew_ms"] = _p50(_timed(consult, args.repeat))
+    return results
+
+
+def bench_survey_history(args):
+    from health_twin import history
+
+    results = {}
+    store = history.HistoryStore(os.path.join(os.environ["HEALTH_TWIN_CACHE_DIR"], "bench_history"))
+    started_at = time.time() - 1000 * 7 * history.DAY
+    count = 0
+    # Appending and summarizing cost the same whether a user has 10 or 1000 surveys
+    for size in (10, 1000):
+        while count < size - 1:
+            store.append("bench", sample_profile(count), now=started_at + count * 7 * history.DAY)
+            count += 1
+        profile = sample_profile(count)
+        results[f"append_at_{size}_ms"] = _p50(_timed(lambda: store.append("bench", profile), 1))
+        count += 1
+        results[f"trend_summary_at_{size}_ms"] = _p50(
+            _timed(lambda: history.trend_summary(store.trends("bench")), args.repeat)
+        )
+        results[f"trend_prompt_chars_at_{size}"] = len(history.trend_summary(store.trends("bench")))
+    return results
+
+
+def bench_job_queue(args):
+    from health_twin import jobs
+
+    results = {}
+    queue = jobs.JobQueue(os.path.join(os.environ["HEALTH_TWIN_CACHE_DIR"], "bench_jobs.sqlite3"))
+    profiles = [sample_profile(300 + seed) for seed in range(16)]
+    payloads = [
+        {"tasks": crews.risk_task_specs(HealthProfile.from_dict(profile)), "profile": profile}
+        for profile in profiles
+    ]
+    # 32 users ask for 16 distinct runs: submits return at once, duplicates join the running job
+    started = time.perf_counter()
+    submit_ms, job_ids = [], []
+    for user, payload in enumerate(payloads * 2):
+        submitted = time.perf_counter()
+        job_ids.append(queue.submit("crew", payload, f"user-{user}"))
+        submit_ms.append((time.perf_counter() - submitted) * 1000)
+    for job_id in set(job_ids):
+        queue.wait(job_id)
+    results["submit_ms"] = _p50(submit_ms)
+    results["distinct_jobs"] = len(set(job_ids))
+    results[f"drain_{len(job_ids)}_requests_{queue.workers}_workers_ms"] = round(
+        (time.perf_counter() - started) * 1000, 3
+    )
+    return results
+
+
+def bench_llm_gateway(args):
+    import threading
+
+    from health_twin import gateway
+
+    results = {}
+    fake = FakeLLM(latency=args.llm_latency, tokens=args.llm_tokens)
+    llm = gateway.wrap_llm(fake, gateway.Gateway(rpm=0, tpm=0, concurrency=8))
+    # Eight sessions sending the same prompt at once pay for one call
+    threads = [threading.Thread(target=llm.call, args=("Explain LDL cholesterol.",)) for _ in range(8)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results["identical_8_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    results["identical_8_llm_calls"] = fake.calls
+
+    # A burst of batch calls saturates the gateway; chat turns arriving behind it still go first
+    limited = gateway.Gateway(rpm=0, tpm=0, concurrency=4)
+    latencies = {"interactive": [], "batch": []}
+
+    def send(lane_name, prompt):
+        with gateway.lane(lane_name):
+            submitted = time.perf_counter()
+            limited.call(prompt, lambda: time.sleep(args.llm_latency), 100)
+            latencies[lane_name].append((time.perf_counter() - submitted) * 1000)
+
+    threads = [threading.Thread(target=send, args=("batch", f"batch {i}")) for i in range(24)]
+    threads += [threading.Thread(target=send, args=("interactive", f"chat {i}")) for i in range(4)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.001)
+    for thread in threads:
+        thread.join()
+    results["burst_interactive_max_ms"] = round(max(latencies["interactive"]), 3)
+    results["burst_batch_max_ms"] = round(max(latencies["batch"]), 3)
+    return results
+
+
+def bench_fused_mode(args):
+    from benchmarks.fused_compare import run
+
+    results = {}
+    for row in run(min(args.repeat, 3)):
+        prefix = f"{row['crew']}_{row['mode']}"
+        results[f"{prefix}_ms"] = row["latency_ms_p50"]
+        results[f"{prefix}_llm_calls"] = row["llm_calls"]
+        results[f"{prefix}_tokens"] = row["prompt_tokens"] + row["completion_tokens"]
+    return results
+
+
+def bench_shared_assessment(args):
+    from health_twin import assessments, telemetry
+
+    def visit(profile, shared):
+        # Analysis page, then risk page, then full assessment, as one user moving between pages
+        assessment = assessments.get_default().open(profile.to_dict(), "bench")
+        with telemetry.request("bench.pages") as trace:
+            for specs in (crews.analysis_task_specs, crews.risk_task_specs):
+                task_specs = specs(profile)
+                if shared:
+                    _, task_specs = crews.incremental_task_specs(
+                        task_specs, assessment["findings"], assessment["bases"]
+                    )
+                if task_specs:
+                    crews.run_crew(task_specs, profile, use_cache=shared, owner="bench")
+                assessment = assessments.get_default().open(profile.to_dict(), "bench")
+            crews.run_full_assessment(profile, use_cache=shared, owner="bench")
+        return trace.breakdown().get("llm.call", {}).get("count", 0)
+
+    results = {}
+    for offset, (mode, shared) in enumerate((("separate", False), ("shared", True))):
+        calls, samples = [], []
+        for seed in range(min(args.repeat, 3)):
+            # Fresh profiles per mode: no findings recorded by an earlier run
+            profile = HealthProfile.from_dict(sample_profile(1000 * (offset + 1) + seed))
+            started = time.perf_counter()
+            calls.append(visit(profile, shared))
+            samples.append((time.perf_counter() - started) * 1000)
+        results[f"{mode}_pages_ms"] = _p50(samples)
+        results[f"{mode}_llm_calls"] = max(calls)
+    return results
+
+
+def bench_cold_import(args):
+    from health_twin.warmup import cold_import_seconds
+
+    results = {}
+    for path in PAGES + ("pages/pdf_reader.py",):
+        name = os.path.splitext(os.path.basename(path))[0]
+        samples = [cold_import_seconds(os.path.join(ROOT, path)) * 1000 for _ in range(args.repeat)]
+        results[f"{name}_import_ms"] = _p50(samples)
+    return results
+
+
+def _no_navigation(*args, **kwargs):
+    return None
+
+
+def bench_page_rerun(args):
+    from unittest import mock
+
+    from streamlit.delta_generator import DeltaGenerator
+    from streamlit.testing.v1 import AppTest
+
+    results = {}
+    # Pages link to the multipage entry script (main_app.py), which a single-page AppTest
+    # cannot resolve; the links are not what is being timed, so they render nothing here
+    with mock.patch.object(DeltaGenerator, "page_link", _no_navigation), \
+            mock.patch("streamlit.switch_page", _no_navigation):
+        for path in PAGES:
+            name = os.path.splitext(os.path.basename(path))[0]
+            app = AppTest.from_file(os.path.join(ROOT, path), default_timeout=60)
+            started = time.perf_counter()
+            app.run()
+            first_run_ms = (time.perf_counter() - started) * 1000
+            reruns = _timed(app.run, args.repeat)
+            # A script that raises stops early, so its timings would not be comparable
+            if app.exception:
+                raise RuntimeError(f"{path} raised: {app.exception[0].message}")
+            results[f"{name}_first_run_ms"] = round(first_run_ms, 3)
+            results[f"{name}_rerun_ms"] = _p50(reruns)
+    return results
+
+
+BENCHMARKS = {
+    "crew_construction": bench_crew_construction,
+    "crew_kickoff": bench_crew_kickoff,
+    "pdf_pipeline": bench_pdf_pipeline,
+    "document_library": bench_document_library,
+    "nurse_search": bench_nurse_search,
+    "survey_history": bench_survey_history,
+    "job_queue": bench_job_queue,
+    "llm_gateway": bench_llm_gateway,
+    "fused_mode": bench_fused_mode,
+    "shared_assessment": bench_shared_assessment,
+    "cold_import": bench_cold_import,
+    "page_rerun": bench_page_rerun,
+}
+
+
+def compare(results, baseline, tolerance, min_delta_ms=1.0):
+    """Return ``(benchmark, metric, old, new)`` for every timing slower than the baseline allows.
+
+    Slowdowns under ``min_delta_ms`` are ignored so sub-millisecond noise never fails a run.
+    """
+    regressions = []
+    for bench, metrics in results.items():
+        for metric, value in metrics.items():
+            old = baseline.get("results", {}).get(bench, {}).get(metric)
+            if not (metric.endswith("_ms") and old):
+                continue
+            if value > old * (1 + tolerance) and value - old >= min_delta_ms:
+                regressions.append((bench, metric, old, value))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the offline AI Health Twin benchmark suite.")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="Run only these benchmarks")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Seconds per fake LLM call")
+    parser.add_argument("--llm-tokens", type=int, default=200, help="Words per fake LLM answer")
+    parser.add_argument("--embed-latency", type=float, default=0.02, help="Seconds per fake embedding request")
+    parser.add_argument("--search-latency", type=float, default=0.3, help="Seconds per fake web search")
+    parser.add_argument("--pdf-pages", type=int, nargs="+", default=[10, 100, 400])
+    parser.add_argument("--output", help="Write this run's results as JSON")
+    parser.add_argument("--save-baseline", help="Write this run's results as the new baseline")
+    parser.add_argument("--baseline", help="Compare against a stored baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown vs baseline (0.25 = 25%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="Ignore slowdowns smaller than this")
+    args = parser.parse_args(argv)
+
+    # One fake per agent, as with the real factory, so per-agent construction and leases are measured
+    agents.set_llm_factory(lambda: FakeLLM(latency=args.llm_latency, tokens=args.llm_tokens))
+
+    results, errors = {}, {}
+    for name in args.only or BENCHMARKS:
+        try:
+            results[name] = BENCHMARKS[name](args)
+        except Exception as exc:
+            errors[name] = f"{type(exc).__name__}: {exc}"
+            print(f"{name}: failed: {errors[name]}", file=sys.stderr)
+            continue
+        for metric, value in results[name].items():
+            print(f"{name:18} {metric:34} {value:>12}")
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "llm_latency_s": args.llm_latency,
+            "llm_tokens": args.llm_tokens,
+            "embed_latency_s": args.embed_latency,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+        "errors": errors,
+    }
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    status = 1 if errors else 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.min_delta_ms)
+        for bench, metric, old, new in regressions:
+            print(f"REGRESSION {bench}.{metric}: {old} -> {new} ms", file=sys.stderr)
+        status = status or (1 if regressions else 0)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
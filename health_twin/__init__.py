@@ -0,0 +1 @@
+"""Shared building blocks for the AI Health Twin Streamlit pages."""
@@ -0,0 +1,208 @@
+"""Process-wide registry of the CrewAI agents used by the pages.
+
+Streamlit re-executes a page script on every widget interaction, but imported
+modules stay in ``sys.modules`` for the lifetime of the server process. Keeping
+the agents here means each role is built once per process instead of once per
+rerun.
+
+An ``Agent`` is not safe to share between two crews that run at the same time
+(``Crew.kickoff`` attaches itself to its agents), so every role is backed by a
+small pool: a session leases an idle instance, and returns it when its crew is
+done. The pool only grows to the peak number of concurrent runs for a role.
+"""
+import os
+import threading
+from contextlib import contextmanager
+
+# CrewAI falls back to this model when OPENAI_MODEL_NAME is not set
+DEFAULT_MODEL = "gpt-4o-mini"
+
+# Stream completions so pages can render tokens as they arrive (see health_twin.streaming)
+STREAM_LLM = os.getenv("HEALTH_TWIN_STREAM_LLM", "1") == "1"
+
+# CrewAI agent memory for the page agents (stateless benchmarks turn it off)
+AGENT_MEMORY = os.getenv("HEALTH_TWIN_AGENT_MEMORY", "1") == "1"
+
+# Role definitions, keyed by the name pages use to lease them
+AGENT_SPECS = {
+    "health_analyst": dict(
+        role="Health Data Analyst",
+        goal="Analyze patient health metrics and generate a comprehensive health report.",
+        backstory="An AI-powered health specialist trained in analyzing patient lifestyle, medical history, and risk factors to generate insightful recommendations.",
+    ),
+    "health_advisor": dict(
+        role="AI Health Advisor",
+        goal="Recommend personalized lifestyle changes to optimize health and prevent future diseases.",
+        backstory="An AI-driven preventive healthcare expert focusing on personalized diet, exercise, and stress management strategies.",
+    ),
+    "risk_specialist": dict(
+        role="Health Risk Specialist",
+        goal="Analyze patient health data and predict potential future risks.",
+        backstory="An AI-powered medical expert trained to identify potential health risks based on current health metrics, medical history, and lifestyle habits.",
+    ),
+    "preventive_advisor": dict(
+        role="Preventive Health Advisor",
+        goal="Recommend proactive health measures to reduce future risks.",
+        backstory="An AI-driven preventive care expert specializing in early disease prevention through lifestyle modifications and routine monitoring.",
+    ),
+    "health_educator": dict(
+        role="AI Health Educator",
+        goal="Provide accurate, science-backed answers to general health-related questions.",
+        backstory=(
+            "You are a highly knowledgeable AI health educator with expertise in nutrition, fitness, "
+            "mental health, disease prevention, and wellness. You provide reliable, friendly, and easy-to-understand answers."
+        ),
+    ),
+    "therapist": dict(
+        role="AI Therapist",
+        goal="Provide empathetic, supportive, and helpful mental health conversations.",
+        backstory=(
+            "You are a compassionate and understanding AI therapist. You provide emotional support, "
+            "help users manage stress, and encourage self-care practices. You are not a substitute for a professional therapist, "
+            "but you offer thoughtful advice and encouragement."
+        ),
+    ),
+}
+
+
+def model_name():
+    return os.getenv("OPENAI_MODEL_NAME", DEFAULT_MODEL)
+
+
+def default_llm():
+    from crewai import LLM
+
+    return LLM(model=model_name(), stream=STREAM_LLM)
+
+
+_llm_factory = default_llm
+
+
+def make_llm():
+    """LLM for a new agent or a direct completion call, from the current factory.
+
+    Calls go through the process-wide ``health_twin.gateway`` unless
+    ``HEALTH_TWIN_LLM_GATEWAY=0``.
+    """
+    from health_twin import gateway
+
+    llm = _llm_factory()
+    return gateway.wrap_llm(llm) if gateway.ENABLED else llm
+
+
+def set_llm_factory(factory=None):
+    """Swap the LLM used by every agent (``None`` restores the default) and rebuild pools."""
+    global _llm_factory
+    _llm_factory = factory or default_llm
+    reset_agents()
+
+
+def build_agent(name, memory=None):
+    """Construct a fresh agent for ``name`` from ``AGENT_SPECS``."""
+    from crewai import Agent
+
+    memory = AGENT_MEMORY if memory is None else memory
+    return Agent(**AGENT_SPECS[name], llm=make_llm(), verbose=False, memory=memory)
+
+
+class ResourcePool:
+    """Thread-safe pool of interchangeable objects built on demand by ``factory``."""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._idle = []
+        self._generation = 0
+        self.created = 0
+
+    def acquire(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), self._generation
+            generation = self._generation
+            self.created += 1
+        # Build outside the lock so a slow constructor does not block other roles
+        return self._factory(), generation
+
+    def release(self, item, generation):
+        with self._lock:
+            # Instances leased before a reset are dropped instead of recycled
+            if generation == self._generation:
+                self._idle.append(item)
+
+    @contextmanager
+    def lease(self):
+        item, generation = self.acquire()
+        try:
+            yield item
+        finally:
+            self.release(item, generation)
+
+    def reset(self):
+        with self._lock:
+            self._idle.clear()
+            self._generation += 1
+
+    def stats(self):
+        with self._lock:
+            return {"idle": len(self._idle), "created": self.created}
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+# Pools of other objects built from agents (e.g. pre-built crews); reset with the agents
+_dependent_pools = []
+
+
+def register_pool(pool):
+    """Have ``reset_agents()`` also reset ``pool``; returns ``pool``."""
+    with _pools_lock:
+        _dependent_pools.append(pool)
+    return pool
+
+
+def _pool(name):
+    if name not in AGENT_SPECS:
+        raise KeyError(f"Unknown agent role: {name!r}")
+    with _pools_lock:
+        pool = _pools.get(name)
+        if pool is None:
+            pool = _pools[name] = ResourcePool(lambda: build_agent(name))
+        return pool
+
+
+@contextmanager
+def lease_agents(*names):
+    """Lease one agent per role name for the duration of a crew run.
+
+    Usage::
+
+        with lease_agents("health_analyst", "health_advisor") as (analyst, advisor):
+            ...
+    """
+    leases = []
+    try:
+        for name in names:
+            pool = _pool(name)
+            agent, generation = pool.acquire()
+            leases.append((pool, agent, generation))
+        yield tuple(agent for _, agent, _ in leases)
+    finally:
+        for pool, agent, generation in leases:
+            pool.release(agent, generation)
+
+
+def reset_agents(*names):
+    """Drop cached agents (all roles, or only ``names``) so they are rebuilt on next use."""
+    with _pools_lock:
+        targets = [_pools[n] for n in names if n in _pools] if names else list(_pools.values())
+        targets += _dependent_pools
+    for pool in targets:
+        pool.reset()
+
+
+def agent_stats():
+    """Return ``{role_name: {"idle": int, "created": int}}`` for every pool built so far."""
+    with _pools_lock:
+        pools = dict(_pools)
+    return {name: pool.stats() for name, pool in pools.items()}
@@ -0,0 +1,225 @@
+"""Shared per-profile assessment artifacts.
+
+An assessment is everything the app knows about one health profile: the
+parsed survey, its computed metrics (``scoring.score_profile``) and the
+findings the crews produced for it, keyed by the profile hash. Every page
+reads and extends the same artifact:
+
+* tasks declare the finding they produce (``"finding": "analysis"``) and
+  ``crews.kickoff`` records each one as soon as its crew finishes;
+* findings belong to the owner they were produced for (``report_store.st_owner``)
+  and carry their basis, a hash of the task specs that produced them
+  (``crews.finding_bases``). Prompts can include an owner's own survey
+  history, so another owner never sees them, and a changed prompt (new
+  trends, say) does not match an old finding;
+* ``crews.incremental_task_specs`` drops the tasks whose findings are already
+  known on the same basis and hands their text to the next task, so a page
+  only runs the work it adds on top of the base analysis;
+* ``st_open`` remembers the profile in the Streamlit session, so moving to
+  another page does not ask for the same upload again.
+
+Assessments not opened for ``HEALTH_TWIN_ASSESSMENT_TTL`` seconds (default 30
+days) are dropped. Inspect the store with::
+
+    python -m health_twin.assessments stats
+    python -m health_twin.assessments show PROFILE_HASH --owner OWNER
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+from health_twin.result_cache import DEFAULT_DIR, profile_hash
+
+DEFAULT_TTL = float(os.getenv("HEALTH_TWIN_ASSESSMENT_TTL", 30 * 24 * 3600))
+
+# Finding name -> heading used in pages, reports and prompts
+FINDINGS = {
+    "analysis": "🔎 Health Analysis",
+    "plan": "📝 Lifestyle Plan",
+    "risk": "⚠️ Risk Assessment",
+    "prevention": "🛡️ Preventive Care Guide",
+}
+
+
+class AssessmentStore:
+    """SQLite store of assessments and their findings; safe to share between Streamlit session threads."""
+
+    def __init__(self, path, ttl=DEFAULT_TTL):
+        self.path = path
+        self.ttl = ttl
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS assessments ("
+            "digest TEXT PRIMARY KEY, profile TEXT NOT NULL, metrics TEXT NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(findings)")]
+        if columns and "owner" not in columns:
+            # Findings from before they were kept per owner cannot be attributed; they are regenerated
+            self._conn.execute("DROP TABLE findings")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS findings ("
+            "digest TEXT NOT NULL, owner TEXT NOT NULL, name TEXT NOT NULL, basis TEXT NOT NULL, "
+            "value TEXT NOT NULL, created REAL NOT NULL, PRIMARY KEY (digest, owner, name))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS assessments_accessed ON assessments (accessed)")
+
+    def open(self, health_data, owner=""):
+        """``owner``'s view of the assessment for ``health_data``, created (metrics included) on first use."""
+        digest = profile_hash(health_data)
+        now = time.time()
+        with self._lock:
+            touched = self._conn.execute(
+                "UPDATE assessments SET accessed = ? WHERE digest = ?", (now, digest)
+            ).rowcount
+        if not touched:
+            # Scoring pulls in NumPy; only paid once per profile
+            from health_twin.scoring import score_profile
+
+            metrics = score_profile(health_data)
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO assessments (digest, profile, metrics, created, accessed) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (digest, json.dumps(health_data), json.dumps(metrics), now, now),
+                )
+                self._evict(now)
+        return self.get(digest, owner)
+
+    def get(self, digest, owner=""):
+        """``{"digest", "profile", "metrics", "findings", "bases", "created"}`` or ``None``.
+
+        ``findings`` and ``bases`` (``{name: text}`` and ``{name: basis}``) hold ``owner``'s findings only.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT profile, metrics, created FROM assessments WHERE digest = ?", (digest,)
+            ).fetchone()
+            if row is None:
+                return None
+            found = self._conn.execute(
+                "SELECT name, value, basis FROM findings WHERE digest = ? AND owner = ?", (digest, owner)
+            ).fetchall()
+        return {
+            "digest": digest,
+            "profile": json.loads(row[0]),
+            "metrics": json.loads(row[1]),
+            "findings": {name: value for name, value, _ in found},
+            "bases": {name: basis for name, _, basis in found},
+            "created": row[2],
+        }
+
+    def add_findings(self, health_data, findings, bases, owner=""):
+        """Record ``owner``'s ``{name: text}`` findings (with their ``{name: basis}``), replacing older ones."""
+        if not findings:
+            return
+        assessment = self.open(health_data, owner)
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO findings (digest, owner, name, basis, value, created) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(assessment["digest"], owner, name, bases[name], text, now) for name, text in findings.items()],
+            )
+
+    def _evict(self, now):
+        if not self.ttl:
+            return
+        self._conn.execute(
+            "DELETE FROM findings WHERE digest IN (SELECT digest FROM assessments WHERE accessed < ?)",
+            (now - self.ttl,),
+        )
+        self._conn.execute("DELETE FROM assessments WHERE accessed < ?", (now - self.ttl,))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM findings")
+            self._conn.execute("DELETE FROM assessments")
+
+    def stats(self):
+        with self._lock:
+            (assessments,) = self._conn.execute("SELECT COUNT(*) FROM assessments").fetchone()
+            counts = dict(self._conn.execute("SELECT name, COUNT(*) FROM findings GROUP BY name"))
+            (owners,) = self._conn.execute("SELECT COUNT(DISTINCT owner) FROM findings").fetchone()
+        return {"assessments": assessments, "findings": counts, "owners": owners}
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_default():
+    """Process-wide assessment store under ``HEALTH_TWIN_CACHE_DIR``."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = AssessmentStore(os.path.join(DEFAULT_DIR, "assessments.sqlite3"))
+        return _default
+
+
+def st_open(health_data):
+    """``open`` the assessment for this session's owner and make it the current one."""
+    import streamlit as st
+
+    from health_twin.report_store import st_owner
+
+    assessment = get_default().open(health_data, st_owner())
+    st.session_state["assessment"] = assessment["digest"]
+    return assessment
+
+
+def st_current():
+    """This session's current assessment (from any page), or ``None``."""
+    import streamlit as st
+
+    from health_twin.report_store import st_owner
+
+    digest = st.session_state.get("assessment")
+    return get_default().get(digest, st_owner()) if digest else None
+
+
+def st_show(findings, names, final=None):
+    """Render known findings under their headings, as a crew run would; ``final`` renders the last one."""
+    import streamlit as st
+
+    for index, name in enumerate(names):
+        if final is not None and index == len(names) - 1:
+            st.markdown(f"**{FINDINGS[name]}**")
+            final(findings[name])
+        else:
+            st.markdown(f"**{FINDINGS[name]}**\n\n{findings[name]}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect the shared assessment artifacts.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("stats", help="Count assessments and findings")
+    show_parser = commands.add_parser("show", help="Print one assessment")
+    show_parser.add_argument("digest")
+    show_parser.add_argument("--owner", default="", help="Whose findings to show (default: unattributed runs)")
+    args = parser.parse_args(argv)
+
+    store = get_default()
+    if args.command == "stats":
+        print(json.dumps(store.stats(), indent=2))
+        return 0
+    assessment = store.get(args.digest, args.owner)
+    if assessment is None:
+        print(f"no assessment {args.digest}", file=sys.stderr)
+        return 1
+    print(json.dumps({key: assessment[key] for key in ("profile", "metrics")}, indent=2))
+    for name, text in assessment["findings"].items():
+        print(f"\n## {FINDINGS.get(name, name)}\n\n{text}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""Headless batch runner for the health analysis crew.
+
+Runs the analyst + advisor crew over many profiles with bounded concurrency
+and appends one JSON line per profile to the output file::
+
+    python -m health_twin.batch surveys/ -o reports.jsonl -j 8
+    python -m health_twin.batch profiles.jsonl -o reports.jsonl --resume
+
+The input is a directory of ``*.json`` files (such as ``health_survey.json``
+exports), a JSONL file, or ``-`` for JSONL on stdin. The output file doubles
+as the checkpoint: with ``--resume``, records already written successfully
+are skipped.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from health_twin import gateway
+from health_twin.crews import analysis_task_specs, run_crew
+from health_twin.profile import HealthProfile
+
+
+def iter_profiles(source):
+    """Yield ``(record_id, health_data_or_exception)`` from a directory, JSONL file or ``-``."""
+    if source != "-" and os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(source, name), encoding="utf-8") as f:
+                    yield name, json.load(f)
+            except (OSError, ValueError) as exc:
+                yield name, exc
+        return
+
+    stream = sys.stdin if source == "-" else open(source, encoding="utf-8")
+    try:
+        for line_no, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as exc:
+                yield f"line-{line_no}", exc
+                continue
+            record_id = record.pop("id", None) if isinstance(record, dict) else None
+            yield str(record_id or f"line-{line_no}"), record
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def completed_ids(output_path):
+    """IDs that already have a successful result in ``output_path``."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # a partially written last line from an interrupted run
+            if record.get("status") == "ok":
+                done.add(record["id"])
+    return done
+
+
+def analyze(record_id, health_data, use_cache=True):
+    started = time.time()
+    result = {"id": record_id, "started": started}
+    try:
+        if isinstance(health_data, Exception):
+            raise health_data
+        profile = HealthProfile.from_dict(health_data)
+        # Behind the interactive pages at the LLM gateway
+        with gateway.lane("batch"):
+            result["report"] = run_crew(analysis_task_specs(profile), profile, use_cache=use_cache)
+        result["status"] = "ok"
+    except Exception as exc:
+        result["status"] = "error"
+        result["error"] = f"{type(exc).__name__}: {exc}"
+    result["elapsed_s"] = round(time.time() - started, 3)
+    return result
+
+
+def run_batch(source, output_path, concurrency=4, resume=False, use_cache=True, log=None):
+    """Process every profile from ``source``; returns ``{"ok": n, "error": n, "skipped": n}``."""
+    skip = completed_ids(output_path) if resume else set()
+    counts = {"ok": 0, "error": 0, "skipped": 0}
+
+    with open(output_path, "a" if resume else "w", encoding="utf-8") as out, \
+            ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch") as pool:
+        in_flight = set()
+
+        def drain(block_until):
+            nonlocal in_flight
+            while len(in_flight) > block_until:
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    record = future.result()
+                    # Results are written from this thread only, one flushed line per record
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    out.flush()
+                    counts[record["status"]] += 1
+                    if log:
+                        log(f"{record['status']:5} {record['elapsed_s']:8.2f}s  {record['id']}")
+
+        for record_id, health_data in iter_profiles(source):
+            if record_id in skip:
+                counts["skipped"] += 1
+                continue
+            in_flight.add(pool.submit(analyze, record_id, health_data, use_cache))
+            # Keep a bounded window so a huge JSONL stream is never fully buffered
+            drain(2 * concurrency)
+        drain(0)
+    return counts
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description="Run the AI Health Twin analysis crew over many profiles.")
+    parser.add_argument("source", help="Directory of *.json profiles, a JSONL file, or - for stdin")
+    parser.add_argument("-o", "--output", default="health_reports.jsonl", help="Output JSONL (also the checkpoint)")
+    parser.add_argument("-j", "--concurrency", type=int, default=4, help="Maximum crews running at once")
+    parser.add_argument("--resume", action="store_true", help="Skip records already completed in the output file")
+    parser.add_argument("--no-cache", action="store_true", help="Always call the LLM, bypassing the result cache")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    started = time.time()
+    counts = run_batch(
+        args.source, args.output, args.concurrency, args.resume, not args.no_cache,
+        log=lambda line: print(line, file=sys.stderr),
+    )
+    print(
+        f"{counts['ok']} ok, {counts['error']} failed, {counts['skipped']} skipped "
+        f"in {time.time() - started:.1f}s -> {args.output}",
+        file=sys.stderr,
+    )
+    return 1 if counts["error"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,407 @@
+"""Task definitions and runners for the multi-agent crews.
+
+Tasks are described as plain dicts (``agent``, ``description``,
+``expected_output``) so a run can be fingerprinted for the result cache
+without importing CrewAI or building any objects. A task with an
+``output_model`` (a schema name from ``health_twin.reports``) returns a
+structured object, stored as JSON; ``render_result`` turns it into markdown.
+A task with a ``finding`` name has its output recorded in the owner's view of
+the profile's shared assessment (``health_twin.assessments``), together with
+its basis (``finding_bases``); ``uses`` lists findings of other crews the task
+builds on when they are already known.
+"""
+import hashlib
+
+from health_twin import result_cache, telemetry
+from health_twin.agents import AGENT_SPECS, lease_agents, model_name
+from health_twin.profile import render_profile
+
+# Continuation indent of the multi-line task descriptions below
+_INDENT = " " * 12
+
+
+def _risk_summary(profile):
+    # Scoring pulls in NumPy; imported on first use so pages paint without it
+    from health_twin.scoring import risk_summary, score_profile
+
+    return risk_summary(score_profile(profile.to_dict()))
+
+
+def analysis_task_specs(profile, trends=""):
+    """Health Data Analyst -> AI Health Advisor for a ``HealthProfile``.
+
+    ``trends`` is the owner's ``history.trend_summary``; only those precomputed
+    changes are sent, never the raw history, so the prompt size stays constant.
+    """
+    history = f"\n{_INDENT}{trends}" if trends else ""
+    return [
+        dict(
+            agent="health_analyst",
+            description=f"""
+            Analyze the following health data:
+            {render_profile(profile, indent=_INDENT)}
+            {_risk_summary(profile)}{history}
+
+            Evaluate key health trends, risks, and potential concerns based on this data.
+            """,
+            expected_output="A structured report summarizing the health risks, key observations, and insights.",
+            finding="analysis",
+        ),
+        dict(
+            agent="health_advisor",
+            description="""
+            Based on the patient's health metrics, provide a personalized lifestyle plan including:
+            - Ideal sleep patterns and stress management strategies.
+            - Recommended diet based on their chronic conditions.
+            - Optimal exercise routine and hydration goals.
+            - Preventive measures for risks like diabetes and heart disease.
+            """,
+            expected_output="A structured health improvement plan with specific, actionable recommendations.",
+            finding="plan",
+        ),
+    ]
+
+
+def fused_analysis_task_specs(profile, trends=""):
+    """``analysis_task_specs`` as one structured call: analysis and lifestyle plan together."""
+    history = f"\n{_INDENT}{trends}" if trends else ""
+    return [
+        dict(
+            agent="health_analyst",
+            description=f"""
+            Analyze the following health data:
+            {render_profile(profile, indent=_INDENT)}
+            {_risk_summary(profile)}{history}
+
+            Evaluate key health trends, risks, and potential concerns based on this data, and in the same
+            answer provide a personalized lifestyle plan including:
+            - Ideal sleep patterns and stress management strategies.
+            - Recommended diet based on their chronic conditions.
+            - Optimal exercise routine and hydration goals.
+            - Preventive measures for risks like diabetes and heart disease.
+            """,
+            expected_output="The health report (observations and risks) and the lifestyle plan as one structured object.",
+            output_model="analysis",
+        ),
+    ]
+
+
+def risk_task_specs(profile):
+    """Health Risk Specialist -> Preventive Health Advisor for a ``HealthProfile``."""
+    return [
+        dict(
+            agent="risk_specialist",
+            description=f"""
+            Based on the patient's health data, analyze and outline possible future health risks.
+            Consider the following factors:
+            {render_profile(profile, prefix="- ", indent=_INDENT)}
+            - {_risk_summary(profile)}
+
+            Predict potential future health risks based on trends in their data.
+            Identify diseases or conditions they may be susceptible to over time.
+            """,
+            expected_output="A detailed health risk assessment report listing potential future health risks and explanations.",
+            finding="risk",
+            uses=["analysis"],
+        ),
+        dict(
+            agent="preventive_advisor",
+            description="""
+            Based on the predicted health risks, provide actionable preventive measures.
+            Suggest lifestyle adjustments, dietary improvements, medical check-ups, and fitness routines
+            to reduce the likelihood of future health issues.
+            """,
+            expected_output="A structured preventive care guide with clear steps to reduce health risks.",
+            finding="prevention",
+        ),
+    ]
+
+
+def fused_risk_task_specs(profile):
+    """``risk_task_specs`` as one structured call: risk assessment and preventive care together."""
+    return [
+        dict(
+            agent="risk_specialist",
+            description=f"""
+            Based on the patient's health data, analyze and outline possible future health risks.
+            Consider the following factors:
+            {render_profile(profile, prefix="- ", indent=_INDENT)}
+            - {_risk_summary(profile)}
+
+            Predict potential future health risks based on trends in their data.
+            Identify diseases or conditions they may be susceptible to over time.
+            In the same answer, provide actionable preventive measures: lifestyle adjustments, dietary
+            improvements, medical check-ups, and fitness routines to reduce the likelihood of these issues.
+            """,
+            expected_output="The risk assessment and the preventive care guide as one structured object.",
+            output_model="risk",
+        ),
+    ]
+
+
+def educator_task_specs(user_query):
+    return [
+        dict(
+            agent="health_educator",
+            description=f"Answer this health-related question in a clear and concise manner: {user_query}",
+            expected_output="A well-researched and easy-to-understand answer to the user's health query.",
+        ),
+    ]
+
+
+def agent_names(task_specs):
+    """Agent names used by ``task_specs``, in first-use order."""
+    return list(dict.fromkeys(spec["agent"] for spec in task_specs))
+
+
+def output_model(task_specs):
+    """Schema name of a structured (fused) crew's final task, or ``None``."""
+    return task_specs[-1].get("output_model")
+
+
+def finding_bases(task_specs):
+    """What each task's output depends on: a hash of its spec and of every spec before it.
+
+    Specs from ``incremental_task_specs`` carry the basis they have in the full crew.
+    """
+    bases, chain = [], ""
+    for spec in task_specs:
+        if "basis" in spec:
+            chain = spec["basis"]
+        else:
+            chain = hashlib.sha256(f"{chain}\0{result_cache.canonical_json(spec)}".encode("utf-8")).hexdigest()
+        bases.append(chain)
+    return bases
+
+
+def incremental_task_specs(task_specs, findings, bases):
+    """Split ``task_specs`` against an assessment's ``findings`` and their ``bases``: ``(known, remaining)``.
+
+    Leading tasks whose findings are known on the same basis (produced from
+    the same specs, so not for other trends) are skipped (``known`` lists
+    their names) and their text, with any other known finding the first
+    remaining task ``uses``, is added to that task's description in place of
+    the context the skipped tasks would have passed on. Each remaining spec
+    keeps its basis in the full crew under ``"basis"``. ``remaining`` is empty
+    when the final finding is known as well.
+    """
+    full_bases = finding_bases(task_specs)
+    skipped = 0
+    while skipped < len(task_specs) and task_specs[skipped].get("finding") in findings and (
+        bases.get(task_specs[skipped]["finding"]) == full_bases[skipped]
+    ):
+        skipped += 1
+    known = [spec["finding"] for spec in task_specs[:skipped]]
+    remaining = [dict(spec, basis=basis) for spec, basis in zip(task_specs[skipped:], full_bases[skipped:])]
+    if not remaining:
+        return known, remaining
+    context = known + [name for name in remaining[0].get("uses", ()) if name in findings and name not in known]
+    if context:
+        from health_twin.assessments import FINDINGS
+
+        earlier = "\n\n".join(f"{FINDINGS.get(name, name)}:\n{findings[name]}" for name in context)
+        remaining[0]["description"] += (
+            f"\n{_INDENT}Findings already established for this patient (build on them, do not repeat them):\n"
+            f"{earlier}\n"
+        )
+    return known, remaining
+
+
+def record_findings(task_specs, profile, texts, owner=""):
+    """Store the outputs of ``task_specs`` that name a ``finding`` in ``owner``'s view of ``profile``'s assessment.
+
+    ``texts`` holds one output per task; ``None`` for tasks with nothing to
+    record. ``owner`` may also be an iterable of owners (the subscribers of
+    a shared job run), iterated now; each of them gets the findings.
+    """
+    findings, bases = {}, {}
+    for spec, basis, text in zip(task_specs, finding_bases(task_specs), texts):
+        if spec.get("finding") and text:
+            findings[spec["finding"]], bases[spec["finding"]] = text, basis
+    if findings and profile is not None:
+        from health_twin import assessments
+
+        with telemetry.span("assessments.record"):
+            for one in [owner] if isinstance(owner, str) else owner:
+                assessments.get_default().add_findings(profile.to_dict(), findings, bases, one)
+
+
+def crew_fingerprint(task_specs):
+    """Everything about a crew definition that can change its output."""
+    fingerprint = {
+        "tasks": task_specs,
+        "agents": {name: AGENT_SPECS[name] for name in agent_names(task_specs)},
+        "model": model_name(),
+    }
+    if output_model(task_specs):
+        from health_twin import reports
+
+        fingerprint["schema"] = reports.schema(output_model(task_specs))
+    return fingerprint
+
+
+def build_crew(task_specs, agents, **crew_kwargs):
+    """Build a sequential ``Crew`` from ``task_specs`` and a ``{name: Agent}`` mapping."""
+    from crewai import Task, Crew, Process
+
+    tasks = []
+    for spec in task_specs:
+        structured = {}
+        if spec.get("output_model"):
+            from health_twin import reports
+
+            structured["output_pydantic"] = reports.model(spec["output_model"])
+        tasks.append(Task(
+            description=spec["description"], expected_output=spec["expected_output"], agent=agents[spec["agent"]],
+            **structured
+        ))
+    return Crew(agents=list(agents.values()), tasks=tasks, process=Process.sequential, **crew_kwargs)
+
+
+def cached_result(task_specs, profile):
+    """Return ``(key, cached_text_or_None)`` for a crew run over ``profile``."""
+    with telemetry.span("result_cache.get") as span:
+        key = result_cache.cache_key(profile.to_dict(), crew_fingerprint(task_specs))
+        cached = result_cache.get_default().get(key)
+        span["hits" if cached is not None else "misses"] = 1
+    return key, cached
+
+
+def kickoff(task_specs, profile=None, on_built=None, owner="", **crew_kwargs):
+    """Lease agents, build the crew and run it; returns the ``Crew`` and its output.
+
+    ``on_built`` is called with the ``Crew`` right before kickoff. Findings are
+    recorded for ``owner``. The task
+    descriptions are complete as built (the profile is already rendered into
+    them), so no ``inputs`` are passed: CrewAI would interpolate them into the
+    descriptions and fail on any ``{...}`` in user text or earlier findings.
+    """
+    names = agent_names(task_specs)
+    with lease_agents(*names) as leased:
+        with telemetry.span("crew.build", crew="+".join(names)):
+            crew = build_crew(task_specs, dict(zip(names, leased)), **crew_kwargs)
+        if on_built is not None:
+            on_built(crew)
+        telemetry.attach_crew(crew)
+        try:
+            with telemetry.span("crew.kickoff", crew="+".join(names)):
+                output = crew.kickoff()
+        finally:
+            telemetry.detach_crew(crew)
+        record_findings(task_specs, profile, [task.output.raw if task.output else None for task in crew.tasks], owner)
+        return crew, output
+
+
+def output_text(output):
+    """Text of a crew output; structured outputs as their JSON."""
+    structured = getattr(output, "pydantic", None)
+    return structured.model_dump_json() if structured is not None else str(output)
+
+
+def render_result(task_specs, text):
+    """Markdown for a ``run_crew`` result: structured results are rendered, plain text is returned as is."""
+    if not output_model(task_specs):
+        return text
+    from health_twin import reports
+
+    return reports.render(output_model(task_specs), text)
+
+
+def run_crew(task_specs, profile=None, use_cache=True, owner="", **crew_kwargs):
+    """Run a crew for ``task_specs`` and return its final output as text.
+
+    When a ``HealthProfile`` is given the result is cached on disk, keyed by
+    the canonical profile plus the crew fingerprint, and a hit skips the LLM.
+    Findings are recorded for ``owner``. ``crew_kwargs`` (e.g.
+    ``task_callback``) are passed to the ``Crew``.
+    """
+    key = None
+    if use_cache and profile is not None:
+        key, cached = cached_result(task_specs, profile)
+        if cached is not None:
+            record_findings(task_specs, profile, [None] * (len(task_specs) - 1) + [cached], owner)
+            return cached
+
+    _, output = kickoff(task_specs, profile, owner=owner, **crew_kwargs)
+    result = output_text(output)
+
+    if key is not None:
+        result_cache.get_default().put(key, result)
+    return result
+
+
+def _risk_section_specs(profile, trends=""):
+    # The risk crew does not use the survey history, on its page either
+    return risk_task_specs(profile)
+
+
+# Independent crews that make up the combined assessment, in report order. Each spec factory
+# takes the profile and the owner's trend summary, as the section's own page builds it
+ASSESSMENT_SECTIONS = (
+    ("analysis", "🩺 Health Analysis & Lifestyle Plan", analysis_task_specs),
+    ("risk", "⚠️ Future Health Risks & Preventive Care", _risk_section_specs),
+)
+
+
+def owner_trends(owner):
+    """``owner``'s ``history.trend_summary`` (``""`` without an owner or history)."""
+    if not owner:
+        return ""
+    from health_twin import history
+
+    return history.trend_summary(history.get_default().trends(owner))
+
+
+def iter_full_assessment(profile, use_cache=True, owner="", check=None, trends=None):
+    """Run the analysis and risk crews concurrently over one profile.
+
+    The two first-stage tasks (Health Data Analyst, Health Risk Specialist)
+    start together, and each follow-up task starts as soon as its own
+    predecessor finishes, so wall-clock time tracks the slower chain rather
+    than the sum of both. Yields ``(section_key, text)`` in completion order.
+    The analysis includes ``trends`` (by default ``owner``'s survey trends),
+    as on the analysis page. With ``use_cache``, ``owner``'s findings already
+    in the profile's assessment are reused (when produced from the same
+    specs) and only the tasks after them run. ``owner`` may be an iterable
+    of owners: findings are read from the first and recorded for each. ``check`` (e.g. ``JobContext.check``) is called
+    after every task and may raise to stop both chains; closing the generator
+    early returns at once, and the crew still running stops at its next task.
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    owners = [owner] if isinstance(owner, str) else list(owner)
+    findings, bases = {}, {}
+    if use_cache and owners:
+        from health_twin import assessments
+
+        assessment = assessments.get_default().get(result_cache.profile_hash(profile.to_dict()), owners[0])
+        if assessment is not None:
+            findings, bases = assessment["findings"], assessment["bases"]
+
+    if trends is None:
+        trends = owner_trends(owners[0] if owners else "")
+    crew_kwargs = {"task_callback": lambda output: check()} if check is not None else {}
+    pool = ThreadPoolExecutor(max_workers=len(ASSESSMENT_SECTIONS), thread_name_prefix="assessment")
+    try:
+        futures = {}
+        for key, _, specs in ASSESSMENT_SECTIONS:
+            known, remaining = incremental_task_specs(specs(profile, trends), findings, bases)
+            if not remaining:
+                yield key, findings[known[-1]]
+                continue
+            futures[pool.submit(telemetry.bind(run_crew), remaining, profile, use_cache, owner, **crew_kwargs)] = key
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+    finally:
+        # Not a ``with`` block: that would join the other crew when the run is cancelled
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def run_full_assessment(profile, use_cache=True, owner=""):
+    """Blocking form of ``iter_full_assessment``; returns ``{section_key: text}``."""
+    return dict(iter_full_assessment(profile, use_cache, owner))
+
+
+def assessment_report(results):
+    """Combine ``run_full_assessment`` results into one markdown report."""
+    return "\n\n".join(f"## {title}\n\n{results[key]}" for key, title, _ in ASSESSMENT_SECTIONS if key in results)
@@ -0,0 +1,153 @@
+"""Embedding backends for the PDF chatbot.
+
+``CachedEmbeddings`` wraps any LangChain embedder with a chunk-level cache:
+vectors are stored in SQLite under ``(model, sha256(chunk))``, so boilerplate
+shared between documents (lab-report headers, report templates) is embedded
+once. Only cache misses are sent to the underlying model, deduplicated and
+in batches of ``batch_size``.
+
+``HashingEmbeddings`` is a dependency-free local embedder (signed feature
+hashing of word unigrams and bigrams) for indexing without network access
+and for offline benchmarks.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from health_twin import telemetry
+from health_twin.result_cache import DEFAULT_DIR
+
+# "openai" (default) or "hashing" for fully offline indexing
+BACKEND = os.getenv("HEALTH_TWIN_EMBEDDINGS", "openai")
+DEFAULT_BATCH_SIZE = int(os.getenv("HEALTH_TWIN_EMBED_BATCH_SIZE", 256))
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+
+
+class HashingEmbeddings(Embeddings):
+    """Deterministic bag-of-words embeddings via the hashing trick."""
+
+    def __init__(self, dim=512):
+        self.dim = dim
+        self.model = f"hashing-{dim}"
+
+    def _features(self, text):
+        tokens = _TOKEN.findall(text.lower())
+        return tokens + [a + " " + b for a, b in zip(tokens, tokens[1:])]
+
+    def _embed(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in self._features(text):
+            h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+            vector[h % self.dim] += 1.0 if h >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+class CachedEmbeddings(Embeddings):
+    """Chunk-level embedding cache in front of another ``Embeddings``."""
+
+    def __init__(self, base, path, model=None, batch_size=DEFAULT_BATCH_SIZE):
+        self.base = base
+        self.model = model or getattr(base, "model", type(base).__name__)
+        self.batch_size = batch_size
+        self.hits = 0
+        self.misses = 0
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS vectors ("
+            "model TEXT NOT NULL, hash BLOB NOT NULL, vector BLOB NOT NULL, PRIMARY KEY (model, hash))"
+        )
+
+    def _lookup(self, hashes):
+        found = {}
+        unique = list(set(hashes))
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(unique), 500):
+                part = unique[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT hash, vector FROM vectors WHERE model = ? AND hash IN ({','.join('?' * len(part))})",
+                    [self.model, *part],
+                )
+                for digest, blob in rows:
+                    found[digest] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def _store(self, items):
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO vectors (model, hash, vector) VALUES (?, ?, ?)",
+                [(self.model, digest, np.asarray(vector, dtype=np.float32).tobytes()) for digest, vector in items],
+            )
+            self._conn.execute("COMMIT")
+
+    def embed_documents(self, texts):
+        with telemetry.span("embed.documents", texts=len(texts)) as span:
+            hashes = [hashlib.sha256(text.encode("utf-8")).digest() for text in texts]
+            vectors = self._lookup(hashes)
+
+            pending = {}
+            for digest, text in zip(hashes, texts):
+                if digest not in vectors:
+                    pending.setdefault(digest, text)
+            hits = len(texts) - sum(1 for digest in hashes if digest in pending)
+            span.update(hits=hits, misses=len(pending))
+            with self._lock:
+                self.hits += hits
+                self.misses += len(pending)
+
+            items = list(pending.items())
+            for start in range(0, len(items), self.batch_size):
+                batch = items[start:start + self.batch_size]
+                with telemetry.span("embed.request", texts=len(batch)):
+                    embedded = self.base.embed_documents([text for _, text in batch])
+                fresh = list(zip((digest for digest, _ in batch), embedded))
+                self._store(fresh)
+                vectors.update(fresh)
+            return [list(vectors[digest]) for digest in hashes]
+
+    def embed_query(self, text):
+        with telemetry.span("embed.query"):
+            return self.base.embed_query(text)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+_default = {}
+_default_lock = threading.Lock()
+
+
+def get_embeddings(backend=None):
+    """Process-wide cached embedder for ``backend`` (defaults to ``HEALTH_TWIN_EMBEDDINGS``)."""
+    backend = backend or BACKEND
+    with _default_lock:
+        if backend not in _default:
+            if backend == "hashing":
+                base = HashingEmbeddings()
+            elif backend == "openai":
+                from langchain_community.embeddings import OpenAIEmbeddings
+
+                base = OpenAIEmbeddings()
+            else:
+                raise ValueError(f"Unknown embeddings backend: {backend!r}")
+            _default[backend] = CachedEmbeddings(base, os.path.join(DEFAULT_DIR, "embeddings.sqlite3"))
+        return _default[backend]
@@ -0,0 +1,322 @@
+"""Process-wide gateway in front of every LLM call.
+
+All crews (through ``agents.make_llm``) and the PDF chat's ``ChatOpenAI``
+call the model through one ``Gateway``, which
+
+* admits calls through token buckets for requests and tokens per minute, plus
+  a cap on calls in flight, so a burst of users queues here instead of
+  tripping the provider's rate limits;
+* serves waiting calls by lane: ``interactive`` (chat turns) before
+  ``default`` (page crews) before ``batch`` (background jobs, the batch CLI),
+  first come first served within a lane;
+* coalesces identical calls already in flight (same model, messages and
+  parameters): the second caller waits for the first call's answer instead
+  of paying for it again;
+* empties the buckets when the provider answers with a rate-limit error, so
+  every caller backs off together rather than retrying at once.
+
+Token costs are estimated before a call and reconciled with the reported
+usage afterwards. Settings (``0`` turns a limit off):
+
+``HEALTH_TWIN_LLM_RPM``          requests per minute (default 500)
+``HEALTH_TWIN_LLM_TPM``          tokens per minute (default 200000)
+``HEALTH_TWIN_LLM_CONCURRENCY``  calls in flight (default 16)
+``HEALTH_TWIN_LLM_GATEWAY``      ``0`` lets crews call the model directly
+"""
+import contextvars
+import hashlib
+import heapq
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+from health_twin import telemetry
+from health_twin.result_cache import canonical_json
+
+RPM = float(os.getenv("HEALTH_TWIN_LLM_RPM", 500))
+TPM = float(os.getenv("HEALTH_TWIN_LLM_TPM", 200000))
+CONCURRENCY = int(os.getenv("HEALTH_TWIN_LLM_CONCURRENCY", 16))
+ENABLED = os.getenv("HEALTH_TWIN_LLM_GATEWAY", "1") == "1"
+
+LANES = {"interactive": 0, "default": 1, "batch": 2}
+# Completion tokens assumed for a call until its usage is known
+COMPLETION_ESTIMATE = 500
+
+_lane = contextvars.ContextVar("health_twin_llm_lane", default="default")
+
+
+@contextmanager
+def lane(name):
+    """Send the LLM calls made in this block (and in threads bound to it) through lane ``name``."""
+    if name not in LANES:
+        raise ValueError(f"Unknown LLM lane: {name!r}")
+    token = _lane.set(name)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def current_lane():
+    return _lane.get()
+
+
+def estimate_tokens(messages, max_tokens=None):
+    """Rough token cost of a call: about four characters per prompt token, plus the completion."""
+    if isinstance(messages, str):
+        chars = len(messages)
+    else:
+        chars = sum(len(str(m.get("content", "")) if isinstance(m, dict) else str(m)) for m in messages)
+    return chars // 4 + int(max_tokens or COMPLETION_ESTIMATE)
+
+
+def request_key(**request):
+    """Single-flight key over everything that determines an LLM answer."""
+    return hashlib.sha256(canonical_json(request).encode("utf-8")).hexdigest()
+
+
+def _is_rate_limit(exc):
+    return "ratelimit" in type(exc).__name__.lower() or getattr(exc, "status_code", None) == 429
+
+
+class Gateway:
+    """Token-bucket admission with priority lanes and single-flight; shared by all threads."""
+
+    def __init__(self, rpm=RPM, tpm=TPM, concurrency=CONCURRENCY):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.concurrency = concurrency
+        self._cond = threading.Condition()
+        self._requests = rpm
+        self._tokens = tpm
+        self._refilled = time.monotonic()
+        self._active = 0
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._inflight = {}
+        self.calls = 0
+        self.coalesced = 0
+        self.rate_limited = 0
+        self.waited = 0.0
+
+    def _refill(self, now):
+        elapsed = now - self._refilled
+        self._refilled = now
+        if self.rpm:
+            self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60.0)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60.0)
+
+    def _shortfall(self, tokens):
+        """Seconds until the buckets hold one request and ``tokens`` tokens (0 when they do)."""
+        wait = 0.0
+        if self.rpm and self._requests < 1:
+            wait = (1 - self._requests) * 60.0 / self.rpm
+        if self.tpm:
+            # A call larger than the whole bucket only waits for a full bucket
+            needed = min(tokens, self.tpm)
+            if self._tokens < needed:
+                wait = max(wait, (needed - self._tokens) * 60.0 / self.tpm)
+        return wait
+
+    def acquire(self, priority, tokens):
+        """Block until this call may start; lower ``priority`` values go first."""
+        ticket = [priority, next(self._sequence)]
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    self._refill(time.monotonic())
+                    wait = self._shortfall(tokens)
+                    head = self._waiting[0] is ticket
+                    free = not self.concurrency or self._active < self.concurrency
+                    if head and free and not wait:
+                        heapq.heappop(self._waiting)
+                        if self.rpm:
+                            self._requests -= 1
+                        if self.tpm:
+                            self._tokens -= min(tokens, self.tpm)
+                        self._active += 1
+                        self._cond.notify_all()
+                        return
+                    self._cond.wait(wait if head and free else None)
+            except BaseException:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+                raise
+
+    def release(self, estimated, actual=None, rate_limited=False):
+        """Return a call's slot, charging the bucket for ``actual`` instead of ``estimated`` tokens."""
+        with self._cond:
+            self._active -= 1
+            if rate_limited:
+                # The provider is already over its limit: everyone waits for a refill
+                self.rate_limited += 1
+                self._requests = min(self._requests, 0.0)
+                self._tokens = min(self._tokens, 0.0)
+            elif self.tpm and actual is not None:
+                self._tokens = min(self.tpm, self._tokens + min(estimated, self.tpm) - actual)
+            self._cond.notify_all()
+
+    def call(self, key, fn, tokens, usage=None, priority=None):
+        """Run ``fn()`` once admitted, or join an identical call (same ``key``) already in flight.
+
+        ``usage(result)`` returns the tokens the call actually used, if known.
+        """
+        priority = LANES[current_lane()] if priority is None else priority
+        with telemetry.span("llm.gateway", lane=current_lane()) as span:
+            with self._cond:
+                pending = self._inflight.get(key)
+                if pending is None:
+                    pending = self._inflight[key] = Future()
+                    leader = True
+                    self.calls += 1
+                else:
+                    leader = False
+                    self.coalesced += 1
+            if not leader:
+                span["hits"] = 1
+                return pending.result()
+
+            span["misses"] = 1
+            started = time.perf_counter()
+            try:
+                self.acquire(priority, tokens)
+                waited = time.perf_counter() - started
+                span["wait_ms"] = round(waited * 1000, 3)
+                try:
+                    result = fn()
+                except BaseException as exc:
+                    self.release(tokens, rate_limited=_is_rate_limit(exc))
+                    raise
+                self.release(tokens, usage(result) if usage is not None else None)
+            except BaseException as exc:
+                with self._cond:
+                    del self._inflight[key]
+                pending.set_exception(exc)
+                raise
+            with self._cond:
+                del self._inflight[key]
+                self.waited += waited
+            pending.set_result(result)
+            return result
+
+    def stats(self):
+        with self._cond:
+            waiting = {name: 0 for name in LANES}
+            names = {priority: name for name, priority in LANES.items()}
+            for priority, _ in self._waiting:
+                waiting[names.get(priority, priority)] += 1
+            return {
+                "calls": self.calls,
+                "coalesced": self.coalesced,
+                "rate_limited": self.rate_limited,
+                "active": self._active,
+                "waiting": waiting,
+                "waited_s": round(self.waited, 3),
+            }
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_default():
+    """The process-wide gateway, configured from ``HEALTH_TWIN_LLM_*``."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = Gateway()
+        return _default
+
+
+_classes = {}
+
+
+def _gateway_llm_class():
+    """``BaseLLM`` subclass that forwards to a wrapped CrewAI LLM through the gateway."""
+    if "crewai" in _classes:
+        return _classes["crewai"]
+    from crewai import BaseLLM
+
+    class GatewayLLM(BaseLLM):
+        def __init__(self, inner, gateway=None):
+            super().__init__(model=inner.model, stream=inner.stream, temperature=inner.temperature, stop=inner.stop)
+            self.inner = inner
+            self.gateway = gateway
+
+        def call(self, messages, tools=None, callbacks=None, available_functions=None, from_task=None,
+                 from_agent=None, response_model=None, **kwargs):
+            gateway = self.gateway or get_default()
+            # Agents set their stop words on the LLM they were given
+            self.inner.stop = self.stop
+            key = request_key(
+                model=self.model, messages=messages, stop=self.stop, temperature=self.temperature,
+                tools=tools, response_model=getattr(response_model, "__name__", None),
+            )
+            used_before = self.inner.get_token_usage_summary().total_tokens
+
+            def usage(_):
+                # Agents are leased to one crew at a time, so the difference is this call's usage
+                return self.inner.get_token_usage_summary().total_tokens - used_before or None
+
+            return gateway.call(
+                key,
+                lambda: self.inner.call(
+                    messages, tools=tools, callbacks=callbacks, available_functions=available_functions,
+                    from_task=from_task, from_agent=from_agent, response_model=response_model, **kwargs
+                ),
+                estimate_tokens(messages, self.inner.max_tokens),
+                usage=usage,
+            )
+
+        def supports_function_calling(self):
+            return self.inner.supports_function_calling()
+
+        def supports_stop_words(self):
+            return self.inner.supports_stop_words()
+
+        def get_context_window_size(self):
+            return self.inner.get_context_window_size()
+
+    _classes["crewai"] = GatewayLLM
+    return GatewayLLM
+
+
+def wrap_llm(llm, gateway=None):
+    """Route a CrewAI LLM's calls through the gateway."""
+    return _gateway_llm_class()(llm, gateway)
+
+
+def _langchain_usage(result):
+    usage = (result.llm_output or {}).get("token_usage") or {}
+    return usage.get("total_tokens")
+
+
+def chat_openai(**kwargs):
+    """LangChain ``ChatOpenAI`` whose completions go through the gateway, in the ``interactive`` lane."""
+    if "langchain" not in _classes:
+        from langchain_community.chat_models import ChatOpenAI
+
+        class GatewayChatOpenAI(ChatOpenAI):
+            def _generate(self, messages, stop=None, run_manager=None, **call_kwargs):
+                prompt = [{"role": m.type, "content": m.content} for m in messages]
+                key = request_key(
+                    model=self.model_name, messages=prompt, stop=stop, temperature=self.temperature,
+                    kwargs=call_kwargs,
+                )
+                parent = super()._generate
+                with lane("interactive"):
+                    return get_default().call(
+                        key,
+                        lambda: parent(messages, stop=stop, run_manager=run_manager, **call_kwargs),
+                        estimate_tokens(prompt, self.max_tokens),
+                        usage=_langchain_usage,
+                    )
+
+        _classes["langchain"] = GatewayChatOpenAI
+    return _classes["langchain"](**kwargs)
@@ -0,0 +1,285 @@
+"""Per-user history of survey snapshots with incrementally maintained trends.
+
+Every survey submitted on ``pages/health_survey.py`` is appended to its
+owner's history: one raw float64 file per metric (``time.f64``,
+``weight.f64``, ...), written append-only and read back with
+``np.fromfile``. Next to the columns, ``trends.json`` keeps running sums
+per metric (count, Σt, Σt², Σy, Σty, first, previous, last, lowest and
+highest value), so the least-squares slope over the whole history is
+updated in O(1) per snapshot and never requires reading the columns again.
+
+The crews receive ``trend_summary(trends)``: a fixed-size block of the
+latest values, the change since the previous survey and the slope per
+week, however many surveys the user has submitted.
+
+Inspect a history with::
+
+    python -m health_twin.history show OWNER
+    python -m health_twin.history rebuild OWNER   # recompute trends.json from the columns
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import shutil
+import sys
+import threading
+import time
+
+import numpy as np
+
+from health_twin.result_cache import DEFAULT_DIR, profile_hash
+
+# Representative values for the survey's answer bands
+SLEEP_HOURS = {"Less than 5": 4.5, "5-7": 6.0, "7-9": 8.0, "More than 9": 9.5}
+WATER_LITERS = {"Less than 1L": 0.75, "1-2L": 1.5, "More than 2L": 2.25}
+EXERCISE_PER_WEEK = {"Never": 0.0, "1-2 times a week": 1.5, "3-5 times a week": 4.0, "Daily": 7.0}
+
+# (column, label, unit, decimals); "time" (Unix seconds) is always the first column
+METRICS = (
+    ("weight", "Weight", " kg", 1),
+    ("bmi", "BMI", "", 1),
+    ("sleep_hours", "Sleep", " h/night", 1),
+    ("stress_level", "Stress", "/10", 1),
+    ("water_liters", "Water", " L/day", 2),
+    ("exercise_per_week", "Exercise", " sessions/week", 1),
+    ("lifestyle_score", "Lifestyle risk score", "", 0),
+    ("total_score", "Overall risk score", "", 0),
+)
+COLUMNS = ("time",) + tuple(name for name, *_ in METRICS)
+
+DAY = 24 * 3600.0
+
+
+def _number(value, table=None):
+    if table is not None and value in table:
+        return table[value]
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return math.nan
+    return number if math.isfinite(number) else math.nan
+
+
+def snapshot_row(survey, now=None):
+    """One history row (``COLUMNS`` order, NaN for unknown answers) for a survey dict."""
+    from health_twin.scoring import score_profile
+
+    score = score_profile(survey)
+    return (
+        time.time() if now is None else now,
+        _number(survey.get("weight")),
+        score["bmi"] if score["bmi"] is not None else math.nan,
+        _number(survey.get("sleep"), SLEEP_HOURS),  # older exports store hours
+        _number(survey.get("stress_level")),
+        _number(survey.get("water"), WATER_LITERS),
+        _number(survey.get("exercise"), EXERCISE_PER_WEEK),
+        float(score["lifestyle_score"]),
+        float(score["total_score"]),
+    )
+
+
+def empty_trends():
+    return {
+        "rows": 0,
+        "origin": None,
+        "first_time": None,
+        "last_time": None,
+        "last_profile": None,
+        "metrics": {
+            name: {
+                "n": 0, "st": 0.0, "stt": 0.0, "sy": 0.0, "sty": 0.0,
+                "first": None, "previous": None, "last": None, "low": None, "high": None,
+            }
+            for name, *_ in METRICS
+        },
+    }
+
+
+def update_trends(trends, row, digest=None):
+    """Fold one ``snapshot_row`` into ``trends`` in place; unknown values are skipped per metric."""
+    timestamp = row[0]
+    if trends["origin"] is None:
+        trends["origin"] = trends["first_time"] = timestamp
+    trends["rows"] += 1
+    trends["last_time"] = timestamp
+    trends["last_profile"] = digest
+    # Days since the first snapshot keep the sums well conditioned
+    t = (timestamp - trends["origin"]) / DAY
+    for (name, *_), value in zip(METRICS, row[1:]):
+        if math.isnan(value):
+            continue
+        sums = trends["metrics"][name]
+        sums["n"] += 1
+        sums["st"] += t
+        sums["stt"] += t * t
+        sums["sy"] += value
+        sums["sty"] += t * value
+        if sums["first"] is None:
+            sums["first"] = sums["low"] = sums["high"] = value
+        sums["low"], sums["high"] = min(sums["low"], value), max(sums["high"], value)
+        sums["previous"], sums["last"] = sums["last"], value
+    return trends
+
+
+def slope_per_week(sums):
+    """Least-squares slope of a metric per week, or ``None`` with fewer than two dated points."""
+    n = sums["n"]
+    denominator = n * sums["stt"] - sums["st"] ** 2
+    # All snapshots on (nearly) the same day: no meaningful rate
+    if n < 2 or denominator <= 1e-9 * max(1.0, n * sums["stt"]):
+        return None
+    return 7.0 * (n * sums["sty"] - sums["st"] * sums["sy"]) / denominator
+
+
+def _signed(value, decimals):
+    return f"{value:+.{decimals}f}"
+
+
+def trend_summary(trends):
+    """Compact prompt block of the latest values, last change and weekly slope; ``""`` without history."""
+    if trends["rows"] < 2:
+        return ""
+    first = time.strftime("%Y-%m-%d", time.localtime(trends["first_time"]))
+    last = time.strftime("%Y-%m-%d", time.localtime(trends["last_time"]))
+    parts = []
+    for name, label, unit, decimals in METRICS:
+        sums = trends["metrics"][name]
+        if sums["last"] is None:
+            continue
+        part = f"{label} {sums['last']:.{decimals}f}{unit}"
+        if sums["n"] > 1 and sums["low"] == sums["high"]:
+            parts.append(f"{part} (unchanged)")
+            continue
+        changes = []
+        if sums["previous"] is not None:
+            changes.append(f"{_signed(sums['last'] - sums['previous'], decimals)} since last survey")
+            changes.append(f"{_signed(sums['last'] - sums['first'], decimals)} overall")
+        slope = slope_per_week(sums)
+        if slope is not None:
+            changes.append(f"trend {_signed(slope, max(decimals, 2))}/week")
+        parts.append(part + (f" ({', '.join(changes)})" if changes else ""))
+    return (
+        f"Longitudinal trends over {trends['rows']} surveys ({first} to {last}): "
+        + "; ".join(parts) + "."
+    )
+
+
+class HistoryStore:
+    """Append-only column files per owner; safe to share between Streamlit session threads."""
+
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def _folder(self, owner):
+        # Owners are emails or browser ids; hash them into a safe directory name
+        return os.path.join(self.root, hashlib.sha256(owner.encode("utf-8")).hexdigest()[:32])
+
+    def _load(self, folder):
+        try:
+            with open(os.path.join(folder, "trends.json"), encoding="utf-8") as state:
+                return json.load(state)
+        except FileNotFoundError:
+            return empty_trends()
+
+    def _store(self, folder, trends):
+        staging = os.path.join(folder, f"trends.json.{threading.get_ident()}")
+        with open(staging, "w", encoding="utf-8") as state:
+            json.dump(trends, state)
+        os.replace(staging, os.path.join(folder, "trends.json"))
+
+    def append(self, owner, survey, now=None):
+        """Add ``survey`` to ``owner``'s history and return the updated trends.
+
+        Re-submitting the same answers as the latest snapshot is not recorded again.
+        """
+        digest = profile_hash(survey)
+        row = snapshot_row(survey, now)
+        folder = self._folder(owner)
+        with self._lock:
+            os.makedirs(folder, exist_ok=True)
+            trends = self._load(folder)
+            if trends["last_profile"] == digest:
+                return trends
+            size = trends["rows"] * 8
+            for name, value in zip(COLUMNS, row):
+                with open(os.path.join(folder, f"{name}.f64"), "ab") as column:
+                    # Drop the tail of an append that never made it into trends.json
+                    if column.tell() != size:
+                        column.truncate(size)
+                    column.write(np.float64(value).tobytes())
+            # trends.json is replaced last: it is the commit point of the append
+            self._store(folder, update_trends(trends, row, digest))
+            return trends
+
+    def trends(self, owner):
+        """Running trend state for ``owner`` (see ``trend_summary``); empty without history."""
+        with self._lock:
+            return self._load(self._folder(owner))
+
+    def columns(self, owner):
+        """``owner``'s full history as ``{column: float64 array}``, oldest first."""
+        folder = self._folder(owner)
+        with self._lock:
+            rows = self._load(folder)["rows"]
+            if not rows:
+                return {name: np.empty(0) for name in COLUMNS}
+            return {name: np.fromfile(os.path.join(folder, f"{name}.f64"), count=rows) for name in COLUMNS}
+
+    def rebuild(self, owner):
+        """Recompute the trend state from the column files (e.g. after changing ``METRICS``)."""
+        data = self.columns(owner)
+        trends = empty_trends()
+        for row in zip(*(data[name].tolist() for name in COLUMNS)):
+            update_trends(trends, row)
+        folder = self._folder(owner)
+        with self._lock:
+            trends["last_profile"] = self._load(folder)["last_profile"]
+            if trends["rows"]:
+                self._store(folder, trends)
+        return trends
+
+    def delete(self, owner):
+        with self._lock:
+            shutil.rmtree(self._folder(owner), ignore_errors=True)
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_default():
+    """Process-wide history store under ``HEALTH_TWIN_CACHE_DIR``."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = HistoryStore(os.path.join(DEFAULT_DIR, "history"))
+        return _default
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect a user's survey history and trends.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    show_parser = commands.add_parser("show", help="Print an owner's snapshots and trend summary")
+    show_parser.add_argument("owner")
+    rebuild_parser = commands.add_parser("rebuild", help="Recompute an owner's trends from the stored columns")
+    rebuild_parser.add_argument("owner")
+    args = parser.parse_args(argv)
+
+    store = get_default()
+    if args.command == "show":
+        data = store.columns(args.owner)
+        print("date              " + "  ".join(f"{name:>17}" for name in COLUMNS[1:]))
+        for index, timestamp in enumerate(data["time"]):
+            date = time.strftime("%Y-%m-%d %H:%M", time.localtime(timestamp))
+            print(f"{date:16}  " + "  ".join(f"{data[name][index]:>17.2f}" for name in COLUMNS[1:]))
+        print(trend_summary(store.trends(args.owner)) or f"{len(data['time'])} snapshot(s); no trends yet")
+    else:
+        print(trend_summary(store.rebuild(args.owner)) or "no trends yet")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
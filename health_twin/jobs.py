@@ -0,0 +1,604 @@
+"""Background crew runs: a SQLite-backed job queue and a bounded worker pool.
+
+Pages submit a job (``kind`` plus a JSON payload) and get its id back at
+once; a fixed set of worker threads claims queued jobs and runs them, so a
+Streamlit script thread is never held for the length of an LLM call. Every
+crew the pages run goes through here: the analysis and risk crews, the full
+assessment, educator answers and therapist turns. A streamed run publishes
+the text generated so far as progress. The page keeps the id in the URL
+(``?job=...``) and polls the job from a fragment, so reloading or navigating
+back picks the same run up again. Each run's telemetry trace (crew, task
+and LLM call timings) is kept with the job, so the page's debug panel shows
+the run's breakdown once it finishes rather than only the submit.
+
+Jobs with identical kind and payload that are still queued or running are
+shared: a second submit returns the first job's id and adds the caller as a
+subscriber. Payloads hold only what the run's output depends on; who asked
+is kept in the subscriber rows, so identical runs for different users are
+shared too, and runners record findings for every subscriber. ``cancel``
+removes a subscriber; once nobody is waiting, a queued job is dropped and a
+running one stops at its next checkpoint (between crew tasks). Jobs left
+``running`` by a server that went away are re-queued once their heartbeat
+is stale.
+
+``HEALTH_TWIN_JOB_WORKERS`` sets the pool size (default 4). Inspect the queue
+with::
+
+    python -m health_twin.jobs list
+    python -m health_twin.jobs cancel JOB_ID
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+
+from health_twin import telemetry
+from health_twin.result_cache import DEFAULT_DIR, canonical_json
+
+WORKERS = int(os.getenv("HEALTH_TWIN_JOB_WORKERS", 4))
+# Finished jobs (and their results) are kept this long for pages that reload
+JOB_TTL = float(os.getenv("HEALTH_TWIN_JOB_TTL", 24 * 3600))
+# Running jobs refresh their heartbeat this often; three missed beats re-queue them
+HEARTBEAT = 15.0
+POLL_INTERVAL = 1.0
+# Streamed runs publish partial text, and their pages poll, this often
+STREAM_INTERVAL = 0.25
+
+ACTIVE = ("queued", "running")
+FINISHED = ("done", "failed", "cancelled")
+
+FIELDS = (
+    "id", "kind", "payload", "status", "progress", "result", "error",
+    "cancel_requested", "created", "started", "finished",
+)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job at a checkpoint once every subscriber has cancelled it."""
+
+
+_runners = {}
+
+
+def runner(kind):
+    """Register ``fn(payload, job)`` as the runner for jobs of ``kind``; it returns the result text."""
+    def register(fn):
+        _runners[kind] = fn
+        return fn
+    return register
+
+
+class JobContext:
+    """Handle passed to a runner for reporting progress and honouring cancellation."""
+
+    def __init__(self, queue, job_id):
+        self.queue = queue
+        self.id = job_id
+        self._progress = {}
+
+    def check(self):
+        """Raise ``JobCancelled`` if the job has been cancelled."""
+        if self.queue._cancel_requested(self.id):
+            raise JobCancelled(self.id)
+
+    def owners(self):
+        """The job's current subscribers."""
+        return self.queue._owners(self.id)
+
+    def progress(self, key, value):
+        """Publish a partial result under ``key`` (shown while polling), then check for cancellation."""
+        self._progress[key] = value
+        self.queue._set_progress(self.id, self._progress)
+        self.check()
+
+
+class _Subscribers:
+    """A job's subscribers, read again on every iteration, so findings recorded at the end reach late joiners."""
+
+    def __init__(self, job):
+        self.job = job
+
+    def __iter__(self):
+        return iter(self.job.owners())
+
+
+class JobQueue:
+    """Durable job queue with an in-process worker pool; safe to share between Streamlit session threads."""
+
+    def __init__(self, path, workers=WORKERS, ttl=JOB_TTL):
+        self.path = path
+        self.workers = workers
+        self.ttl = ttl
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self._running = set()
+        self._threads = []
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, key TEXT NOT NULL, kind TEXT NOT NULL, payload TEXT NOT NULL, "
+            "status TEXT NOT NULL, progress TEXT, result TEXT, error TEXT, "
+            "cancel_requested INTEGER NOT NULL DEFAULT 0, "
+            "created REAL NOT NULL, started REAL, finished REAL, heartbeat REAL)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "trace" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN trace TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key, status)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_owners (job_id TEXT NOT NULL, owner TEXT NOT NULL, "
+            "PRIMARY KEY (job_id, owner))"
+        )
+
+    # -- submitting and watching ------------------------------------------------
+
+    def submit(self, kind, payload, owner=""):
+        """Queue a ``kind`` job for ``payload`` on behalf of ``owner``; returns the job id.
+
+        An identical job that is still queued or running is reused instead.
+        """
+        if kind not in _runners:
+            raise ValueError(f"Unknown job kind: {kind!r}")
+        body = canonical_json(payload)
+        key = hashlib.sha256(f"{kind}\0{body}".encode("utf-8")).hexdigest()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT id FROM jobs WHERE key = ? AND status IN ('queued', 'running') AND cancel_requested = 0",
+                    (key,),
+                ).fetchone()
+                if row is not None:
+                    job_id = row[0]
+                else:
+                    job_id = uuid.uuid4().hex
+                    self._conn.execute(
+                        "INSERT INTO jobs (id, key, kind, payload, status, created) VALUES (?, ?, ?, ?, 'queued', ?)",
+                        (job_id, key, kind, body, time.time()),
+                    )
+                self._conn.execute("INSERT OR IGNORE INTO job_owners (job_id, owner) VALUES (?, ?)", (job_id, owner))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        self.start()
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def get(self, job_id):
+        """The job as a dict (``payload`` and ``progress`` decoded), or ``None`` once it has expired."""
+        with self._lock:
+            row = self._conn.execute(f"SELECT {', '.join(FIELDS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(FIELDS, row))
+        job["payload"] = json.loads(job["payload"])
+        job["progress"] = json.loads(job["progress"]) if job["progress"] else {}
+        return job
+
+    def trace(self, job_id):
+        """The finished run's telemetry trace (``Trace.to_dict()``), or ``None``."""
+        with self._lock:
+            row = self._conn.execute("SELECT trace FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row is not None and row[0] else None
+
+    def wait(self, job_id, timeout=None, interval=0.05):
+        """Block until the job finishes (or ``timeout`` passes); returns the job dict."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job["status"] in FINISHED:
+                return job
+            if deadline is not None and time.monotonic() >= deadline:
+                return job
+            time.sleep(interval)
+
+    def list(self, owner=None, limit=50):
+        """Most recent jobs, optionally only those ``owner`` subscribed to."""
+        columns = ", ".join(f"j.{name}" for name in FIELDS)
+        with self._lock:
+            if owner is None:
+                rows = self._conn.execute(
+                    f"SELECT {columns} FROM jobs j ORDER BY j.created DESC LIMIT ?", (limit,)
+                ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    f"SELECT {columns} FROM jobs j JOIN job_owners o ON o.job_id = j.id "
+                    "WHERE o.owner = ? ORDER BY j.created DESC LIMIT ?",
+                    (owner, limit),
+                ).fetchall()
+        return [dict(zip(FIELDS, row), payload=None, progress=None) for row in rows]
+
+    def cancel(self, job_id, owner=None):
+        """Withdraw ``owner`` (everyone when ``None``) from the job; returns its new status.
+
+        The job itself is cancelled only when no subscriber is left.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if owner is None:
+                    self._conn.execute("DELETE FROM job_owners WHERE job_id = ?", (job_id,))
+                else:
+                    self._conn.execute("DELETE FROM job_owners WHERE job_id = ? AND owner = ?", (job_id, owner))
+                (waiting,) = self._conn.execute(
+                    "SELECT COUNT(*) FROM job_owners WHERE job_id = ?", (job_id,)
+                ).fetchone()
+                if not waiting:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'cancelled', cancel_requested = 1, finished = ? "
+                        "WHERE id = ? AND status = 'queued'",
+                        (now, job_id),
+                    )
+                    self._conn.execute(
+                        "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,)
+                    )
+                row = self._conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return row[0] if row is not None else None
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {status: counts.get(status, 0) for status in ACTIVE + FINISHED}
+
+    # -- workers ----------------------------------------------------------------
+
+    def start(self):
+        """Start the worker threads and the heartbeat thread (once per queue)."""
+        with self._wakeup:
+            if self._threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"job-worker-{index}", daemon=True)
+                self._threads.append(thread)
+            self._threads.append(threading.Thread(target=self._maintain, name="job-heartbeat", daemon=True))
+            for thread in self._threads:
+                thread.start()
+
+    def _claim(self):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "UPDATE jobs SET status = 'running', started = ?, heartbeat = ? WHERE id = ("
+                "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created LIMIT 1) "
+                "RETURNING id, kind, payload",
+                (now, now),
+            ).fetchone()
+            if row is not None:
+                self._running.add(row[0])
+        return row
+
+    def _work(self):
+        while True:
+            claimed = self._claim()
+            if claimed is None:
+                # Also re-checks the table, for jobs queued by another server process
+                with self._wakeup:
+                    self._wakeup.wait(POLL_INTERVAL)
+                continue
+            self._run(*claimed)
+
+    def _run(self, job_id, kind, payload):
+        status, result, error, trace = "done", None, None, None
+        try:
+            with telemetry.request(f"job.{kind}", job=job_id) as trace:
+                context = JobContext(self, job_id)
+                context.check()
+                result = _runners[kind](json.loads(payload), context)
+        except JobCancelled:
+            status = "cancelled"
+        except Exception as exc:  # reported to the page through the job record
+            status, error = "failed", f"{type(exc).__name__}: {exc}"
+        trace_json = json.dumps(trace.to_dict(), ensure_ascii=False, default=str) if trace is not None else None
+        with self._lock:
+            self._running.discard(job_id)
+            self._conn.execute(
+                "UPDATE jobs SET status = CASE WHEN cancel_requested THEN 'cancelled' ELSE ? END, "
+                "result = ?, error = ?, finished = ?, trace = ? WHERE id = ?",
+                (status, result, error, time.time(), trace_json, job_id),
+            )
+
+    def _maintain(self):
+        while True:
+            time.sleep(HEARTBEAT)
+            self.maintain()
+
+    def maintain(self, now=None):
+        """One heartbeat: refresh this server's running jobs, re-queue stale ones and drop expired ones."""
+        now = time.time() if now is None else now
+        with self._lock:
+            running = list(self._running)
+            self._conn.executemany("UPDATE jobs SET heartbeat = ? WHERE id = ?", [(now, i) for i in running])
+            # Runs whose server stopped beating are picked up again
+            self._conn.execute(
+                "UPDATE jobs SET status = 'queued' WHERE status = 'running' AND heartbeat < ?",
+                (now - 3 * HEARTBEAT,),
+            )
+            if self.ttl:
+                self._conn.execute(
+                    "DELETE FROM jobs WHERE status IN ('done', 'failed', 'cancelled') AND finished < ?",
+                    (now - self.ttl,),
+                )
+                self._conn.execute("DELETE FROM job_owners WHERE job_id NOT IN (SELECT id FROM jobs)")
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+    def _cancel_requested(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row is None or bool(row[0])
+
+    def _owners(self, job_id):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT owner FROM job_owners WHERE job_id = ? ORDER BY rowid", (job_id,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def _set_progress(self, job_id, progress):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET progress = ?, heartbeat = ? WHERE id = ?",
+                (json.dumps(progress, ensure_ascii=False), time.time(), job_id),
+            )
+
+
+# -- job kinds ----------------------------------------------------------------
+
+def _task_progress(job):
+    """Task callback publishing each finished task's output under ``tasks``."""
+    outputs = []
+
+    def on_task(output):
+        outputs.append(str(output.raw if hasattr(output, "raw") else output))
+        job.progress("tasks", outputs)
+
+    return on_task
+
+
+def _publish_stream(events, job):
+    """Consume ``streaming.stream_run`` events as progress; returns the final text.
+
+    Finished tasks go under ``tasks`` as with ``_task_progress``; the text of
+    the task in progress so far goes under ``partial``, at most every
+    ``STREAM_INTERVAL`` seconds.
+    """
+    outputs, partial, published = [], "", 0.0
+    for kind, _, payload in events:
+        if kind == "token":
+            partial += payload
+            if time.monotonic() - published >= STREAM_INTERVAL:
+                job.progress("partial", partial)
+                published = time.monotonic()
+        elif kind == "task":
+            outputs.append(payload)
+            partial = ""
+            job.progress("partial", partial)
+            job.progress("tasks", outputs)
+        elif kind == "done":
+            return payload
+        else:
+            raise payload
+
+
+@runner("crew")
+def _run_crew(payload, job):
+    """``{"tasks": task_specs, "profile": survey dict or None, "stream": bool}``.
+
+    Progress holds each task's output, and for a streamed run the partial
+    text of the current one. Findings are recorded for every subscriber.
+    """
+    from health_twin.crews import run_crew
+    from health_twin.profile import HealthProfile
+
+    profile = HealthProfile.from_dict(payload["profile"]) if payload.get("profile") else None
+    use_cache, owner = payload.get("use_cache", True), _Subscribers(job)
+    if payload.get("stream"):
+        from health_twin.streaming import stream_crew
+
+        return _publish_stream(stream_crew(payload["tasks"], profile, use_cache, owner), job)
+    return run_crew(payload["tasks"], profile, use_cache, owner, task_callback=_task_progress(job))
+
+
+@runner("educator")
+def _run_educator(payload, job):
+    """``{"question": text, "stream": bool}``; the answer is also added to the semantic answer cache."""
+    from health_twin import semantic_cache
+    from health_twin.crews import educator_task_specs
+
+    crew_payload = {"tasks": educator_task_specs(payload["question"]), "stream": payload.get("stream")}
+    answer = _run_crew(crew_payload, job).strip()
+    semantic_cache.get_default().put(payload["question"], answer)
+    return answer
+
+
+@runner("therapist_turn")
+def _run_therapist_turn(payload, job):
+    """``{"session": session id, "message": text, "stream": bool}``; the reply is recorded in the session.
+
+    Therapist sessions live in server memory, so the turn should run on the
+    server that holds the session; on another one it starts a new session.
+    """
+    from health_twin import sessions
+
+    session = sessions.get_session(payload["session"])
+    if payload.get("stream"):
+        return _publish_stream(sessions.stream_turn(session, payload["message"]), job)
+    return sessions.run_turn(session, payload["message"], _task_progress(job))
+
+
+@runner("full_assessment")
+def _run_full_assessment(payload, job):
+    """``{"profile": survey dict, "trends": trend summary}``; progress holds each finished section by key.
+
+    Findings are read from the first subscriber's assessment and recorded for every subscriber.
+    """
+    from health_twin.crews import assessment_report, iter_full_assessment
+    from health_twin.profile import HealthProfile
+
+    results = {}
+    profile = HealthProfile.from_dict(payload["profile"])
+    sections = iter_full_assessment(
+        profile, payload.get("use_cache", True), _Subscribers(job), job.check, payload.get("trends", "")
+    )
+    for key, text in sections:
+        results[key] = text
+        job.progress(key, text)
+    return assessment_report(results)
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_default():
+    """Process-wide job queue under ``HEALTH_TWIN_CACHE_DIR``; workers start on the first submit."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = JobQueue(os.path.join(DEFAULT_DIR, "jobs.sqlite3"))
+        return _default
+
+
+STATUS_TEXT = {"queued": "Waiting for a free worker", "running": "Working on it"}
+
+
+def st_job(job_id, render, interval=None):
+    """Show job ``job_id`` on the current page, polling it until it finishes.
+
+    ``render(job)`` draws the job's ``progress`` while it runs and its
+    ``result`` once done. Polling happens in a fragment, every ``interval``
+    seconds (by default ``STREAM_INTERVAL`` for streamed runs, else
+    ``POLL_INTERVAL``), so only that part of the page reruns and no script
+    thread waits on the crew. Returns the job dict once it is done, else
+    ``None``. A finished run's trace goes to ``telemetry.st_debug_panel``.
+    """
+    import streamlit as st
+
+    from health_twin.report_store import st_owner
+
+    queue = get_default()
+    job = queue.get(job_id)
+    if job is None:
+        st.warning("⚠️ This request has expired. Please run it again.")
+        return None
+    if job["status"] in FINISHED and telemetry.debug_enabled():
+        telemetry.st_show_trace(queue.trace(job_id))
+    if job["status"] == "done":
+        render(job)
+        return job
+    if job["status"] == "failed":
+        st.error(f"⚠️ The request failed: {job['error']}")
+        return None
+    if job["status"] == "cancelled":
+        st.info("✖️ The request was cancelled.")
+        return None
+    # Resume polling after a reload: make sure this server has workers for it
+    queue.start()
+    if interval is None:
+        interval = STREAM_INTERVAL if job["payload"].get("stream") else POLL_INTERVAL
+
+    @st.fragment(run_every=interval)
+    def poll():
+        job = queue.get(job_id)
+        if job is None or job["status"] in FINISHED:
+            st.rerun()  # a full run renders the final state outside the fragment
+        waited = time.time() - job["created"]
+        status = "Stopping" if job["cancel_requested"] else STATUS_TEXT[job["status"]]
+        st.caption(f"⏳ {status}... ({waited:.0f}s)")
+        if not job["cancel_requested"] and st.button("✖️ Cancel", key=f"cancel_{job_id}"):
+            queue.cancel(job_id, st_owner())
+            st.rerun()
+        render(job)
+
+    poll()
+    return None
+
+
+def st_crew_job(job_id, titles, final=None):
+    """``st_job`` for a job running one crew (``crew``, ``educator`` or ``therapist_turn``), one section per task.
+
+    ``titles`` holds one heading per task of the full crew; ``final`` (e.g. ``st.success``)
+    renders the final text under the last heading. A streamed run shows the
+    text of the task in progress as it grows. ``[name, text]`` pairs in the
+    payload's ``known`` are findings the run started from, shown first. A
+    fused (structured) run is rendered as one markdown report with its own
+    headings.
+    """
+    import streamlit as st
+
+    from health_twin.assessments import FINDINGS
+    from health_twin.crews import output_model, render_result
+
+    def render(job):
+        tasks = job["payload"].get("tasks")
+        if tasks and output_model(tasks):
+            # Fused run: one structured answer holding every section
+            if job["status"] == "done":
+                (final or st.markdown)(render_result(tasks, job["result"]))
+            else:
+                st.markdown("⏳ ...")
+            return
+        # An incremental run holds only the trailing tasks of the crew; the findings it
+        # started from come first
+        for name, text in job["payload"].get("known", []):
+            st.markdown(f"**{FINDINGS[name]}**\n\n{text}")
+        outputs = job["progress"].get("tasks", [])
+        count = len(tasks) if tasks else len(titles)
+        for index, title in enumerate(titles[len(titles) - count:]):
+            last = index == count - 1
+            if last and job["status"] == "done":
+                st.markdown(f"**{title}**")
+                (final or st.markdown)(job["result"])
+            elif index < len(outputs):
+                st.markdown(f"**{title}**\n\n{outputs[index]}")
+            elif index == len(outputs) and job["progress"].get("partial"):
+                st.markdown(f"**{title}**\n\n{job['progress']['partial']} ▌")
+            elif job["status"] != "done":
+                st.markdown(f"**{title}**\n\n⏳ ...")
+
+    return st_job(job_id, render)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or cancel background crew runs.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    list_parser = commands.add_parser("list", help="List the most recent jobs")
+    list_parser.add_argument("-n", "--limit", type=int, default=20)
+    commands.add_parser("stats", help="Count jobs per status")
+    cancel_parser = commands.add_parser("cancel", help="Cancel a job for every subscriber")
+    cancel_parser.add_argument("job_id")
+    args = parser.parse_args(argv)
+
+    queue = get_default()
+    if args.command == "list":
+        for job in queue.list(limit=args.limit):
+            created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(job["created"]))
+            took = f"{job['finished'] - job['started']:.1f}s" if job["finished"] and job["started"] else ""
+            print(f"{created}  {job['id']}  {job['kind']:<16} {job['status']:<10} {took}")
+    elif args.command == "stats":
+        for status, count in queue.stats().items():
+            print(f"{status:>10}  {count}")
+    else:
+        print(queue.cancel(args.job_id) or "no such job")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
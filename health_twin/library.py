@@ -0,0 +1,757 @@
+"""Per-user library of medical documents behind one incrementally updated index.
+
+Each owner's documents (lab reports, discharge summaries, ...) are listed in
+a SQLite catalog (name, type, date, content hash, chunk count, shard) and
+their chunks live in FAISS shards saved under
+``<cache dir>/library/<owner hash>/<layout>/<shard>``:
+
+* ``add`` splits and embeds only the new document's chunks and appends them
+  to the newest shard; a document already in the library is not indexed again.
+* ``delete`` removes a document's vectors from its shard by chunk id
+  (``<doc_id>:<n>``).
+* Once the newest shard holds ``HEALTH_TWIN_LIBRARY_SHARD_CHUNKS`` chunks
+  (default 2000) the next document starts a new one, so a write rewrites
+  one bounded shard and never the whole library.
+* ``search`` takes a metadata filter (document types, date range). Shards
+  without a matching document are skipped and the others are searched in
+  parallel; within a shard FAISS scores only the matching documents'
+  vectors (an ``IDSelectorBatch``), so a narrow filter still returns ``k``
+  results. Each loaded shard keeps every document's vector positions, so
+  the selector is built from the matching documents alone.
+* Every shard is saved with its own BM25 index (``bm25.pkl``), updated on
+  add and rebuilt only for the shard a delete rewrites. ``retriever``
+  searches those indexes as one, restricted to the matching documents, and
+  is cached per owner, filter and catalog version, so asking a question
+  never re-indexes the library.
+* A document's chunk texts and vectors are also kept once per content hash
+  under ``<cache dir>/library/shared/<layout>``, for every owner: the same
+  PDF uploaded by another user (or again after a delete) is appended from
+  there without being extracted, split or embedded again.
+* Shards and shared chunk sets are evicted least recently used first once
+  they take more than ``HEALTH_TWIN_LIBRARY_MAX_BYTES`` on disk (default
+  2 GiB). Evicting a shard removes its documents from the catalog.
+
+The catalog row is written after the shard, and only documents in the
+catalog are ever searched, so an interrupted add or delete never surfaces
+half-indexed vectors. ``layout`` (embedding model and splitter settings) is
+part of the shard path: changing either starts a fresh index.
+
+Inspect a library with::
+
+    python -m health_twin.library list OWNER
+    python -m health_twin.library stats OWNER
+    python -m health_twin.library evict
+"""
+import argparse
+import hashlib
+import heapq
+import os
+import pickle
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from health_twin import telemetry
+from health_twin.result_cache import DEFAULT_DIR
+
+DOCUMENT_TYPES = ("Lab report", "Discharge summary", "Imaging report", "Prescription", "Clinical note", "Other")
+SHARD_CHUNKS = int(os.getenv("HEALTH_TWIN_LIBRARY_SHARD_CHUNKS", 2000))
+DEFAULT_MAX_BYTES = int(os.getenv("HEALTH_TWIN_LIBRARY_MAX_BYTES", 2 * 1024 ** 3))
+# Splitter settings (see benchmarks/retrieval_bench.py); part of the index layout
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 50
+# Loaded shards kept in memory, across owners
+MEMORY_SHARDS = 16
+SEARCH_WORKERS = 4
+# Retrievers kept for reuse, across owners and filters
+MEMORY_RETRIEVERS = 32
+
+
+def _date(value):
+    """``YYYY-MM-DD`` for a ``date``/``datetime``/string, ``""`` when unknown."""
+    if not value:
+        return ""
+    return value.isoformat()[:10] if hasattr(value, "isoformat") else str(value)[:10]
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class _Shard:
+    """A loaded shard: its FAISS store, its BM25 index and each document's vector positions.
+
+    Chunk ``i`` of the BM25 index is vector ``i`` of the FAISS index.
+    """
+
+    def __init__(self, store, bm25=None):
+        from health_twin.retrieval import BM25Index
+
+        self.store = store
+        self.docs = []  # position -> doc_id
+        self.positions = {}  # doc_id -> int64 array of positions
+        index_texts = bm25 is None or len(bm25) != store.index.ntotal
+        self.bm25 = BM25Index() if index_texts else bm25
+        self.extend(index_texts)
+
+    def extend(self, index_texts=True):
+        """Take in the vectors not seen yet (all of them on load, the new ones after an add)."""
+        import numpy as np
+
+        added = defaultdict(list)
+        for position in range(len(self.docs), self.store.index.ntotal):
+            chunk_id = self.store.index_to_docstore_id[position]
+            doc_id = chunk_id.split(":", 1)[0]
+            self.docs.append(doc_id)
+            added[doc_id].append(position)
+            if index_texts:
+                self.bm25.add(self.store.docstore.search(chunk_id).page_content)
+        for doc_id, positions in added.items():
+            self.positions[doc_id] = np.array(positions, dtype="int64")
+
+    def chunk_ids(self, doc_id):
+        positions = self.positions.get(doc_id, ())
+        return [self.store.index_to_docstore_id[int(position)] for position in positions]
+
+
+class DocumentLibrary:
+    """Catalog plus sharded FAISS indexes for every owner; safe to share between Streamlit session threads."""
+
+    def __init__(self, root, embeddings, shard_chunks=SHARD_CHUNKS, chunk_size=CHUNK_SIZE,
+                 chunk_overlap=CHUNK_OVERLAP, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.embeddings = embeddings
+        self.shard_chunks = shard_chunks
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        model = getattr(embeddings, "model", type(embeddings).__name__)
+        self.layout = f"{model}-{chunk_size}-{chunk_overlap}".replace("/", "_")
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._owner_locks = defaultdict(threading.RLock)
+        self._memory = OrderedDict()
+        self._retrievers = OrderedDict()
+        self._conn = sqlite3.connect(os.path.join(root, "catalog.sqlite3"), check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "owner TEXT NOT NULL, layout TEXT NOT NULL, doc_id TEXT NOT NULL, name TEXT NOT NULL, "
+            "doc_type TEXT NOT NULL, doc_date TEXT NOT NULL, content_hash TEXT NOT NULL, "
+            "chunks INTEGER NOT NULL, shard INTEGER NOT NULL, added REAL NOT NULL, "
+            "PRIMARY KEY (owner, layout, doc_id))"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS documents_content ON documents (owner, layout, content_hash)"
+        )
+        # Bumped with every catalog change; cached retrievers are keyed on it
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS versions (owner TEXT NOT NULL, layout TEXT NOT NULL, "
+            "version INTEGER NOT NULL, PRIMARY KEY (owner, layout))"
+        )
+        # Size and last use of every shard and shared chunk set on disk, for eviction
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS shards (owner TEXT NOT NULL, layout TEXT NOT NULL, shard INTEGER NOT NULL, "
+            "bytes INTEGER NOT NULL, accessed REAL NOT NULL, PRIMARY KEY (owner, layout, shard))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS shared (layout TEXT NOT NULL, key TEXT NOT NULL, bytes INTEGER NOT NULL, "
+            "accessed REAL NOT NULL, PRIMARY KEY (layout, key))"
+        )
+        self._pool = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="library-search")
+
+    # Storage -------------------------------------------------------------------------
+
+    def _folder(self, owner, layout=None):
+        # Owners are emails or browser ids; hash them into a safe directory name
+        digest = hashlib.sha256(owner.encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.root, digest, layout or self.layout)
+
+    def _shard_path(self, owner, shard, layout=None):
+        return os.path.join(self._folder(owner, layout), f"{shard:05d}")
+
+    def _shared_path(self, key, layout=None):
+        return os.path.join(self.root, "shared", layout or self.layout, f"{key}.pkl")
+
+    def _touch(self, owner, shard, path=None):
+        # Called with self._lock held. A shard saved before sizes were tracked is measured on first load
+        self._conn.execute(
+            "UPDATE shards SET accessed = ? WHERE owner = ? AND layout = ? AND shard = ?",
+            (time.time(), owner, self.layout, shard),
+        )
+        if path is not None:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO shards (owner, layout, shard, bytes, accessed) VALUES (?, ?, ?, ?, ?)",
+                (owner, self.layout, shard, _dir_size(path), time.time()),
+            )
+
+    def _load(self, owner, shard):
+        """The ``_Shard`` for ``shard``, or ``None`` when it holds nothing yet."""
+        key = (owner, shard)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._touch(owner, shard)
+                return self._memory[key]
+        path = self._shard_path(owner, shard)
+        if not os.path.isdir(path):
+            return None
+
+        from langchain_community.vectorstores import FAISS
+
+        with telemetry.span("library.load_shard"):
+            # Shards in this directory are only ever written by _save() below
+            store = FAISS.load_local(path, self.embeddings, allow_dangerous_deserialization=True)
+            bm25 = None
+            if os.path.exists(os.path.join(path, "bm25.pkl")):
+                with open(os.path.join(path, "bm25.pkl"), "rb") as f:
+                    bm25 = pickle.load(f)
+            state = _Shard(store, bm25)
+        with self._lock:
+            self._touch(owner, shard, path)
+        self._remember(key, state)
+        return state
+
+    def _remember(self, key, state):
+        with self._lock:
+            self._memory[key] = state
+            self._memory.move_to_end(key)
+            while len(self._memory) > MEMORY_SHARDS:
+                self._memory.popitem(last=False)
+
+    def _save(self, owner, shard, state):
+        """Write ``shard`` (vectors and BM25 index) next to the old copy and swap it in."""
+        path = self._shard_path(owner, shard)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=".staging-", dir=os.path.dirname(path))
+        try:
+            with telemetry.span("library.save_shard", chunks=state.store.index.ntotal):
+                state.store.save_local(staging)
+                with open(os.path.join(staging, "bm25.pkl"), "wb") as f:
+                    pickle.dump(state.bm25, f, protocol=pickle.HIGHEST_PROTOCOL)
+            size = _dir_size(staging)
+            if os.path.isdir(path):
+                retired = tempfile.mkdtemp(prefix=".retired-", dir=os.path.dirname(path))
+                os.rename(path, os.path.join(retired, "shard"))
+                os.rename(staging, path)
+                shutil.rmtree(retired, ignore_errors=True)
+            else:
+                os.rename(staging, path)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO shards (owner, layout, shard, bytes, accessed) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (owner, layout, shard) DO UPDATE SET bytes = excluded.bytes, accessed = excluded.accessed",
+                (owner, self.layout, shard, size, time.time()),
+            )
+        self._remember((owner, shard), state)
+
+    def _drop_shard(self, owner, shard, layout=None):
+        layout = layout or self.layout
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM shards WHERE owner = ? AND layout = ? AND shard = ?", (owner, layout, shard)
+            )
+            if layout == self.layout:
+                self._memory.pop((owner, shard), None)
+        shutil.rmtree(self._shard_path(owner, shard, layout), ignore_errors=True)
+
+    # Shared chunks -------------------------------------------------------------------
+
+    def _shared_key(self, content_hash):
+        return hashlib.sha256(content_hash.encode("utf-8")).hexdigest()[:32]
+
+    def _shared_chunks(self, content_hash):
+        """``(texts, vectors)`` indexed earlier for ``content_hash`` by any owner, or ``None``."""
+        key = self._shared_key(content_hash)
+        try:
+            with open(self._shared_path(key), "rb") as f:
+                # Files in this directory are only ever written by _share() below
+                texts, vectors = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        with self._lock:
+            self._conn.execute(
+                "UPDATE shared SET accessed = ? WHERE layout = ? AND key = ?", (time.time(), self.layout, key)
+            )
+        return texts, vectors
+
+    def _share(self, content_hash, texts, vectors):
+        key = self._shared_key(content_hash)
+        path = self._shared_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handle = tempfile.NamedTemporaryFile(prefix=".staging-", dir=os.path.dirname(path), delete=False)
+        try:
+            with handle:
+                pickle.dump((texts, vectors), handle, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(handle.name, path)
+        except BaseException:
+            os.unlink(handle.name)
+            raise
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO shared (layout, key, bytes, accessed) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (layout, key) DO UPDATE SET bytes = excluded.bytes, accessed = excluded.accessed",
+                (self.layout, key, os.path.getsize(path), time.time()),
+            )
+
+    # Eviction ------------------------------------------------------------------------
+
+    def stored_bytes(self):
+        """Bytes on disk taken by every owner's shards and the shared chunk sets."""
+        (total,) = self._query(
+            "SELECT (SELECT COALESCE(SUM(bytes), 0) FROM shards) + (SELECT COALESCE(SUM(bytes), 0) FROM shared)"
+        )[0]
+        return total
+
+    def evict(self):
+        """Drop least recently used shards and shared chunk sets until the library fits ``max_bytes``.
+
+        Returns the number of entries dropped. An evicted shard's documents
+        leave the catalog, so its owner's cached retrievers are replaced.
+        """
+        if not self.max_bytes:
+            return 0
+        total = self.stored_bytes()
+        if total <= self.max_bytes:
+            return 0
+        entries = self._query(
+            "SELECT accessed, bytes, owner, layout, shard, NULL FROM shards "
+            "UNION ALL SELECT accessed, bytes, NULL, layout, NULL, key FROM shared ORDER BY accessed"
+        )
+        dropped = 0
+        with telemetry.span("library.evict") as span:
+            for _, size, owner, layout, shard, key in entries:
+                if total <= self.max_bytes:
+                    break
+                if key is not None:
+                    with self._lock:
+                        self._conn.execute("DELETE FROM shared WHERE layout = ? AND key = ?", (layout, key))
+                    try:
+                        os.unlink(self._shared_path(key, layout))
+                    except OSError:
+                        pass
+                else:
+                    with self._owner_locks[owner]:
+                        with self._lock:
+                            self._conn.execute(
+                                "DELETE FROM documents WHERE owner = ? AND layout = ? AND shard = ?",
+                                (owner, layout, shard),
+                            )
+                            self._bump_version(owner)
+                        self._drop_shard(owner, shard, layout)
+                total -= size
+                dropped += 1
+            span["dropped"] = dropped
+        return dropped
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _bump_version(self, owner):
+        # Called with self._lock held, together with the catalog change
+        self._conn.execute(
+            "INSERT INTO versions (owner, layout, version) VALUES (?, ?, 1) "
+            "ON CONFLICT (owner, layout) DO UPDATE SET version = version + 1",
+            (owner, self.layout),
+        )
+
+    def version(self, owner):
+        """Counter bumped by every add, delete and clear of ``owner``'s documents."""
+        rows = self._query("SELECT version FROM versions WHERE owner = ? AND layout = ?", (owner, self.layout))
+        return rows[0][0] if rows else 0
+
+    # Catalog -------------------------------------------------------------------------
+
+    def documents(self, owner, doc_types=None, since=None, until=None):
+        """``owner``'s documents matching the filter, newest first, as dicts."""
+        sql = (
+            "SELECT doc_id, name, doc_type, doc_date, content_hash, chunks, shard, added FROM documents "
+            "WHERE owner = ? AND layout = ?"
+        )
+        params = [owner, self.layout]
+        if doc_types:
+            sql += f" AND doc_type IN ({', '.join('?' for _ in doc_types)})"
+            params += list(doc_types)
+        # Undated documents only match an unbounded range
+        if since:
+            sql += " AND doc_date != '' AND doc_date >= ?"
+            params.append(_date(since))
+        if until:
+            sql += " AND doc_date != '' AND doc_date <= ?"
+            params.append(_date(until))
+        sql += " ORDER BY doc_date DESC, added DESC"
+        columns = ("doc_id", "name", "doc_type", "doc_date", "content_hash", "chunks", "shard", "added")
+        return [dict(zip(columns, row)) for row in self._query(sql, params)]
+
+    def _shard_sizes(self, owner):
+        return dict(self._query(
+            "SELECT shard, SUM(chunks) FROM documents WHERE owner = ? AND layout = ? GROUP BY shard",
+            (owner, self.layout),
+        ))
+
+    # Writes --------------------------------------------------------------------------
+
+    def add(self, owner, pages, name, doc_type="Other", doc_date=None, content_hash=None, on_progress=None):
+        """Index a document (an iterable of page texts) for ``owner`` and return its id.
+
+        Only this document's chunks are embedded, and none when another
+        owner already indexed the same ``content_hash``: ``pages`` is then
+        not read at all. A document with the same ``content_hash`` already in
+        this owner's library is not indexed again and its id is returned.
+        Returns ``None`` when no text could be extracted. ``on_progress`` is
+        called with the running chunk count.
+        """
+        doc_id = self._add(owner, pages, name, doc_type, doc_date, content_hash, on_progress)
+        self.evict()
+        return doc_id
+
+    def _add(self, owner, pages, name, doc_type, doc_date, content_hash, on_progress):
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+        from health_twin.pdf_pipeline import build_index, iter_chunks
+
+        with self._owner_locks[owner], telemetry.span("library.add") as span:
+            if content_hash:
+                existing = self._query(
+                    "SELECT doc_id FROM documents WHERE owner = ? AND layout = ? AND content_hash = ?",
+                    (owner, self.layout, content_hash),
+                )
+                if existing:
+                    span["hits"] = 1
+                    return existing[0][0]
+            span["misses"] = 1
+
+            sizes = self._shard_sizes(owner)
+            shard = max(sizes, default=0)
+            if sizes.get(shard, 0) >= self.shard_chunks:
+                shard += 1
+            state = self._load(owner, shard)
+            store = state.store if state is not None else None
+
+            doc_id = uuid.uuid4().hex[:16]
+            metadata = {"doc_id": doc_id, "name": name, "doc_type": doc_type, "doc_date": _date(doc_date)}
+            before = store.index.ntotal if store is not None else 0
+            shared = self._shared_chunks(content_hash) if content_hash else None
+            if shared is not None:
+                span["shared"] = 1
+                texts, vectors = shared
+                store = self._add_embeddings(store, texts, vectors, metadata, doc_id)
+                if on_progress is not None:
+                    on_progress(len(texts))
+            else:
+                splitter = RecursiveCharacterTextSplitter(
+                    chunk_size=self.chunk_size, chunk_overlap=self.chunk_overlap
+                )
+                store = build_index(
+                    iter_chunks(pages, splitter), self.embeddings, on_progress=on_progress, vector_store=store,
+                    metadata=metadata, id_prefix=doc_id,
+                )
+            count = store.index.ntotal - before if store is not None else 0
+            if not count:
+                return None
+            span["chunks"] = count
+            if shared is None and content_hash:
+                texts = [
+                    store.docstore.search(store.index_to_docstore_id[position]).page_content
+                    for position in range(before, store.index.ntotal)
+                ]
+                self._share(content_hash, texts, store.index.reconstruct_n(before, count))
+
+            if state is None:
+                state = _Shard(store)
+            else:
+                # Only the new chunks are added to the shard's BM25 index
+                state.extend()
+            self._save(owner, shard, state)
+            # The catalog row is the commit point of the add
+            with self._lock:
+                self._conn.execute(
+                    "INSERT INTO documents (owner, layout, doc_id, name, doc_type, doc_date, content_hash, chunks, "
+                    "shard, added) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (owner, self.layout, doc_id, name, doc_type, _date(doc_date), content_hash or doc_id, count,
+                     shard, time.time()),
+                )
+                self._bump_version(owner)
+            return doc_id
+
+    def _add_embeddings(self, store, texts, vectors, metadata, doc_id):
+        from langchain_community.vectorstores import FAISS
+
+        pairs = list(zip(texts, vectors.tolist()))
+        extra = {"metadatas": [metadata] * len(texts), "ids": [f"{doc_id}:{n}" for n in range(len(texts))]}
+        with telemetry.span("faiss.add", chunks=len(texts)):
+            if store is None:
+                return FAISS.from_embeddings(pairs, self.embeddings, **extra)
+            store.add_embeddings(pairs, **extra)
+        return store
+
+    def delete(self, owner, doc_id):
+        """Remove a document and its vectors; returns ``False`` when it is not in the library."""
+        with self._owner_locks[owner], telemetry.span("library.delete"):
+            rows = self._query(
+                "SELECT chunks, shard FROM documents WHERE owner = ? AND layout = ? AND doc_id = ?",
+                (owner, self.layout, doc_id),
+            )
+            if not rows:
+                return False
+            _, shard = rows[0]
+            # Out of the catalog first: from here on no search returns the document
+            with self._lock:
+                self._conn.execute(
+                    "DELETE FROM documents WHERE owner = ? AND layout = ? AND doc_id = ?", (owner, self.layout, doc_id)
+                )
+                self._bump_version(owner)
+            if not self._shard_sizes(owner).get(shard):
+                self._drop_shard(owner, shard)
+                return True
+            state = self._load(owner, shard)
+            if state is not None:
+                chunk_ids = state.chunk_ids(doc_id)
+                if chunk_ids:
+                    state.store.delete(chunk_ids)
+                # Deleting renumbers the vectors after the gap: re-derive positions and BM25 for this shard.
+                # A new _Shard, so retrievers built before the delete keep a consistent BM25 index
+                self._save(owner, shard, _Shard(state.store))
+            return True
+
+    def clear(self, owner):
+        with self._owner_locks[owner]:
+            with self._lock:
+                self._conn.execute("DELETE FROM documents WHERE owner = ? AND layout = ?", (owner, self.layout))
+                self._conn.execute("DELETE FROM shards WHERE owner = ? AND layout = ?", (owner, self.layout))
+                self._bump_version(owner)
+                for key in [key for key in self._memory if key[0] == owner]:
+                    del self._memory[key]
+            shutil.rmtree(self._folder(owner), ignore_errors=True)
+
+    # Reads ---------------------------------------------------------------------------
+
+    def _allowed(self, owner, doc_types=None, since=None, until=None):
+        """``{shard: set(doc_ids)}`` of the documents matching the filter."""
+        by_shard = defaultdict(set)
+        for doc in self.documents(owner, doc_types, since, until):
+            by_shard[doc["shard"]].add(doc["doc_id"])
+        return by_shard
+
+    def _search_shard(self, owner, shard, doc_ids, vector, k):
+        import faiss
+        import numpy as np
+
+        state = self._load(owner, shard)
+        if state is None:
+            return []
+        store = state.store
+        positions = [state.positions[doc_id] for doc_id in doc_ids if doc_id in state.positions]
+        if not positions:
+            return []
+        params = None
+        if sum(len(p) for p in positions) < store.index.ntotal:
+            params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(np.concatenate(positions)))
+        with telemetry.span("faiss.search", shard=shard):
+            scores, indices = store.index.search(np.array([vector], dtype="float32"), k, params=params)
+        return [
+            (store.docstore.search(store.index_to_docstore_id[i]), float(score))
+            for score, i in zip(scores[0], indices[0]) if i != -1
+        ]
+
+    def search(self, owner, query, k=4, doc_types=None, since=None, until=None):
+        """``[(Document, distance)]``, best first, over ``owner``'s documents matching the filter."""
+        with self._owner_locks[owner], telemetry.span("library.search") as span:
+            allowed = self._allowed(owner, doc_types, since, until)
+            span["shards"] = len(allowed)
+            if not allowed:
+                return []
+            vector = self.embeddings.embed_query(query)
+            if len(allowed) == 1:
+                [(shard, doc_ids)] = allowed.items()
+                results = self._search_shard(owner, shard, doc_ids, vector, k)
+            else:
+                futures = [
+                    self._pool.submit(telemetry.bind(self._search_shard), owner, shard, doc_ids, vector, k)
+                    for shard, doc_ids in allowed.items()
+                ]
+                results = [hit for future in futures for hit in future.result()]
+            return heapq.nsmallest(k, results, key=lambda hit: hit[1])
+
+    def iter_chunks(self, owner, doc_types=None, since=None, until=None):
+        """Yield the stored chunks (``Document``) of the matching documents, for a lexical index."""
+        with self._owner_locks[owner]:
+            for shard, doc_ids in sorted(self._allowed(owner, doc_types, since, until).items()):
+                state = self._load(owner, shard)
+                if state is None:
+                    continue
+                for doc_id in doc_ids:
+                    for chunk_id in state.chunk_ids(doc_id):
+                        yield state.store.docstore.search(chunk_id)
+
+    def view(self, owner, doc_types=None, since=None, until=None):
+        """A vector store stand-in over the matching documents, for ``retrieval.HybridRetriever``."""
+        return LibraryView(self, owner, dict(doc_types=doc_types, since=since, until=until))
+
+    def lexical(self, owner, doc_types=None, since=None, until=None):
+        """A ``BM25Index`` stand-in over the matching documents, made of the shards' own BM25 indexes."""
+        with self._owner_locks[owner]:
+            shards = []
+            for shard, doc_ids in sorted(self._allowed(owner, doc_types, since, until).items()):
+                state = self._load(owner, shard)
+                if state is not None:
+                    shards.append((state, doc_ids))
+        return LibraryBM25(self._owner_locks[owner], shards)
+
+    def retriever(self, owner, k=4, doc_types=None, since=None, until=None):
+        """``HybridRetriever`` over ``owner``'s matching documents, reused until the catalog changes."""
+        from health_twin.retrieval import HybridRetriever
+
+        key = (owner, k, tuple(doc_types or ()), _date(since), _date(until), self.version(owner))
+        with self._lock:
+            if key in self._retrievers:
+                self._retrievers.move_to_end(key)
+                return self._retrievers[key]
+        with telemetry.span("library.retriever"):
+            retriever = HybridRetriever(
+                vector_store=self.view(owner, doc_types, since, until),
+                bm25=self.lexical(owner, doc_types, since, until),
+                k=k,
+            )
+        with self._lock:
+            self._retrievers[key] = retriever
+            while len(self._retrievers) > MEMORY_RETRIEVERS:
+                self._retrievers.popitem(last=False)
+        return retriever
+
+    def stats(self, owner):
+        sizes = self._shard_sizes(owner)
+        (documents,) = self._query(
+            "SELECT COUNT(*) FROM documents WHERE owner = ? AND layout = ?", (owner, self.layout)
+        )[0]
+        (stored,) = self._query(
+            "SELECT COALESCE(SUM(bytes), 0) FROM shards WHERE owner = ? AND layout = ?", (owner, self.layout)
+        )[0]
+        return {
+            "documents": documents, "chunks": sum(sizes.values()), "shards": len(sizes), "stored_bytes": stored,
+            "layout": self.layout,
+        }
+
+
+class LibraryView:
+    """``similarity_search`` over a filtered library, shaped like the FAISS store call it replaces."""
+
+    def __init__(self, library, owner, filters):
+        self.library = library
+        self.owner = owner
+        self.filters = filters
+
+    def similarity_search(self, query, k=4):
+        return [doc for doc, _ in self.library.search(self.owner, query, k, **self.filters)]
+
+
+class LibraryBM25:
+    """BM25 over several shards' indexes as one corpus, counting only the given documents' chunks as hits.
+
+    Corpus statistics (chunk count, lengths, document frequencies) are those
+    of the shards searched. Chunk ids are ``(shard number, position)`` pairs,
+    and ``texts`` maps them to the chunk text.
+    """
+
+    def __init__(self, lock, shards):
+        self._lock = lock
+        self._shards = shards  # [(_Shard, allowed doc ids)]
+        self.texts = _ShardTexts(shards)
+
+    def __len__(self):
+        return sum(len(state.bm25) for state, _ in self._shards)
+
+    def document_frequency(self, term):
+        return sum(state.bm25.document_frequency(term) for state, _ in self._shards)
+
+    def search(self, query, k=4):
+        from health_twin.retrieval import bm25_idf, tokenize
+
+        # Adds to a shard extend its BM25 index in place, under the same lock
+        with self._lock:
+            chunks = len(self)
+            if not chunks:
+                return []
+            avg_length = sum(state.bm25.total_length for state, _ in self._shards) / chunks or 1.0
+            scores = defaultdict(float)
+            for term in set(tokenize(query)):
+                frequency = self.document_frequency(term)
+                if not frequency:
+                    continue
+                idf = bm25_idf(chunks, frequency)
+                for number, (state, doc_ids) in enumerate(self._shards):
+                    for position, score in state.bm25.term_scores(term, idf, avg_length):
+                        if state.docs[position] in doc_ids:
+                            scores[(number, position)] += score
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+
+class _ShardTexts:
+    def __init__(self, shards):
+        self._shards = shards
+
+    def __getitem__(self, chunk_id):
+        number, position = chunk_id
+        return self._shards[number][0].bm25.texts[position]
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_default():
+    """Process-wide library under ``HEALTH_TWIN_CACHE_DIR``, with the default cached embedder."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            from health_twin.embeddings import get_embeddings
+
+            _default = DocumentLibrary(os.path.join(DEFAULT_DIR, "library"), get_embeddings())
+        return _default
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect a user's document library.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    list_parser = commands.add_parser("list", help="List an owner's documents")
+    list_parser.add_argument("owner")
+    stats_parser = commands.add_parser("stats", help="Count an owner's documents, chunks and shards")
+    stats_parser.add_argument("owner")
+    commands.add_parser("evict", help="Apply the size limit now")
+    args = parser.parse_args(argv)
+
+    library = get_default()
+    if args.command == "list":
+        for doc in library.documents(args.owner):
+            print(
+                f"{doc['doc_id']}  {doc['doc_date'] or '----------'}  {doc['doc_type']:<18}  "
+                f"{doc['chunks']:>5} chunks  shard {doc['shard']}  {doc['name']}"
+            )
+    elif args.command == "stats":
+        print(library.stats(args.owner))
+    else:
+        dropped = library.evict()
+        print(f"{dropped} entries evicted, {library.stored_bytes()} bytes kept")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+"""Streaming PDF ingestion: extract -> split -> index, page window by page window.
+
+Pages are yielded in order as soon as they are extracted. Large documents
+are split into page ranges that run on a shared process pool, with at most
+``window`` ranges in flight, so peak memory is bounded by that window rather
+than the whole document. ``iter_chunks`` feeds the text splitter page by page
+and ``build_index`` starts embedding the first batches while later pages are
+still being extracted.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from health_twin import telemetry
+
+# Documents with at least this many pages are extracted on the process pool
+PARALLEL_MIN_PAGES = int(os.getenv("HEALTH_TWIN_PDF_PARALLEL_MIN_PAGES", 48))
+PAGES_PER_RANGE = 16
+PDF_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+EMBED_BATCH_CHUNKS = 64
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _process_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS)
+        return _pool
+
+
+def _extract_range(path, start, stop):
+    """Worker: text of pages ``[start, stop)`` of the PDF at ``path``."""
+    import fitz  # PyMuPDF
+
+    with fitz.open(path) as doc:
+        return [doc[i].get_text("text") for i in range(start, stop)]
+
+
+def file_sha256(uploaded_file):
+    """SHA-256 of an uploaded file, read in blocks; leaves the position at 0."""
+    uploaded_file.seek(0)
+    digest = hashlib.sha256()
+    for block in iter(lambda: uploaded_file.read(1 << 20), b""):
+        digest.update(block)
+    uploaded_file.seek(0)
+    return digest.hexdigest()
+
+
+def _spool_to_disk(uploaded_file):
+    """Copy an upload to a temporary file that pool workers can open by path."""
+    uploaded_file.seek(0)
+    handle = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
+    with handle:
+        shutil.copyfileobj(uploaded_file, handle, length=1 << 20)
+    return handle.name
+
+
+def iter_pages(uploaded_file, window=None, parallel_min_pages=PARALLEL_MIN_PAGES):
+    """Yield the text of each page of an uploaded PDF, in page order."""
+    import fitz  # PyMuPDF
+
+    uploaded_file.seek(0)
+    # An UploadedFile is a BytesIO, so PyMuPDF reads its buffer without an extra copy
+    doc = fitz.open(stream=uploaded_file, filetype="pdf")
+    page_count = doc.page_count
+    if page_count < parallel_min_pages:
+        try:
+            for page in doc:
+                yield page.get_text("text")
+        finally:
+            doc.close()
+        return
+    doc.close()
+
+    window = window or 2 * PDF_WORKERS
+    path = _spool_to_disk(uploaded_file)
+    try:
+        pool = _process_pool()
+        ranges = iter(
+            (start, min(start + PAGES_PER_RANGE, page_count))
+            for start in range(0, page_count, PAGES_PER_RANGE)
+        )
+        in_flight = deque()
+        for start, stop in ranges:
+            in_flight.append(pool.submit(_extract_range, path, start, stop))
+            if len(in_flight) >= window:
+                yield from in_flight.popleft().result()
+        while in_flight:
+            yield from in_flight.popleft().result()
+    finally:
+        os.unlink(path)
+
+
+def iter_chunks(pages, splitter):
+    """Split a stream of page texts into chunks without joining the whole document.
+
+    The last chunk of each page is carried over and re-split with the next
+    page, so chunks still span page boundaries as they would for the joined text.
+    """
+    carry = ""
+    for text in pages:
+        chunks = splitter.split_text(carry + text)
+        if not chunks:
+            continue
+        yield from chunks[:-1]
+        carry = chunks[-1]
+    if carry.strip():
+        yield carry
+
+
+def _batched(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def build_index(chunks, embeddings, batch_size=EMBED_BATCH_CHUNKS, on_progress=None, vector_store=None,
+                metadata=None, id_prefix=None):
+    """Build a FAISS store incrementally from a chunk stream.
+
+    ``on_progress`` is called with the running chunk count after each batch.
+    Chunks are appended to ``vector_store`` when one is given. ``metadata``
+    is attached to every chunk, and with ``id_prefix`` the chunk ids are
+    ``<id_prefix>:<n>``. Returns ``None`` when there is no store and the
+    stream produced no chunks.
+    """
+    from langchain_community.vectorstores import FAISS
+
+    indexed = 0
+    for batch in _batched(chunks, batch_size):
+        extra = {}
+        if metadata is not None:
+            extra["metadatas"] = [metadata] * len(batch)
+        if id_prefix is not None:
+            extra["ids"] = [f"{id_prefix}:{n}" for n in range(indexed, indexed + len(batch))]
+        with telemetry.span("faiss.add", chunks=len(batch)):
+            if vector_store is None:
+                vector_store = FAISS.from_texts(batch, embeddings, **extra)
+            else:
+                vector_store.add_texts(batch, **extra)
+        indexed += len(batch)
+        if on_progress is not None:
+            on_progress(indexed)
+    return vector_store
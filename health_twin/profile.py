@@ -0,0 +1,178 @@
+"""Typed health profile parsed once from an uploaded survey JSON.
+
+``parse_profile`` validates an upload up front, so a malformed file fails
+with a ``ProfileError`` before any crew is built, and memoizes the result by
+content hash so reruns of the same upload are free. ``render_profile`` is the
+single prompt renderer shared by every crew.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+
+
+class ProfileError(ValueError):
+    """Raised when an uploaded health profile is missing fields or malformed."""
+
+
+@dataclass(frozen=True, slots=True)
+class Medication:
+    name: str
+    dosage: str = ""
+    frequency: str = ""
+
+
+@dataclass(frozen=True, slots=True)
+class HealthProfile:
+    age: int
+    gender: str
+    height: float
+    weight: float
+    sleep: str
+    water: str
+    exercise: str
+    diet: str
+    alcohol: str
+    smoking: str
+    chronic_conditions: tuple
+    family_history: tuple
+    stress_level: int
+    mental_health: str
+    medications: tuple
+    supplements: tuple
+    health_goals: tuple
+    allergies: str = ""
+
+    @classmethod
+    def from_dict(cls, data):
+        """Validate and convert a survey dict (as written by pages/health_survey.py)."""
+        if not isinstance(data, dict):
+            raise ProfileError("Health data must be a JSON object.")
+        missing = [name for name in REQUIRED_FIELDS if name not in data]
+        if missing:
+            raise ProfileError(f"Missing fields: {', '.join(missing)}")
+        try:
+            medications = tuple(
+                Medication(str(m.get("name", "")), str(m.get("dosage", "")), str(m.get("frequency", "")))
+                if isinstance(m, dict) else Medication(str(m))
+                for m in data["medications"]
+            )
+            return cls(
+                age=int(data["age"]),
+                gender=str(data["gender"]),
+                height=float(data["height"]),
+                weight=float(data["weight"]),
+                sleep=str(data["sleep"]),
+                water=str(data["water"]),
+                exercise=str(data["exercise"]),
+                diet=str(data["diet"]),
+                alcohol=str(data["alcohol"]),
+                smoking=str(data["smoking"]),
+                chronic_conditions=_strings(data["chronic_conditions"]),
+                family_history=_strings(data["family_history"]),
+                stress_level=int(data["stress_level"]),
+                mental_health=str(data["mental_health"]),
+                medications=medications,
+                supplements=_strings(data["supplements"]),
+                health_goals=_strings(data["health_goals"]),
+                allergies=str(data.get("allergies", "")),
+            )
+        except (TypeError, ValueError, AttributeError) as exc:
+            raise ProfileError(f"Invalid health data: {exc}") from None
+
+    def to_dict(self):
+        """Plain JSON-compatible dict in the survey export layout."""
+        data = {name: getattr(self, name) for name in REQUIRED_FIELDS}
+        for name in LIST_FIELDS:
+            data[name] = list(data[name])
+        data["medications"] = [
+            {"name": m.name, "dosage": m.dosage, "frequency": m.frequency} for m in self.medications
+        ]
+        data["allergies"] = self.allergies
+        return data
+
+
+REQUIRED_FIELDS = tuple(f for f in HealthProfile.__dataclass_fields__ if f != "allergies")
+LIST_FIELDS = ("chronic_conditions", "family_history", "supplements", "health_goals")
+
+
+def _strings(value):
+    if isinstance(value, str):
+        return (value,) if value else ()
+    return tuple(str(v) for v in value)
+
+
+# Parsed profiles keyed by SHA-256 of the upload bytes
+_PARSE_CACHE_SIZE = 256
+_parsed = OrderedDict()
+_parsed_lock = threading.Lock()
+
+
+def parse_profile(raw):
+    """Parse and validate uploaded JSON bytes into a ``HealthProfile``."""
+    if isinstance(raw, str):
+        raw = raw.encode("utf-8")
+    digest = hashlib.sha256(raw).digest()
+    with _parsed_lock:
+        if digest in _parsed:
+            _parsed.move_to_end(digest)
+            return _parsed[digest]
+    try:
+        data = json.loads(raw)
+    except ValueError as exc:
+        raise ProfileError(f"File is not valid JSON: {exc}") from None
+    profile = HealthProfile.from_dict(data)
+    with _parsed_lock:
+        _parsed[digest] = profile
+        if len(_parsed) > _PARSE_CACHE_SIZE:
+            _parsed.popitem(last=False)
+    return profile
+
+
+PROFILE_LINES = (
+    "Age: {age}, Gender: {gender}",
+    "Height: {height:g} cm, Weight: {weight:g} kg",
+    "Sleep: {sleep} hours, Water Intake: {water} glasses",
+    "Exercise: {exercise}, Diet: {diet}",
+    "Alcohol: {alcohol}, Smoking: {smoking}",
+    "Chronic Conditions: {chronic_conditions}",
+    "Family History: {family_history}",
+    "Stress Level: {stress_level}/10, Mental Health: {mental_health}",
+    "Medications: {medications}",
+    "Supplements: {supplements}",
+    "Health Goals: {health_goals}",
+)
+
+
+@lru_cache(maxsize=None)
+def _template(prefix, indent):
+    return ("\n" + indent).join(prefix + line for line in PROFILE_LINES).format_map
+
+
+def render_profile(profile, prefix="", indent=""):
+    """Render ``profile`` as prompt lines, each starting with ``prefix``.
+
+    Lines after the first are joined with ``indent`` so the block can be
+    embedded in an indented task description.
+    """
+    return _template(prefix, indent)({
+        "age": profile.age,
+        "gender": profile.gender,
+        "height": profile.height,
+        "weight": profile.weight,
+        "sleep": profile.sleep,
+        "water": profile.water,
+        "exercise": profile.exercise,
+        "diet": profile.diet,
+        "alcohol": profile.alcohol,
+        "smoking": profile.smoking,
+        "chronic_conditions": ", ".join(profile.chronic_conditions),
+        "family_history": ", ".join(profile.family_history),
+        "stress_level": profile.stress_level,
+        "mental_health": profile.mental_health,
+        "medications": ", ".join(m.name for m in profile.medications),
+        "supplements": ", ".join(profile.supplements),
+        "health_goals": ", ".join(profile.health_goals),
+    })
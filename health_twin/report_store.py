@@ -0,0 +1,253 @@
+"""Per-user store of generated health reports.
+
+Reports are keyed by owner (a signed-in user, or else the browser, see
+``st_owner``), the profile hash and the report kind. Bodies are
+content-addressed: each distinct text is stored once, zlib-compressed, under
+its SHA-256, so saving the same report again only refreshes its timestamp and
+never rewrites the body.
+
+``save`` returns the digest at once and hands the write to a single
+background writer thread; until it lands, ``get`` serves the text from the
+pending buffer, so a download button can always read from the store. Each
+write is one SQLite transaction. Reports older than the TTL and past the
+per-owner limit are evicted, and bodies no report refers to are dropped.
+
+Inspect the store with::
+
+    python -m health_twin.report_store stats
+    python -m health_twin.report_store list OWNER
+"""
+import argparse
+import hashlib
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from health_twin.result_cache import DEFAULT_DIR
+
+DEFAULT_TTL = float(os.getenv("HEALTH_TWIN_REPORT_TTL", 90 * 24 * 3600))
+DEFAULT_MAX_PER_OWNER = int(os.getenv("HEALTH_TWIN_REPORTS_PER_USER", 50))
+# Run retention after this many writes rather than after every one
+EVICT_EVERY = 50
+# Cookie holding an anonymous browser's owner id
+OWNER_COOKIE = "health_twin_owner"
+
+
+def report_digest(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ReportStore:
+    """SQLite report store with write-behind; safe to share between Streamlit session threads."""
+
+    def __init__(self, path, ttl=DEFAULT_TTL, max_per_owner=DEFAULT_MAX_PER_OWNER):
+        self.path = path
+        self.ttl = ttl
+        self.max_per_owner = max_per_owner
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS bodies (digest TEXT PRIMARY KEY, body BLOB NOT NULL, size INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS reports ("
+            "owner TEXT NOT NULL, profile_hash TEXT NOT NULL, kind TEXT NOT NULL, digest TEXT NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL, PRIMARY KEY (owner, profile_hash, kind, digest))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS reports_owner ON reports (owner, accessed)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS reports_digest ON reports (digest)")
+        # digest -> text saved but not written yet
+        self._pending = {}
+        self._writes = 0
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="report-store")
+
+    def save(self, owner, profile_hash, kind, text):
+        """Queue ``text`` as ``owner``'s ``kind`` report for ``profile_hash``; returns its digest."""
+        digest = report_digest(text)
+        with self._lock:
+            self._pending[digest] = text
+        self._writer.submit(self._write, owner, profile_hash, kind, digest, text, time.time())
+        return digest
+
+    def _write(self, owner, profile_hash, kind, digest, text, now):
+        try:
+            with self._lock:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    known = self._conn.execute("SELECT 1 FROM bodies WHERE digest = ?", (digest,)).fetchone()
+                    if known is None:
+                        body = zlib.compress(text.encode("utf-8"), 6)
+                        self._conn.execute(
+                            "INSERT INTO bodies (digest, body, size) VALUES (?, ?, ?)", (digest, body, len(body))
+                        )
+                    self._conn.execute(
+                        "INSERT INTO reports (owner, profile_hash, kind, digest, created, accessed) "
+                        "VALUES (?, ?, ?, ?, ?, ?) "
+                        "ON CONFLICT (owner, profile_hash, kind, digest) DO UPDATE SET accessed = excluded.accessed",
+                        (owner, profile_hash, kind, digest, now, now),
+                    )
+                    self._conn.execute("COMMIT")
+                except BaseException:
+                    self._conn.execute("ROLLBACK")
+                    raise
+                self._writes += 1
+                if self._writes % EVICT_EVERY == 0:
+                    self._evict(time.time())
+        finally:
+            with self._lock:
+                # A later save of the same text may still be queued; it re-adds the entry
+                if self._pending.get(digest) is text:
+                    del self._pending[digest]
+
+    def flush(self):
+        """Block until every queued write has landed."""
+        self._writer.submit(lambda: None).result()
+
+    def get(self, digest):
+        """The report text for ``digest`` (including queued writes), or ``None``."""
+        with self._lock:
+            text = self._pending.get(digest)
+            if text is not None:
+                return text
+            row = self._conn.execute("SELECT body FROM bodies WHERE digest = ?", (digest,)).fetchone()
+        return zlib.decompress(row[0]).decode("utf-8") if row is not None else None
+
+    def latest(self, owner, profile_hash, kind):
+        """Digest of ``owner``'s most recent ``kind`` report for ``profile_hash``, or ``None``."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT digest FROM reports WHERE owner = ? AND profile_hash = ? AND kind = ? "
+                "ORDER BY accessed DESC LIMIT 1",
+                (owner, profile_hash, kind),
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def list(self, owner, limit=20):
+        """``owner``'s reports, most recent first, as dicts (without the text)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT r.digest, r.kind, r.profile_hash, r.created, r.accessed, b.size "
+                "FROM reports r JOIN bodies b ON b.digest = r.digest "
+                "WHERE r.owner = ? ORDER BY r.accessed DESC LIMIT ?",
+                (owner, limit),
+            ).fetchall()
+        keys = ("digest", "kind", "profile_hash", "created", "accessed", "stored_bytes")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def delete(self, owner, digest=None):
+        """Forget ``owner``'s report ``digest``, or all of ``owner``'s reports."""
+        self.flush()
+        with self._lock:
+            if digest is None:
+                self._conn.execute("DELETE FROM reports WHERE owner = ?", (owner,))
+            else:
+                self._conn.execute("DELETE FROM reports WHERE owner = ? AND digest = ?", (owner, digest))
+            self._drop_orphans()
+
+    def evict(self):
+        """Apply the TTL and per-owner limit now (also runs every ``EVICT_EVERY`` writes)."""
+        with self._lock:
+            self._evict(time.time())
+
+    def _evict(self, now):
+        if self.ttl:
+            self._conn.execute("DELETE FROM reports WHERE accessed < ?", (now - self.ttl,))
+        if self.max_per_owner:
+            self._conn.execute(
+                "DELETE FROM reports WHERE rowid IN ("
+                "SELECT rowid FROM (SELECT rowid, ROW_NUMBER() OVER "
+                "(PARTITION BY owner ORDER BY accessed DESC) AS position FROM reports) WHERE position > ?)",
+                (self.max_per_owner,),
+            )
+        self._drop_orphans()
+
+    def _drop_orphans(self):
+        self._conn.execute("DELETE FROM bodies WHERE digest NOT IN (SELECT digest FROM reports)")
+
+    def stats(self):
+        with self._lock:
+            reports, owners = self._conn.execute("SELECT COUNT(*), COUNT(DISTINCT owner) FROM reports").fetchone()
+            bodies, stored = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM bodies").fetchone()
+            pending = len(self._pending)
+        return {"reports": reports, "owners": owners, "bodies": bodies, "stored_bytes": stored, "pending": pending}
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_default():
+    """Process-wide report store under ``HEALTH_TWIN_CACHE_DIR``."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = ReportStore(os.path.join(DEFAULT_DIR, "reports.sqlite3"))
+        return _default
+
+
+def new_owner_id():
+    return uuid.uuid4().hex
+
+
+def st_owner():
+    """Owner key for the current Streamlit session: the signed-in user, else this browser.
+
+    Without sign-in, a random id is kept in a cookie for as long as reports
+    are kept, so reports, survey history and documents are found again after
+    a reload or on a later visit from the same browser.
+    """
+    import streamlit as st
+
+    user = getattr(st, "user", None)
+    email = user.get("email") if user is not None and user.get("is_logged_in") else None
+    if email:
+        return f"user:{email}"
+    if "report_owner" not in st.session_state:
+        owner_id = st.context.cookies.get(OWNER_COOKIE)
+        if not isinstance(owner_id, str) or not re.fullmatch(r"[0-9a-f]{32}", owner_id):
+            owner_id = new_owner_id()
+        # Streamlit cannot set cookies from the server; the page sets (or renews) it once per session
+        st.html(
+            f"<script>document.cookie = '{OWNER_COOKIE}={owner_id}; max-age={int(DEFAULT_TTL)}; "
+            "path=/; SameSite=Strict';</script>",
+            unsafe_allow_javascript=True,
+        )
+        st.session_state.report_owner = f"browser:{owner_id}"
+    return st.session_state.report_owner
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect the stored health reports.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("stats", help="Show the number of reports, owners and stored bytes")
+    list_parser = commands.add_parser("list", help="List an owner's reports, most recent first")
+    list_parser.add_argument("owner")
+    list_parser.add_argument("-n", "--limit", type=int, default=20)
+    commands.add_parser("evict", help="Apply the retention limits now")
+    args = parser.parse_args(argv)
+
+    store = get_default()
+    if args.command == "stats":
+        for name, value in store.stats().items():
+            print(f"{name:>14}  {value}")
+    elif args.command == "list":
+        for report in store.list(args.owner, args.limit):
+            created = time.strftime("%Y-%m-%d %H:%M", time.localtime(report["created"]))
+            print(f"{created}  {report['kind']:<12} {report['digest'][:12]}  profile {report['profile_hash'][:12]}")
+    else:
+        store.evict()
+        print(f"{store.stats()['reports']} reports kept")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""Structured output of the fused single-call crews, and its markdown rendering.
+
+In fused mode one agent call returns both halves of a two-task crew (the
+analysis and the lifestyle plan, or the risk assessment and the preventive
+care guide) as one object matching a schema below. CrewAI passes the schema
+to the model as the response format, so no second round trip is needed to
+restate the first task's context. ``render`` turns the stored JSON back into
+the markdown report the pages show and save.
+"""
+from typing import Literal
+
+from pydantic import BaseModel, Field, ValidationError
+
+
+class Risk(BaseModel):
+    condition: str = Field(description="Condition or health issue the patient is at risk of")
+    likelihood: Literal["low", "moderate", "high"]
+    rationale: str = Field(description="The patient's data points that drive this risk")
+
+
+class Recommendation(BaseModel):
+    area: str = Field(description="Area such as Sleep, Stress, Diet, Exercise, Hydration or Check-ups")
+    action: str = Field(description="Specific, actionable step for this patient")
+
+
+class AnalysisReport(BaseModel):
+    summary: str = Field(description="Two or three sentences on the patient's overall health")
+    observations: list[str] = Field(description="Key observations and trends in the health data")
+    risks: list[Risk]
+    plan: list[Recommendation] = Field(
+        description="Lifestyle plan: sleep and stress, diet for their conditions, exercise and hydration, prevention"
+    )
+
+
+class RiskReport(BaseModel):
+    summary: str = Field(description="Two or three sentences on the patient's future health outlook")
+    risks: list[Risk] = Field(description="Conditions the patient may be susceptible to over time")
+    preventive_care: list[Recommendation] = Field(
+        description="Lifestyle, dietary, fitness and monitoring measures that reduce these risks"
+    )
+    checkups: list[str] = Field(description="Medical check-ups and screenings to schedule")
+
+
+LIKELIHOOD_ICONS = {"low": "🟢", "moderate": "🟠", "high": "🔴"}
+
+
+def _risks(risks):
+    return "\n".join(
+        f"- {LIKELIHOOD_ICONS[r.likelihood]} **{r.condition}** ({r.likelihood}): {r.rationale}" for r in risks
+    )
+
+
+def _recommendations(recommendations):
+    return "\n".join(f"- **{r.area}:** {r.action}" for r in recommendations)
+
+
+def render_analysis(report):
+    observations = "\n".join(f"- {item}" for item in report.observations)
+    return (
+        f"### 🔎 Health Analysis\n\n{report.summary}\n\n{observations}\n\n"
+        f"#### ⚠️ Risks\n\n{_risks(report.risks)}\n\n"
+        f"### 📝 Lifestyle Plan\n\n{_recommendations(report.plan)}\n"
+    )
+
+
+def render_risk(report):
+    checkups = "\n".join(f"- {item}" for item in report.checkups)
+    return (
+        f"### ⚠️ Risk Assessment\n\n{report.summary}\n\n{_risks(report.risks)}\n\n"
+        f"### 🛡️ Preventive Care Guide\n\n{_recommendations(report.preventive_care)}\n\n"
+        f"#### 🩺 Check-ups\n\n{checkups}\n"
+    )
+
+
+# Schema name (as used by the task specs) -> (model, renderer)
+MODELS = {
+    "analysis": (AnalysisReport, render_analysis),
+    "risk": (RiskReport, render_risk),
+}
+
+
+def model(name):
+    return MODELS[name][0]
+
+
+def schema(name):
+    """JSON schema of ``name``; part of the crew fingerprint, so a schema change invalidates cached runs."""
+    return model(name).model_json_schema()
+
+
+def render(name, text):
+    """Markdown for a stored ``name`` result; text that does not match the schema is shown as is."""
+    report_model, renderer = MODELS[name]
+    try:
+        return renderer(report_model.model_validate_json(text))
+    except ValidationError:
+        return text
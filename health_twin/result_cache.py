@@ -0,0 +1,108 @@
+"""Disk-backed cache of crew results with LRU and TTL eviction.
+
+Keys are content addresses: a SHA-256 over the canonical JSON of the parsed
+profile (sorted keys, no insignificant whitespace) and the crew fingerprint
+(task prompts, agent definitions and model name). Re-uploading the same
+profile, even re-serialized differently, therefore hits the same entry.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_DIR = os.getenv("HEALTH_TWIN_CACHE_DIR", os.path.join(".cache", "health_twin"))
+DEFAULT_TTL = float(os.getenv("HEALTH_TWIN_CACHE_TTL", 7 * 24 * 3600))
+DEFAULT_MAX_ENTRIES = int(os.getenv("HEALTH_TWIN_CACHE_MAX_ENTRIES", 5000))
+
+
+def canonical_json(data):
+    return json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def profile_hash(health_data):
+    return hashlib.sha256(canonical_json(health_data).encode("utf-8")).hexdigest()
+
+
+def cache_key(health_data, fingerprint):
+    digest = hashlib.sha256()
+    digest.update(profile_hash(health_data).encode("ascii"))
+    digest.update(b"\0")
+    digest.update(canonical_json(fingerprint).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """SQLite key/value store; safe to share between Streamlit session threads."""
+
+    def __init__(self, path, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)")
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None or (self.ttl and now - row[1] > self.ttl):
+                if row is not None:
+                    self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE results SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            self._evict(now)
+
+    def _evict(self, now):
+        if self.ttl:
+            self._conn.execute("DELETE FROM results WHERE created < ?", (now - self.ttl,))
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY accessed LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM results")
+
+    def stats(self):
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()
+        return {"entries": count, "hits": self.hits, "misses": self.misses}
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_default():
+    """Process-wide cache stored under ``HEALTH_TWIN_CACHE_DIR``."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = ResultCache(os.path.join(DEFAULT_DIR, "crew_results.sqlite3"))
+        return _default
@@ -0,0 +1,148 @@
+"""Hybrid lexical + vector retrieval for the PDF chatbot.
+
+``BM25Index`` is an in-memory inverted index filled while chunks stream
+through ingestion. ``HybridRetriever`` fuses its ranking with FAISS results
+by reciprocal rank fusion. Exact-term lookups ("what was my HbA1c") are
+answered from BM25 alone when a rare query term pins down the answer, which
+skips the query embedding call entirely.
+"""
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Any
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from health_twin import telemetry
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+
+
+def tokenize(text):
+    return _TOKEN.findall(text.lower())
+
+
+def bm25_idf(chunks, document_frequency):
+    return math.log(1.0 + (chunks - document_frequency + 0.5) / (document_frequency + 0.5))
+
+
+class BM25Index:
+    """Okapi BM25 over a growing list of text chunks."""
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.texts = []
+        self._lengths = []
+        self._postings = defaultdict(list)  # term -> [(chunk_id, term_frequency)]
+        self.total_length = 0
+
+    def __len__(self):
+        return len(self.texts)
+
+    def add(self, text):
+        chunk_id = len(self.texts)
+        counts = Counter(tokenize(text))
+        for term, tf in counts.items():
+            self._postings[term].append((chunk_id, tf))
+        length = sum(counts.values())
+        self.texts.append(text)
+        self._lengths.append(length)
+        self.total_length += length
+        return chunk_id
+
+    def indexing(self, chunks):
+        """Pass ``chunks`` through unchanged while adding each one to the index."""
+        for chunk in chunks:
+            self.add(chunk)
+            yield chunk
+
+    @classmethod
+    def from_vector_store(cls, vector_store):
+        """Rebuild the index from the documents stored in a FAISS store."""
+        index = cls()
+        for doc_id in vector_store.index_to_docstore_id.values():
+            index.add(vector_store.docstore.search(doc_id).page_content)
+        return index
+
+    def document_frequency(self, term):
+        return len(self._postings.get(term, ()))
+
+    def idf(self, term):
+        return bm25_idf(len(self.texts), self.document_frequency(term))
+
+    def term_scores(self, term, idf, avg_length):
+        """Yield ``(chunk_id, score)`` for each chunk containing ``term``, under the given corpus statistics.
+
+        Several indexes scored with shared statistics rank like one index over all their chunks.
+        """
+        for chunk_id, tf in self._postings.get(term, ()):
+            norm = 1.0 - self.b + self.b * self._lengths[chunk_id] / avg_length
+            yield chunk_id, idf * tf * (self.k1 + 1.0) / (tf + self.k1 * norm)
+
+    def search(self, query, k=4):
+        """Return up to ``k`` ``(chunk_id, score)`` pairs, best first."""
+        if not self.texts:
+            return []
+        avg_length = self.total_length / len(self.texts) or 1.0
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            if self.document_frequency(term):
+                for chunk_id, score in self.term_scores(term, self.idf(term), avg_length):
+                    scores[chunk_id] += score
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+
+class HybridRetriever(BaseRetriever):
+    """BM25 + FAISS retriever with reciprocal rank fusion."""
+
+    vector_store: Any
+    bm25: Any
+    k: int = 4
+    fetch_k: int = 10
+    rrf_k: int = 60
+    # A query term is "rare" when it occurs in at most this share of chunks
+    rare_term_share: float = 0.05
+    lexical_only: int = 0
+    hybrid: int = 0
+
+    def exact_match(self, query, hits):
+        """True when a rare query term occurs in the top BM25 hit."""
+        if not hits:
+            return False
+        limit = max(1, int(self.rare_term_share * len(self.bm25)))
+        rare = [t for t in set(tokenize(query)) if 0 < self.bm25.document_frequency(t) <= limit]
+        if not rare:
+            return False
+        top_terms = set(tokenize(self.bm25.texts[hits[0][0]]))
+        return all(term in top_terms for term in rare)
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        with telemetry.span("retrieval") as span:
+            return self._retrieve(query, span)
+
+    def _retrieve(self, query, span):
+        with telemetry.span("bm25.search"):
+            hits = self.bm25.search(query, self.fetch_k)
+        if self.exact_match(query, hits):
+            self.lexical_only += 1
+            span["mode"] = "lexical"
+            return [Document(page_content=self.bm25.texts[i]) for i, _ in hits[:self.k]]
+
+        self.hybrid += 1
+        span["mode"] = "hybrid"
+        fused = defaultdict(float)
+        docs = {}
+        for rank, (chunk_id, _) in enumerate(hits):
+            text = self.bm25.texts[chunk_id]
+            fused[text] += 1.0 / (self.rrf_k + rank + 1)
+            docs.setdefault(text, Document(page_content=text))
+        with telemetry.span("faiss.search"):
+            similar = self.vector_store.similarity_search(query, k=self.fetch_k)
+        for rank, doc in enumerate(similar):
+            fused[doc.page_content] += 1.0 / (self.rrf_k + rank + 1)
+            docs.setdefault(doc.page_content, doc)
+        best = heapq.nlargest(self.k, fused.items(), key=lambda item: item[1])
+        return [docs[text] for text, _ in best]
@@ -0,0 +1,190 @@
+"""Deterministic, vectorized risk pre-scoring for health survey profiles.
+
+Profiles are scored column-wise with NumPy: categorical answers are mapped to
+risk points through lookup tables built over the *unique* answers only, so
+scoring a cohort costs a handful of array operations regardless of its size.
+``score_profile`` wraps the same code path for a single upload and its result
+can be rendered into crew prompts with ``risk_summary``.
+"""
+import numpy as np
+
+# Risk points per survey answer (options offered by pages/health_survey.py)
+EXERCISE_POINTS = {"Never": 3, "1-2 times a week": 2, "3-5 times a week": 1, "Daily": 0}
+SLEEP_POINTS = {"Less than 5": 3, "5-7": 1, "7-9": 0, "More than 9": 1}
+WATER_POINTS = {"Less than 1L": 2, "1-2L": 1, "More than 2L": 0}
+DIET_POINTS = {
+    "Balanced": 0, "Vegetarian": 0, "Vegan": 0,
+    "High in Sugar": 2, "High in Processed Foods": 2, "Mostly Junk": 3,
+}
+ALCOHOL_POINTS = {"No": 0, "Occasionally": 1, "Frequently": 3}
+SMOKING_POINTS = {"No": 0, "Occasionally": 2, "Yes": 4}
+MENTAL_HEALTH_POINTS = {"No": 0, "Occasionally": 1, "Yes": 2}
+
+CONDITIONS = ("Diabetes", "Hypertension", "Heart Disease")
+
+BMI_CLASSES = np.array(["Underweight", "Normal", "Overweight", "Obese", "Unknown"])
+BMI_POINTS = np.array([1, 0, 1, 3, 0], dtype=np.int16)
+RISK_TIERS = np.array(["Low", "Moderate", "High"])
+
+# Total-score cut points between Low/Moderate and Moderate/High
+TIER_BOUNDS = (4, 10)
+
+LIFESTYLE_FIELDS = (
+    ("exercise", EXERCISE_POINTS),
+    ("sleep", SLEEP_POINTS),
+    ("water", WATER_POINTS),
+    ("diet", DIET_POINTS),
+    ("alcohol", ALCOHOL_POINTS),
+    ("smoking", SMOKING_POINTS),
+    ("mental_health", MENTAL_HEALTH_POINTS),
+)
+
+# Highest possible lifestyle score: every answer at its worst, plus 2 for high stress
+LIFESTYLE_MAX = sum(max(table.values()) for _, table in LIFESTYLE_FIELDS) + 2
+
+
+def _sleep_hours_points(value):
+    # Older exports store a number of hours instead of a band
+    try:
+        hours = float(value)
+    except (TypeError, ValueError):
+        return -1
+    return 3 if hours < 5 else 1 if hours < 7 else 0 if hours <= 9 else 1
+
+
+def _points(values, table, fallback=None):
+    """Map an array of answers to points; unknown answers become ``-1``."""
+    uniques, inverse = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+    lut = np.array(
+        [table.get(u, fallback(u) if fallback else -1) for u in uniques] or [0],
+        dtype=np.int16,
+    )
+    return lut[inverse.reshape(-1)]
+
+
+def _joined(values):
+    """Join list-valued answers so they can be searched with ``np.char``."""
+    return np.array(["|".join(v) if isinstance(v, (list, tuple)) else str(v) for v in values], dtype=str)
+
+
+def profiles_to_columns(profiles):
+    """Transpose a sequence of profile dicts into the columns ``score_columns`` expects."""
+    columns = {key: [] for key in ("age", "height", "weight", "stress_level", "chronic_conditions", "family_history")}
+    for key, _ in LIFESTYLE_FIELDS:
+        columns[key] = []
+    for profile in profiles:
+        for key, values in columns.items():
+            values.append(profile.get(key, ""))
+    numeric = ("age", "height", "weight", "stress_level")
+    return {
+        key: (np.array([v if v not in ("", None) else np.nan for v in values], dtype=np.float64)
+              if key in numeric else
+              _joined(values) if key in ("chronic_conditions", "family_history") else
+              np.asarray(values, dtype=str))
+        for key, values in columns.items()
+    }
+
+
+def score_columns(columns):
+    """Score a cohort given as a mapping of equally long arrays.
+
+    Expected keys: ``age``, ``height`` (cm), ``weight`` (kg), ``stress_level``
+    (1-10), the categorical answers in ``LIFESTYLE_FIELDS``, and
+    ``chronic_conditions`` / ``family_history`` as ``"|"``-joined strings.
+    Returns a dict of arrays.
+    """
+    height_m = np.asarray(columns["height"], dtype=np.float64) / 100.0
+    weight = np.asarray(columns["weight"], dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        bmi = np.where(height_m > 0, weight / (height_m * height_m), np.nan)
+    bmi_class = np.digitize(bmi, [18.5, 25.0, 30.0])
+    bmi_class[np.isnan(bmi)] = 4
+
+    lifestyle = np.zeros(bmi.shape, dtype=np.int16)
+    unknown = np.zeros(bmi.shape, dtype=bool)
+    for key, table in LIFESTYLE_FIELDS:
+        points = _points(columns[key], table, _sleep_hours_points if key == "sleep" else None)
+        unknown |= points < 0
+        lifestyle += np.maximum(points, 0)
+
+    stress = np.asarray(columns["stress_level"], dtype=np.float64)
+    unknown |= np.isnan(stress)
+    lifestyle += np.digitize(np.nan_to_num(stress, nan=5.0), [4, 7]).astype(np.int16)
+
+    chronic = np.asarray(columns["chronic_conditions"], dtype=str)
+    family = np.char.lower(np.asarray(columns["family_history"], dtype=str))
+    condition_flags = np.zeros(bmi.shape, dtype=np.uint8)
+    family_flags = np.zeros(bmi.shape, dtype=np.uint8)
+    for bit, condition in enumerate(CONDITIONS):
+        condition_flags |= (np.char.find(chronic, condition) >= 0).astype(np.uint8) << bit
+        family_flags |= (np.char.find(family, condition.lower()) >= 0).astype(np.uint8) << bit
+
+    age = np.nan_to_num(np.asarray(columns["age"], dtype=np.float64), nan=0.0)
+    age_points = np.digitize(age, [40, 55, 70]).astype(np.int16)
+    chronic_count = _popcount(condition_flags)
+    family_count = _popcount(family_flags)
+
+    total = lifestyle + BMI_POINTS[bmi_class] + age_points + 3 * chronic_count + family_count
+    tier = np.digitize(total, TIER_BOUNDS)
+    low_risk = (tier == 0) & (chronic_count == 0) & (bmi_class == 1) & ~unknown
+
+    return {
+        "bmi": np.round(bmi, 1),
+        "bmi_class": bmi_class,
+        "lifestyle_score": lifestyle,
+        "condition_flags": condition_flags,
+        "family_flags": family_flags,
+        "total_score": total,
+        "risk_tier": tier,
+        "low_risk": low_risk,
+        "incomplete": unknown,
+    }
+
+
+def _popcount(flags):
+    return sum(((flags >> bit) & 1).astype(np.int16) for bit in range(len(CONDITIONS)))
+
+
+def _flag_names(flags):
+    return [name for bit, name in enumerate(CONDITIONS) if flags >> bit & 1]
+
+
+def score_profile(health_data):
+    """Score a single profile; returns a plain dict of Python values."""
+    scores = score_columns(profiles_to_columns([health_data]))
+    bmi = float(scores["bmi"][0])
+    return {
+        "bmi": None if np.isnan(bmi) else bmi,
+        "bmi_class": str(BMI_CLASSES[scores["bmi_class"][0]]),
+        "lifestyle_score": int(scores["lifestyle_score"][0]),
+        "chronic_conditions": _flag_names(int(scores["condition_flags"][0])),
+        "family_history": _flag_names(int(scores["family_flags"][0])),
+        "total_score": int(scores["total_score"][0]),
+        "risk_tier": str(RISK_TIERS[scores["risk_tier"][0]]),
+        "low_risk": bool(scores["low_risk"][0]),
+        "incomplete": bool(scores["incomplete"][0]),
+    }
+
+
+def risk_summary(score):
+    """Render ``score_profile`` output as a compact block for crew prompts."""
+    bmi = f"{score['bmi']} ({score['bmi_class']})" if score["bmi"] is not None else "unknown"
+    return (
+        f"Pre-computed indicators: BMI {bmi}; lifestyle risk score {score['lifestyle_score']}/{LIFESTYLE_MAX}; "
+        f"diagnosed: {', '.join(score['chronic_conditions']) or 'none'}; "
+        f"family history: {', '.join(score['family_history']) or 'none'}; "
+        f"overall rule-based risk tier: {score['risk_tier']} (score {score['total_score']})."
+    )
+
+
+def low_risk_report(score):
+    """Deterministic report for profiles that need no LLM analysis."""
+    return (
+        "### ✅ Low overall risk\n\n"
+        f"Your BMI is {score['bmi']} ({score['bmi_class']}), you report no diagnosed chronic conditions, "
+        f"and your lifestyle answers score {score['lifestyle_score']} out of {LIFESTYLE_MAX} risk points.\n\n"
+        "No elevated risk factors were found. Keep up your current habits:\n"
+        "- Aim for 7-9 hours of sleep and about 2L of water a day.\n"
+        "- Stay active at least 3-5 times a week and keep a balanced diet.\n"
+        "- Continue routine check-ups, including blood pressure and blood sugar screening.\n"
+    )
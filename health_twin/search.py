@@ -0,0 +1,285 @@
+"""Cached medical reference search for the virtual nurse (``sample.py``).
+
+``CachedSearch`` wraps a search backend with a persistent SQLite cache keyed
+on the normalized query, with a TTL, and coalesces identical concurrent
+queries into one backend call. Two backends are available:
+
+``SerperBackend``
+    Web search through CrewAI's ``SerperDevTool`` (needs ``SERPER_API_KEY``).
+``LocalCorpusBackend``
+    BM25 over a folder of reference documents (``.txt``, ``.md``, ``.pdf``),
+    fully offline.
+
+``get_search_tool()`` returns a CrewAI tool over the backend picked by
+``HEALTH_TWIN_SEARCH_BACKEND`` (``serper`` or ``local``; ``local`` reads
+``HEALTH_TWIN_SEARCH_CORPUS``, default ``reference_docs``). Inspect or clear
+the cache with::
+
+    python -m health_twin.search query "persistent dry cough" --backend local
+    python -m health_twin.search stats
+"""
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+from health_twin import telemetry
+from health_twin.result_cache import DEFAULT_DIR
+
+BACKEND = os.getenv("HEALTH_TWIN_SEARCH_BACKEND", "serper")
+CORPUS_DIR = os.getenv("HEALTH_TWIN_SEARCH_CORPUS", "reference_docs")
+DEFAULT_TTL = float(os.getenv("HEALTH_TWIN_SEARCH_TTL", 7 * 24 * 3600))
+DEFAULT_MAX_ENTRIES = int(os.getenv("HEALTH_TWIN_SEARCH_MAX_ENTRIES", 20000))
+
+CORPUS_EXTENSIONS = (".txt", ".md", ".pdf")
+
+
+def normalize_query(query):
+    """Lower-case word tokens in order, so spacing, case and punctuation do not matter."""
+    return " ".join(re.findall(r"[a-z0-9]+", query.lower()))
+
+
+class SerperBackend:
+    name = "serper"
+
+    def __init__(self):
+        self._tool = None
+
+    def search(self, query):
+        if self._tool is None:
+            from crewai_tools import SerperDevTool
+
+            self._tool = SerperDevTool()
+        return str(self._tool.run(search_query=query))
+
+
+class LocalCorpusBackend:
+    """BM25 search over the paragraphs of every reference document in ``folder``."""
+
+    def __init__(self, folder, k=4, max_chars=600):
+        self.folder = folder
+        self.k = k
+        self.max_chars = max_chars
+        self.name = f"local:{os.path.abspath(folder)}"
+        self._index = None
+        self._sources = []
+        self._lock = threading.Lock()
+
+    def _documents(self):
+        for root, _, files in os.walk(self.folder):
+            for file_name in sorted(files):
+                path = os.path.join(root, file_name)
+                if not file_name.lower().endswith(CORPUS_EXTENSIONS):
+                    continue
+                if file_name.lower().endswith(".pdf"):
+                    from health_twin.pdf_pipeline import iter_pages
+
+                    with open(path, "rb") as pdf:
+                        text = "\n\n".join(iter_pages(pdf))
+                else:
+                    with open(path, encoding="utf-8", errors="replace") as document:
+                        text = document.read()
+                yield os.path.relpath(path, self.folder), text
+
+    def _build(self):
+        from health_twin.retrieval import BM25Index
+
+        index = BM25Index()
+        sources = []
+        for source, text in self._documents():
+            for paragraph in re.split(r"\n\s*\n", text):
+                paragraph = " ".join(paragraph.split())
+                if paragraph:
+                    index.add(paragraph)
+                    sources.append(source)
+        return index, sources
+
+    def index(self):
+        with self._lock:
+            if self._index is None:
+                with telemetry.span("search.index_corpus"):
+                    self._index, self._sources = self._build()
+            return self._index, self._sources
+
+    def search(self, query):
+        index, sources = self.index()
+        hits = index.search(query, self.k)
+        if not hits:
+            return f"No reference documents in {self.folder} match: {query}"
+        return "\n\n".join(
+            f"[{sources[chunk_id]}] {index.texts[chunk_id][:self.max_chars]}" for chunk_id, _ in hits
+        )
+
+
+class CachedSearch:
+    """Persistent, single-flight cache in front of a backend with ``name`` and ``search(query)``."""
+
+    def __init__(self, backend, path, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.backend = backend
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS searches ("
+            "backend TEXT NOT NULL, query TEXT NOT NULL, result TEXT NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL, PRIMARY KEY (backend, query))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS searches_accessed ON searches (accessed)")
+
+    def _get(self, key, now):
+        row = self._conn.execute(
+            "SELECT result, created FROM searches WHERE backend = ? AND query = ?", (self.backend.name, key)
+        ).fetchone()
+        if row is None or (self.ttl and now - row[1] > self.ttl):
+            return None
+        self._conn.execute(
+            "UPDATE searches SET accessed = ? WHERE backend = ? AND query = ?", (now, self.backend.name, key)
+        )
+        return row[0]
+
+    def _put(self, key, result, now):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO searches (backend, query, result, created, accessed) VALUES (?, ?, ?, ?, ?)",
+            (self.backend.name, key, result, now, now),
+        )
+        if self.ttl:
+            self._conn.execute("DELETE FROM searches WHERE created < ?", (now - self.ttl,))
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM searches").fetchone()
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM searches WHERE rowid IN (SELECT rowid FROM searches ORDER BY accessed LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def search(self, query):
+        key = normalize_query(query)
+        with telemetry.span("search", backend=self.backend.name) as span:
+            with self._lock:
+                cached = self._get(key, time.time())
+                if cached is not None:
+                    self.hits += 1
+                    span["hits"] = 1
+                    return cached
+                # Identical queries already in flight wait for that call instead of repeating it
+                pending = self._inflight.get(key)
+                if pending is None:
+                    pending = self._inflight[key] = Future()
+                    leader = True
+                    self.misses += 1
+                else:
+                    leader = False
+                    self.coalesced += 1
+            if not leader:
+                span["coalesced"] = 1
+                return pending.result()
+
+            span["misses"] = 1
+            try:
+                result = self.backend.search(query)
+            except BaseException as exc:
+                with self._lock:
+                    del self._inflight[key]
+                pending.set_exception(exc)
+                raise
+            with self._lock:
+                self._put(key, result, time.time())
+                del self._inflight[key]
+            pending.set_result(result)
+            return result
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM searches WHERE backend = ?", (self.backend.name,))
+
+    def stats(self):
+        with self._lock:
+            (count,) = self._conn.execute(
+                "SELECT COUNT(*) FROM searches WHERE backend = ?", (self.backend.name,)
+            ).fetchone()
+        return {"entries": count, "hits": self.hits, "misses": self.misses, "coalesced": self.coalesced}
+
+
+def make_backend(backend=None, corpus=None):
+    backend = backend or BACKEND
+    if backend == "serper":
+        return SerperBackend()
+    if backend == "local":
+        return LocalCorpusBackend(corpus or CORPUS_DIR)
+    raise ValueError(f"Unknown search backend: {backend!r}")
+
+
+_default = {}
+_default_lock = threading.Lock()
+
+
+def get_search(backend=None, corpus=None):
+    """Process-wide ``CachedSearch`` for ``backend`` (defaults to ``HEALTH_TWIN_SEARCH_BACKEND``)."""
+    key = (backend or BACKEND, corpus or CORPUS_DIR)
+    with _default_lock:
+        if key not in _default:
+            _default[key] = CachedSearch(make_backend(*key), os.path.join(DEFAULT_DIR, "search_cache.sqlite3"))
+        return _default[key]
+
+
+def get_search_tool(backend=None, corpus=None):
+    """CrewAI tool over ``get_search``; a drop-in replacement for ``SerperDevTool()``."""
+    from crewai.tools import BaseTool
+    from pydantic import BaseModel, Field
+
+    class SearchInput(BaseModel):
+        search_query: str = Field(..., description="Symptom, condition or medication to look up")
+
+    class MedicalSearchTool(BaseTool):
+        name: str = "Search medical references"
+        description: str = (
+            "Look up symptoms, conditions and medications in medical references. "
+            "Returns the most relevant passages for the query."
+        )
+        args_schema: type[BaseModel] = SearchInput
+
+        def _run(self, search_query: str) -> str:
+            return get_search(backend, corpus).search(search_query)
+
+    return MedicalSearchTool()
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description="Query or inspect the cached medical search.")
+    parser.add_argument("--backend", choices=("serper", "local"), default=None)
+    parser.add_argument("--corpus", help="Reference document folder for the local backend")
+    commands = parser.add_subparsers(dest="command", required=True)
+    query_parser = commands.add_parser("query", help="Run one search through the cache")
+    query_parser.add_argument("query")
+    commands.add_parser("stats", help="Show the number of cached searches for the backend")
+    commands.add_parser("clear", help="Drop the cached searches for the backend")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    search = get_search(args.backend, args.corpus)
+    if args.command == "query":
+        started = time.perf_counter()
+        print(search.search(args.query))
+        print(f"({(time.perf_counter() - started) * 1000:.1f} ms, {search.stats()})", file=sys.stderr)
+    elif args.command == "stats":
+        print(f"{search.stats()['entries']} cached searches for {search.backend.name}")
+    else:
+        search.clear()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,262 @@
+"""Semantic answer cache for the Health Educator.
+
+Questions are embedded and compared (cosine similarity) against previously
+answered ones held in an in-memory matrix; a match above ``threshold`` returns
+the stored answer without calling the crew. Similar wording is not enough on
+its own: a cached question only matches when it has the same numbers and the
+same number of negations ("with" vs "without", "can" vs "can't"), since
+medical questions that differ only there need different answers. Entries
+persist in SQLite, expire after a TTL and are evicted least-recently-used
+past ``max_entries``.
+
+Pre-generate answers for the most common questions at deploy time with::
+
+    python -m health_twin.semantic_cache warm top_questions.txt -j 4
+"""
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from health_twin import telemetry
+from health_twin.result_cache import DEFAULT_DIR
+
+DEFAULT_THRESHOLD = float(os.getenv("HEALTH_TWIN_SEMANTIC_THRESHOLD", 0.92))
+DEFAULT_TTL = float(os.getenv("HEALTH_TWIN_SEMANTIC_TTL", 30 * 24 * 3600))
+DEFAULT_MAX_ENTRIES = int(os.getenv("HEALTH_TWIN_SEMANTIC_MAX_ENTRIES", 20000))
+# Query vectors of recent misses, kept so ``put`` does not embed the question again
+MISS_VECTORS = 256
+
+# Negations as they appear in a normalized question ("can't" -> "can t")
+NEGATIONS = frozenset(
+    "no not nor never none without cannot t cant dont doesnt didnt wont isnt arent wasnt werent "
+    "shouldnt couldnt wouldnt mustnt havent hasnt hadnt neednt".split()
+)
+
+
+def normalize_question(question):
+    return " ".join(re.findall(r"[a-z0-9]+", question.lower()))
+
+
+def guard_terms(normalized):
+    """Numbers and negation count of a normalized question; only questions with equal terms share an answer."""
+    return tuple(sorted(re.findall(r"[0-9]+", normalized))), sum(word in NEGATIONS for word in normalized.split())
+
+
+class SemanticCache:
+    def __init__(self, path, embeddings, threshold=DEFAULT_THRESHOLD, ttl=DEFAULT_TTL,
+                 max_entries=DEFAULT_MAX_ENTRIES):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lookups = 0
+        self.hits = 0
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._miss_vectors = OrderedDict()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "id INTEGER PRIMARY KEY, normalized TEXT UNIQUE NOT NULL, question TEXT NOT NULL, "
+            "answer TEXT NOT NULL, vector BLOB NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL, "
+            "hits INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._load()
+
+    def _load(self):
+        rows = self._conn.execute("SELECT id, normalized, vector FROM answers ORDER BY id").fetchall()
+        self._ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self._by_text = {row[1]: row[0] for row in rows}
+        self._guards = [guard_terms(row[1]) for row in rows]
+        vectors = [np.frombuffer(row[2], dtype=np.float32) for row in rows]
+        self._matrix = np.vstack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+
+    @staticmethod
+    def _unit(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, question):
+        """Return ``(answer, similarity)`` for the closest cached question, or ``None``."""
+        with telemetry.span("semantic_cache.lookup") as span:
+            found = self._lookup(question)
+            span["hits" if found is not None else "misses"] = 1
+        return found
+
+    def _lookup(self, question):
+        normalized = normalize_question(question)
+        with self._lock:
+            self.lookups += 1
+            entry_id = self._by_text.get(normalized)
+        similarity = 1.0
+        if entry_id is None:
+            # Exact repeats skip the embedding call; everything else is compared by meaning
+            with self._lock:
+                empty = len(self._ids) == 0
+            if empty:
+                return None
+            query = self._unit(self.embeddings.embed_query(question))
+            guard = guard_terms(normalized)
+            with self._lock:
+                if len(self._ids) == 0:
+                    return self._miss(normalized, query)
+                scores = self._matrix @ query
+                # Best candidate above the threshold that asks about the same numbers and negations
+                candidates = np.flatnonzero(scores >= self.threshold)
+                matches = [i for i in candidates[np.argsort(-scores[candidates])] if self._guards[i] == guard]
+                if not matches:
+                    return self._miss(normalized, query)
+                similarity = float(scores[matches[0]])
+                entry_id = int(self._ids[matches[0]])
+
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT answer, created FROM answers WHERE id = ?", (entry_id,)).fetchone()
+            if row is None:
+                return None
+            if self.ttl and now - row[1] > self.ttl:
+                self._delete([entry_id])
+                return None
+            self._conn.execute("UPDATE answers SET accessed = ?, hits = hits + 1 WHERE id = ?", (now, entry_id))
+            self.hits += 1
+        return row[0], similarity
+
+    def _miss(self, normalized, query):
+        self._miss_vectors[normalized] = query
+        self._miss_vectors.move_to_end(normalized)
+        while len(self._miss_vectors) > MISS_VECTORS:
+            self._miss_vectors.popitem(last=False)
+        return None
+
+    def put(self, question, answer):
+        normalized = normalize_question(question)
+        # The usual put follows a lookup miss, which already embedded the question
+        with self._lock:
+            vector = self._miss_vectors.pop(normalized, None)
+        if vector is None:
+            vector = self._unit(self.embeddings.embed_query(question))
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR REPLACE INTO answers (normalized, question, answer, vector, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (normalized, question, answer, vector.tobytes(), now, now),
+            )
+            replaced = normalized in self._by_text
+            changes = self._conn.total_changes
+            self._evict(now)
+            if replaced or self._conn.total_changes != changes:
+                self._load()
+            else:
+                # Common case: append the new row instead of reloading every vector
+                self._ids = np.append(self._ids, cursor.lastrowid)
+                self._matrix = np.vstack([self._matrix, vector]) if len(self._matrix) else vector[None, :]
+                self._by_text[normalized] = cursor.lastrowid
+                self._guards.append(guard_terms(normalized))
+
+    def _delete(self, ids):
+        self._conn.executemany("DELETE FROM answers WHERE id = ?", [(i,) for i in ids])
+        self._load()
+
+    def _evict(self, now):
+        if self.ttl:
+            self._conn.execute("DELETE FROM answers WHERE created < ?", (now - self.ttl,))
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM answers WHERE id IN (SELECT id FROM answers ORDER BY accessed LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def contains(self, question):
+        with self._lock:
+            return normalize_question(question) in self._by_text
+
+    def stats(self, top=10):
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()
+            popular = self._conn.execute(
+                "SELECT question, hits FROM answers ORDER BY hits DESC LIMIT ?", (top,)
+            ).fetchall()
+            lookups, hits = self.lookups, self.hits
+        return {
+            "entries": count,
+            "lookups": lookups,
+            "hits": hits,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "top_questions": popular,
+        }
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_default():
+    """Process-wide educator cache using the default embeddings backend."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            from health_twin.embeddings import get_embeddings
+
+            _default = SemanticCache(os.path.join(DEFAULT_DIR, "educator_answers.sqlite3"), get_embeddings())
+        return _default
+
+
+def warm(questions, concurrency=4, log=None):
+    """Answer every question not cached yet and store the answers."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    from health_twin.crews import educator_task_specs, run_crew
+
+    cache = get_default()
+    pending = [q for q in dict.fromkeys(questions) if q and not cache.contains(q)]
+
+    def answer(question):
+        cache.put(question, run_crew(educator_task_specs(question)).strip())
+        return question
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="warm") as pool:
+        for question in pool.map(answer, pending):
+            if log:
+                log(f"cached: {question}")
+    return len(pending)
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description="Manage the Health Educator answer cache.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    warm_parser = commands.add_parser("warm", help="Pre-generate answers for a list of questions")
+    warm_parser.add_argument("questions", help="Text file with one question per line")
+    warm_parser.add_argument("-j", "--concurrency", type=int, default=4)
+    commands.add_parser("stats", help="Show cache size and the most requested questions")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    if args.command == "warm":
+        with open(args.questions, encoding="utf-8") as f:
+            questions = [line.strip() for line in f]
+        added = warm(questions, args.concurrency, log=lambda line: print(line, file=sys.stderr))
+        print(f"{added} answers generated", file=sys.stderr)
+    else:
+        stats = get_default().stats()
+        print(f"{stats['entries']} cached answers")
+        for question, hits in stats["top_questions"]:
+            print(f"{hits:6d}  {question}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,205 @@
+"""Stateful therapist conversations with a bounded context.
+
+Each session keeps the last few turns verbatim and a rolling summary of
+everything older. Turns that fall out of the window are folded into the
+summary by a single background LLM call, off the request path. Every reply is
+generated from a prompt of bounded size (capped summary + capped recent
+turns + the new message), so latency does not drift over long conversations.
+
+Replies run on pooled, pre-built crews, so a turn builds no CrewAI objects:
+the prompt is rendered here and set as the leased crew's task description
+before kickoff. It is not passed through ``Crew.kickoff(inputs=...)``, whose
+template interpolation would fail on a message containing braces. The
+agents in these crews have CrewAI memory turned off: the session state here
+is the only conversational memory.
+"""
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from health_twin import gateway, telemetry
+from health_twin.agents import ResourcePool, build_agent, make_llm, register_pool
+
+RECENT_TURNS = int(os.getenv("HEALTH_TWIN_THERAPIST_RECENT_TURNS", 4))
+MAX_MESSAGE_CHARS = 1200
+MAX_SUMMARY_CHARS = 1500
+IDLE_TIMEOUT = float(os.getenv("HEALTH_TWIN_SESSION_IDLE_TIMEOUT", 2 * 3600))
+MAX_SESSIONS = int(os.getenv("HEALTH_TWIN_MAX_SESSIONS", 5000))
+
+SESSION_TASK = dict(
+    description=(
+        "Engage in a supportive, empathetic conversation.\n"
+        "Summary of the conversation so far: {summary}\n"
+        "Most recent exchanges:\n{recent}\n"
+        "The user now says: {message}"
+    ),
+    expected_output="A warm, thoughtful, and encouraging response that fosters emotional well-being.",
+)
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a supportive conversation between a user and an AI therapist. "
+    "Update the summary with the new exchanges below. Keep the user's key concerns, feelings, goals and any "
+    "advice already given. Answer with the updated summary only, in at most 120 words.\n\n"
+    "Current summary: {summary}\n\nNew exchanges:\n{turns}"
+)
+
+
+def _clip(text, limit):
+    return text if len(text) <= limit else text[: limit - 1] + "…"
+
+
+class TherapistSession:
+    __slots__ = ("session_id", "recent", "summary", "unsummarized", "last_active", "turns", "lock", "folding")
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.recent = deque(maxlen=RECENT_TURNS)  # (user, reply) pairs
+        self.summary = ""
+        self.unsummarized = []  # pairs pushed out of the window, waiting to be folded
+        self.last_active = time.time()
+        self.turns = 0
+        self.lock = threading.Lock()
+        self.folding = False
+
+    def prompt(self, message):
+        """The reply task description for ``message``, from the summary and recent turns."""
+        return SESSION_TASK["description"].format(**self.prompt_inputs(message))
+
+    def prompt_inputs(self, message):
+        with self.lock:
+            recent = list(self.unsummarized[-RECENT_TURNS:]) + list(self.recent)
+            summary = self.summary
+        # Pairs still waiting to be folded stay visible verbatim, up to a fixed cap
+        recent = recent[-2 * RECENT_TURNS:]
+        lines = [f"User: {user}\nTherapist: {reply}" for user, reply in recent]
+        return {
+            "summary": summary or "(this is the start of the conversation)",
+            "recent": "\n".join(lines) or "(none)",
+            "message": _clip(message, MAX_MESSAGE_CHARS),
+        }
+
+    def record(self, message, reply):
+        pair = (_clip(message, MAX_MESSAGE_CHARS), _clip(reply, MAX_MESSAGE_CHARS))
+        with self.lock:
+            if len(self.recent) == self.recent.maxlen:
+                self.unsummarized.append(self.recent[0])
+            self.recent.append(pair)
+            self.turns += 1
+            self.last_active = time.time()
+            fold = self.unsummarized and not self.folding
+            if fold:
+                self.folding = True
+        if fold:
+            _summarizer.submit(_fold_summary, self)
+
+    def history(self):
+        with self.lock:
+            return list(self.recent)
+
+
+def _summarize(summary, turns):
+    text = "\n".join(f"User: {user}\nTherapist: {reply}" for user, reply in turns)
+    prompt = SUMMARY_PROMPT.format(summary=summary or "(empty)", turns=text)
+    # Off the request path, so it yields to chat turns at the LLM gateway
+    with telemetry.span("session.summary"), gateway.lane("batch"):
+        return make_llm().call(prompt)
+
+
+def _fold_summary(session):
+    try:
+        while True:
+            with session.lock:
+                pending = list(session.unsummarized)
+                summary = session.summary
+                if not pending:
+                    session.folding = False
+                    return
+            new_summary = _clip(str(_summarize(summary, pending)).strip(), MAX_SUMMARY_CHARS)
+            with session.lock:
+                session.summary = new_summary
+                del session.unsummarized[: len(pending)]
+    except Exception:
+        # Keep the pending turns; the next recorded turn retries the fold
+        with session.lock:
+            session.folding = False
+
+
+_summarizer = ThreadPoolExecutor(max_workers=2, thread_name_prefix="session-summary")
+
+
+def _build_session_crew():
+    from crewai import Crew, Process, Task
+
+    agent = build_agent("therapist", memory=False)
+    task = Task(agent=agent, **SESSION_TASK)
+    return Crew(agents=[agent], tasks=[task], process=Process.sequential)
+
+
+_crews = register_pool(ResourcePool(_build_session_crew))
+
+
+def run_turn(session, message, task_callback=None, on_built=None):
+    """Generate and record the reply to ``message``; returns the reply text."""
+    with _crews.lease() as crew:
+        crew.tasks[0].description = session.prompt(message)
+        crew.task_callback = task_callback
+        if on_built is not None:
+            on_built(crew)
+        telemetry.attach_crew(crew)
+        try:
+            with telemetry.span("crew.kickoff", crew="therapist"), gateway.lane("interactive"):
+                reply = str(crew.kickoff()).strip()
+        finally:
+            telemetry.detach_crew(crew)
+    session.record(message, reply)
+    return reply
+
+
+def warm():
+    """Pre-build one session crew, so the first turn does not pay for it."""
+    with _crews.lease():
+        pass
+
+
+def stream_turn(session, message):
+    """``run_turn`` as a stream of ``health_twin.streaming`` events."""
+    from health_twin.streaming import stream_run
+
+    return stream_run(lambda task_callback, on_built: run_turn(session, message, task_callback, on_built))
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def new_session_id():
+    return uuid.uuid4().hex
+
+
+def get_session(session_id):
+    """Return the live session for ``session_id``, creating it if needed."""
+    now = time.time()
+    with _sessions_lock:
+        session = _sessions.get(session_id)
+        if session is None:
+            _evict_idle(now)
+            session = _sessions[session_id] = TherapistSession(session_id)
+        session.last_active = now
+        return session
+
+
+def end_session(session_id):
+    with _sessions_lock:
+        _sessions.pop(session_id, None)
+
+
+def _evict_idle(now):
+    for session_id in [sid for sid, s in _sessions.items() if now - s.last_active > IDLE_TIMEOUT]:
+        del _sessions[session_id]
+    if len(_sessions) >= MAX_SESSIONS:
+        oldest = sorted(_sessions.values(), key=lambda s: s.last_active)
+        for session in oldest[: len(_sessions) - MAX_SESSIONS + 1]:
+            del _sessions[session.session_id]
@@ -0,0 +1,127 @@
+"""Incremental rendering of crew output.
+
+``stream_crew`` runs a crew on a background thread and yields events while it
+works: LLM tokens as they are generated (when CrewAI emits stream chunk
+events), each task's final output as soon as that task completes, and the
+crew's final result. Streamed job runs (``health_twin.jobs``) publish those
+events as progress, so the page shows the first words long before the crew
+finishes.
+"""
+import queue
+import threading
+
+from health_twin import crews, result_cache, telemetry
+
+_routes_lock = threading.Lock()
+_runs_by_task = {}
+_runs_by_thread = {}
+_listener_state = {"installed": None}
+
+
+class _Run:
+    def __init__(self):
+        self.events = queue.Queue()
+        self.current = 0
+
+
+def _install_listener():
+    """Subscribe once per process to CrewAI's LLM stream chunk events."""
+    with _routes_lock:
+        if _listener_state["installed"] is not None:
+            return _listener_state["installed"]
+        try:
+            from crewai.events import crewai_event_bus, LLMStreamChunkEvent
+        except ImportError:
+            try:
+                from crewai.utilities.events import crewai_event_bus, LLMStreamChunkEvent
+            except ImportError:
+                _listener_state["installed"] = False
+                return False
+
+        @crewai_event_bus.on(LLMStreamChunkEvent)
+        def _on_chunk(source, event):
+            run = _route(event)
+            if run is not None:
+                run.events.put(("token", run.current, event.chunk))
+
+        _listener_state["installed"] = True
+        return True
+
+
+def _route(event):
+    # Newer CrewAI tags events with the task id; older versions emit on the kickoff thread
+    with _routes_lock:
+        task_id = getattr(event, "task_id", None)
+        if task_id:
+            return _runs_by_task.get(str(task_id))
+        return _runs_by_thread.get(threading.get_ident())
+
+
+def stream_run(kickoff, on_done=None):
+    """Yield ``(kind, task_index, payload)`` events while ``kickoff`` runs on a worker thread.
+
+    ``kickoff(task_callback, on_built)`` must build a crew, pass ``on_built``
+    the ``Crew`` before starting it, and return the crew output. ``kind`` is
+    ``"token"`` (partial text), ``"task"`` (a task's final output), ``"done"``
+    (the final text, ``task_index`` is ``None``) or ``"error"`` (the exception
+    raised by the crew). ``on_done`` receives the final text on the worker.
+    """
+    _install_listener()
+    run = _Run()
+
+    def on_task(output):
+        run.events.put(("task", run.current, str(output.raw if hasattr(output, "raw") else output)))
+        run.current += 1
+
+    def on_crew_built(crew):
+        with _routes_lock:
+            for task in crew.tasks:
+                _runs_by_task[str(task.id)] = run
+
+    def worker():
+        with _routes_lock:
+            _runs_by_thread[threading.get_ident()] = run
+        try:
+            result = str(kickoff(on_task, on_crew_built))
+            if on_done is not None:
+                on_done(result)
+            run.events.put(("done", None, result))
+        except Exception as exc:  # surfaced to the page as an event
+            run.events.put(("error", None, exc))
+        finally:
+            with _routes_lock:
+                _runs_by_thread.pop(threading.get_ident(), None)
+                for task_id in [k for k, v in _runs_by_task.items() if v is run]:
+                    del _runs_by_task[task_id]
+
+    threading.Thread(target=telemetry.bind(worker), name="crew-stream", daemon=True).start()
+    while True:
+        event = run.events.get()
+        yield event
+        if event[0] in ("done", "error"):
+            return
+
+
+def stream_crew(task_specs, profile=None, use_cache=True, owner=""):
+    """``stream_run`` for a crew built from ``task_specs``, with the result cache; findings go to ``owner``.
+
+    ``owner`` may be an iterable of owners, as for ``crews.record_findings``.
+    """
+    if use_cache and profile is not None:
+        key, cached = crews.cached_result(task_specs, profile)
+        if cached is not None:
+            crews.record_findings(task_specs, profile, [None] * (len(task_specs) - 1) + [cached], owner)
+            yield "done", None, cached
+            return
+
+        def store(result):
+            result_cache.get_default().put(key, result)
+    else:
+        store = None
+
+    def kickoff(task_callback, on_built):
+        _, output = crews.kickoff(task_specs, profile, on_built, owner, task_callback=task_callback)
+        return crews.output_text(output)
+
+    yield from stream_run(kickoff, on_done=store)
+
@@ -0,0 +1,555 @@
+"""Per-request instrumentation: timings, token counts and cache hits.
+
+A *request* is one user action on a page (a crew run, a chat turn, indexing a
+PDF). ``request(name)`` opens a trace for it, and ``span(name)`` times one
+step inside the current trace: crew construction and kickoff, cache lookups,
+embedding calls, FAISS and BM25 searches. CrewAI task and LLM call events are
+attached to the trace that owns the crew, with prompt and completion tokens.
+
+Every span also feeds process-wide counters, whether or not a trace is open,
+exported in the Prometheus text format. Finished traces are appended to a
+JSONL log. Settings:
+
+``HEALTH_TWIN_TRACE_LOG``
+    JSONL trace log (default ``<cache dir>/traces.jsonl``; empty disables it).
+``HEALTH_TWIN_TRACE_LOG_MAX_BYTES``
+    Once the log passes this size (default 50 MiB) it is renamed to
+    ``<log>.1``, replacing the previous one, and a new log is started.
+``HEALTH_TWIN_METRICS_FILE``
+    Rewrite this file with the metrics after every request (for example a
+    node_exporter textfile collector path).
+``HEALTH_TWIN_METRICS_PORT``
+    Serve the metrics over HTTP on this port from the first request on.
+
+Dump the current metrics with::
+
+    python -m health_twin.telemetry metrics
+"""
+import argparse
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+
+from health_twin.result_cache import DEFAULT_DIR
+
+TRACE_LOG = os.getenv("HEALTH_TWIN_TRACE_LOG", os.path.join(DEFAULT_DIR, "traces.jsonl"))
+TRACE_LOG_MAX_BYTES = int(os.getenv("HEALTH_TWIN_TRACE_LOG_MAX_BYTES", 50 * 1024 ** 2))
+METRICS_FILE = os.getenv("HEALTH_TWIN_METRICS_FILE", "")
+METRICS_PORT = int(os.getenv("HEALTH_TWIN_METRICS_PORT", 0))
+
+# Upper bounds (seconds) of the span duration histogram
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Span attributes that are added up into the token and cache counters
+TOKEN_FIELDS = ("prompt_tokens", "completion_tokens")
+CACHE_FIELDS = ("hits", "misses")
+_COUNTER_LABELS = {"prompt_tokens": "prompt", "completion_tokens": "completion", "hits": "hit", "misses": "miss"}
+
+_current = contextvars.ContextVar("health_twin_trace", default=None)
+_depth = contextvars.ContextVar("health_twin_span_depth", default=0)
+
+
+class Trace:
+    """Spans recorded for one request, in completion order."""
+
+    def __init__(self, name, **attrs):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.attrs = attrs
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.duration = None
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def offset(self, perf_counter):
+        return perf_counter - self._started
+
+    def add(self, record):
+        with self._lock:
+            self.spans.append(record)
+
+    def finish(self):
+        self.duration = time.perf_counter() - self._started
+
+    def unaccounted(self):
+        """Request time outside any top-level span (page code, rendering, waiting)."""
+        with self._lock:
+            covered = sum(record["duration"] for record in self.spans if not record.get("depth"))
+        return max(0.0, (self.duration or 0.0) - covered)
+
+    def breakdown(self):
+        """Per-span-name totals: ``{name: {"count", "seconds", tokens..., hits, misses}}``."""
+        totals = defaultdict(lambda: defaultdict(float))
+        with self._lock:
+            spans = list(self.spans)
+        for record in spans:
+            total = totals[record["name"]]
+            total["count"] += 1
+            total["seconds"] += record["duration"]
+            for field in TOKEN_FIELDS + CACHE_FIELDS:
+                total[field] += record.get(field) or 0
+        return {name: dict(total) for name, total in totals.items()}
+
+    @classmethod
+    def from_dict(cls, record):
+        """A finished trace rebuilt from ``to_dict()`` output (e.g. one recorded by a background job)."""
+        fields = ("trace_id", "request", "started_at", "duration", "spans")
+        trace = cls(record["request"], **{key: value for key, value in record.items() if key not in fields})
+        trace.id = record["trace_id"]
+        trace.started_at = record["started_at"]
+        trace.duration = record["duration"]
+        trace.spans = list(record["spans"])
+        return trace
+
+    def to_dict(self):
+        with self._lock:
+            spans = sorted(self.spans, key=lambda record: record["start"])
+        return {
+            "trace_id": self.id,
+            "request": self.name,
+            "started_at": self.started_at,
+            "duration": self.duration,
+            **self.attrs,
+            "spans": spans,
+        }
+
+
+class Metrics:
+    """Process-wide counters and duration histograms keyed by span name."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = defaultdict(int)
+            self.request_seconds = defaultdict(float)
+            self.span_buckets = defaultdict(lambda: [0] * len(BUCKETS))
+            self.span_count = defaultdict(int)
+            self.span_seconds = defaultdict(float)
+            self.tokens = defaultdict(int)
+            self.cache = defaultdict(int)
+
+    def observe_span(self, name, seconds, attrs):
+        with self._lock:
+            self.span_count[name] += 1
+            self.span_seconds[name] += seconds
+            buckets = self.span_buckets[name]
+            for index, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    buckets[index] += 1
+            for field in TOKEN_FIELDS:
+                if attrs.get(field):
+                    self.tokens[(name, _COUNTER_LABELS[field])] += int(attrs[field])
+            for field in CACHE_FIELDS:
+                if attrs.get(field):
+                    self.cache[(name, _COUNTER_LABELS[field])] += int(attrs[field])
+
+    def observe_request(self, name, seconds, status):
+        with self._lock:
+            self.requests[(name, status)] += 1
+            self.request_seconds[name] += seconds
+
+    def prometheus_text(self):
+        """The metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            lines += [
+                "# HELP health_twin_requests_total Page requests by name and outcome.",
+                "# TYPE health_twin_requests_total counter",
+            ]
+            for (name, status), count in sorted(self.requests.items()):
+                lines.append(f'health_twin_requests_total{{request="{name}",status="{status}"}} {count}')
+            lines += [
+                "# HELP health_twin_request_seconds_total Wall-clock time spent in page requests.",
+                "# TYPE health_twin_request_seconds_total counter",
+            ]
+            for name, seconds in sorted(self.request_seconds.items()):
+                lines.append(f'health_twin_request_seconds_total{{request="{name}"}} {seconds:.6f}')
+            lines += [
+                "# HELP health_twin_span_seconds Duration of instrumented operations.",
+                "# TYPE health_twin_span_seconds histogram",
+            ]
+            for name in sorted(self.span_count):
+                for bound, count in zip(BUCKETS, self.span_buckets[name]):
+                    lines.append(f'health_twin_span_seconds_bucket{{op="{name}",le="{bound}"}} {count}')
+                lines.append(f'health_twin_span_seconds_bucket{{op="{name}",le="+Inf"}} {self.span_count[name]}')
+                lines.append(f'health_twin_span_seconds_sum{{op="{name}"}} {self.span_seconds[name]:.6f}')
+                lines.append(f'health_twin_span_seconds_count{{op="{name}"}} {self.span_count[name]}')
+            lines += [
+                "# HELP health_twin_tokens_total LLM tokens by operation and kind (prompt or completion).",
+                "# TYPE health_twin_tokens_total counter",
+            ]
+            for (name, kind), count in sorted(self.tokens.items()):
+                lines.append(f'health_twin_tokens_total{{op="{name}",kind="{kind}"}} {count}')
+            lines += [
+                "# HELP health_twin_cache_total Cache lookups by cache and result (hit or miss).",
+                "# TYPE health_twin_cache_total counter",
+            ]
+            for (name, result), count in sorted(self.cache.items()):
+                lines.append(f'health_twin_cache_total{{op="{name}",result="{result}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+def current_trace():
+    return _current.get()
+
+
+def record_span(name, duration, start=None, trace=None, **attrs):
+    """Record a finished span; it joins ``trace`` (default: the current one) if any."""
+    metrics.observe_span(name, duration, attrs)
+    trace = trace if trace is not None else _current.get()
+    if trace is not None:
+        start = time.perf_counter() - duration if start is None else start
+        trace.add({"name": name, "start": round(trace.offset(start), 6), "duration": round(duration, 6), **attrs})
+
+
+@contextmanager
+def span(name, **attrs):
+    """Time the enclosed block as ``name``.
+
+    Yields the attribute dict, so the block can add token counts (``prompt_tokens``,
+    ``completion_tokens``), cache results (``hits``, ``misses``) or anything else
+    worth keeping in the trace.
+    """
+    start = time.perf_counter()
+    depth = _depth.get()
+    token = _depth.set(depth + 1)
+    try:
+        yield attrs
+    except Exception as exc:
+        attrs["error"] = type(exc).__name__
+        raise
+    finally:
+        _depth.reset(token)
+        attrs.setdefault("depth", depth)
+        record_span(name, time.perf_counter() - start, start=start, **attrs)
+
+
+@contextmanager
+def request(name, **attrs):
+    """Open a trace for one page request; yields the ``Trace``."""
+    _ensure_server()
+    trace = Trace(name, **attrs)
+    token = _current.set(trace)
+    status = "ok"
+    try:
+        yield trace
+    except Exception as exc:  # not Streamlit's st.stop()/st.rerun() control flow
+        status = "error"
+        trace.attrs["error"] = type(exc).__name__
+        raise
+    finally:
+        _current.reset(token)
+        trace.finish()
+        metrics.observe_request(name, trace.duration, status)
+        _export(trace)
+
+
+def bind(fn):
+    """Wrap ``fn`` to run in a copy of the caller's context (for worker threads)."""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+
+_log_lock = threading.Lock()
+
+
+def _export(trace):
+    if TRACE_LOG:
+        line = json.dumps(trace.to_dict(), ensure_ascii=False, default=str)
+        with _log_lock:
+            os.makedirs(os.path.dirname(TRACE_LOG) or ".", exist_ok=True)
+            with open(TRACE_LOG, "a", encoding="utf-8") as log:
+                log.write(line + "\n")
+                size = log.tell()
+            if TRACE_LOG_MAX_BYTES and size >= TRACE_LOG_MAX_BYTES:
+                # Keep one generation, so the log takes at most twice the limit on disk
+                os.replace(TRACE_LOG, f"{TRACE_LOG}.1")
+    if METRICS_FILE:
+        write_metrics(METRICS_FILE)
+
+
+def write_metrics(path):
+    """Atomically rewrite ``path`` with the current metrics."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    staging = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(staging, "w", encoding="utf-8") as out:
+        out.write(metrics.prometheus_text())
+    os.replace(staging, path)
+
+
+_server_state = {"server": None}
+_server_lock = threading.Lock()
+
+
+def _ensure_server():
+    if METRICS_PORT and _server_state["server"] is None:
+        serve_metrics(METRICS_PORT)
+
+
+def serve_metrics(port, host="0.0.0.0"):
+    """Serve ``/metrics`` on a daemon thread (once per process); returns the server."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = metrics.prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    with _server_lock:
+        if _server_state["server"] is None:
+            server = ThreadingHTTPServer((host, port), Handler)
+            threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+            _server_state["server"] = server
+        return _server_state["server"]
+
+
+# CrewAI events --------------------------------------------------------------------
+
+_routes_lock = threading.Lock()
+_traces_by_task = {}
+_task_started = {}
+_llm_started = {}
+_listener_state = {"installed": None}
+
+
+def _install_listener():
+    """Subscribe once per process to CrewAI's task and LLM call events."""
+    with _routes_lock:
+        if _listener_state["installed"] is not None:
+            return _listener_state["installed"]
+        try:
+            from crewai.events import (
+                crewai_event_bus,
+                LLMCallCompletedEvent,
+                LLMCallFailedEvent,
+                LLMCallStartedEvent,
+                TaskCompletedEvent,
+                TaskFailedEvent,
+                TaskStartedEvent,
+            )
+        except ImportError:
+            _listener_state["installed"] = False
+            return False
+
+        # Handlers run on the event bus's worker threads, so durations come from
+        # the event timestamps and traces are found through the task id
+        @crewai_event_bus.on(TaskStartedEvent)
+        def _on_task_started(source, event):
+            with _routes_lock:
+                _task_started[str(event.task_id)] = event.timestamp
+
+        @crewai_event_bus.on(TaskCompletedEvent)
+        @crewai_event_bus.on(TaskFailedEvent)
+        def _on_task_finished(source, event):
+            task_id = str(event.task_id)
+            with _routes_lock:
+                started = _task_started.pop(task_id, None)
+                trace, index, depth = _traces_by_task.get(task_id, (None, None, 0))
+            if started is None:
+                return
+            duration = (event.timestamp - started).total_seconds()
+            attrs = {"task": index, "agent": event.agent_role, "depth": depth + 1}
+            if not isinstance(event, TaskCompletedEvent):
+                attrs["error"] = "TaskFailed"
+            _record_event_span("crew.task", duration, trace, **attrs)
+
+        @crewai_event_bus.on(LLMCallStartedEvent)
+        def _on_llm_started(source, event):
+            with _routes_lock:
+                _llm_started[event.call_id] = event.timestamp
+
+        @crewai_event_bus.on(LLMCallCompletedEvent)
+        @crewai_event_bus.on(LLMCallFailedEvent)
+        def _on_llm_finished(source, event):
+            with _routes_lock:
+                started = _llm_started.pop(event.call_id, None)
+                trace, index, depth = _traces_by_task.get(str(event.task_id), (None, None, 0))
+            if started is None:
+                return
+            usage = getattr(event, "usage", None) or {}
+            attrs = {
+                "model": event.model,
+                "task": index,
+                "depth": depth + 2,
+                "prompt_tokens": usage.get("prompt_tokens"),
+                "completion_tokens": usage.get("completion_tokens"),
+            }
+            if not isinstance(event, LLMCallCompletedEvent):
+                attrs["error"] = "LLMCallFailed"
+            _record_event_span("llm.call", (event.timestamp - started).total_seconds(), trace, **attrs)
+
+        _listener_state["installed"] = True
+        return True
+
+
+def _record_event_span(name, duration, trace, **attrs):
+    attrs = {key: value for key, value in attrs.items() if value is not None}
+    if trace is None:
+        metrics.observe_span(name, duration, attrs)
+        return
+    # Place the span at the moment it ended, relative to the trace start
+    record_span(name, duration, start=time.perf_counter() - duration, trace=trace, **attrs)
+
+
+def attach_crew(crew):
+    """Route ``crew``'s task and LLM events to the current trace (call before kickoff)."""
+    _install_listener()
+    trace, depth = _current.get(), _depth.get()
+    with _routes_lock:
+        for index, task in enumerate(crew.tasks):
+            _traces_by_task[str(task.id)] = (trace, index, depth)
+
+
+def detach_crew(crew, timeout=2.0):
+    """Wait for ``crew``'s pending events to be handled, then drop its routes."""
+    if _listener_state["installed"]:
+        from crewai.events import crewai_event_bus
+
+        crewai_event_bus.flush(timeout=timeout)
+    with _routes_lock:
+        for task in crew.tasks:
+            _traces_by_task.pop(str(task.id), None)
+            _task_started.pop(str(task.id), None)
+
+
+# LangChain ------------------------------------------------------------------------
+
+def langchain_callback():
+    """LangChain callback handler recording every chat model call as an ``llm.call`` span."""
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class TelemetryCallback(BaseCallbackHandler):
+        def __init__(self):
+            self._started = {}
+
+        def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+            self._started[run_id] = time.perf_counter()
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+            self._started[run_id] = time.perf_counter()
+
+        def on_llm_end(self, response, *, run_id, **kwargs):
+            start = self._started.pop(run_id, None)
+            if start is None:
+                return
+            usage = (response.llm_output or {}).get("token_usage") or {}
+            attrs = {key: usage[key] for key in TOKEN_FIELDS if usage.get(key)}
+            record_span("llm.call", time.perf_counter() - start, start=start, **attrs)
+
+        def on_llm_error(self, error, *, run_id, **kwargs):
+            start = self._started.pop(run_id, None)
+            if start is not None:
+                record_span("llm.call", time.perf_counter() - start, start=start, error=type(error).__name__)
+
+    return TelemetryCallback()
+
+
+# Streamlit ------------------------------------------------------------------------
+
+@contextmanager
+def st_request(name, **attrs):
+    """``request`` for a page; the trace is kept for ``st_debug_panel``."""
+    import streamlit as st
+
+    with request(name, **attrs) as trace:
+        try:
+            yield trace
+        finally:
+            st.session_state["telemetry_last_trace"] = trace
+
+
+def st_show_trace(record):
+    """Show a trace recorded off the page (a background job's ``to_dict()``) in ``st_debug_panel``."""
+    import streamlit as st
+
+    if record is not None:
+        st.session_state["telemetry_last_trace"] = Trace.from_dict(record)
+
+
+def debug_enabled():
+    import streamlit as st
+
+    return os.getenv("HEALTH_TWIN_DEBUG") == "1" or st.query_params.get("debug") == "1"
+
+
+def st_debug_panel():
+    """Sidebar breakdown of the last request (open the page with ?debug=1)."""
+    import streamlit as st
+
+    if not debug_enabled():
+        return
+    trace = st.session_state.get("telemetry_last_trace")
+    with st.sidebar.expander("🔬 Last request", expanded=True):
+        if trace is None or trace.duration is None:
+            st.caption("No request yet on this page.")
+            return
+        st.metric(trace.name, f"{trace.duration * 1000:.0f} ms")
+        rows = [
+            {
+                "step": name,
+                "calls": int(total["count"]),
+                "ms": round(total["seconds"] * 1000, 1),
+                "share": f"{total['seconds'] / trace.duration:.0%}" if trace.duration else "",
+                "tokens in/out": f"{int(total['prompt_tokens'])}/{int(total['completion_tokens'])}",
+                "cache hit/miss": f"{int(total['hits'])}/{int(total['misses'])}",
+            }
+            for name, total in sorted(trace.breakdown().items(), key=lambda item: -item[1]["seconds"])
+        ]
+        other = trace.unaccounted()
+        rest = "job code outside the steps" if "job" in trace.attrs else "page code & rendering"
+        rows.append({"step": rest, "ms": round(other * 1000, 1), "share": f"{other / trace.duration:.0%}"})
+        st.dataframe(rows, hide_index=True)
+        st.caption(f"Trace {trace.id[:12]} · nested steps overlap, so shares can add up past 100%")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m health_twin.telemetry", description=__doc__.split("\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("metrics", help="print metrics aggregated from the trace log")
+    tail = commands.add_parser("tail", help="print a per-step breakdown of the last traces")
+    tail.add_argument("-n", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    traces = []
+    if TRACE_LOG and os.path.exists(TRACE_LOG):
+        with open(TRACE_LOG, encoding="utf-8") as log:
+            traces = [json.loads(line) for line in log if line.strip()]
+
+    if args.command == "metrics":
+        # Rebuild the counters from the log, since this process served no requests
+        for record in traces:
+            metrics.observe_request(record["request"], record["duration"] or 0.0, "error" if "error" in record else "ok")
+            for item in record["spans"]:
+                metrics.observe_span(item["name"], item["duration"], item)
+        sys.stdout.write(metrics.prometheus_text())
+    else:
+        for record in traces[-args.n:]:
+            print(f"{record['request']} {record['trace_id'][:12]} {record['duration'] * 1000:.0f} ms")
+            for item in record["spans"]:
+                indent = "  " * (1 + item.get("depth", 0))
+                extra = " ".join(f"{k}={item[k]}" for k in TOKEN_FIELDS + CACHE_FIELDS + ("task",) if k in item)
+                print(f"{indent}{item['start'] * 1000:8.1f} +{item['duration'] * 1000:8.1f} ms  {item['name']} {extra}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""Background preloading of the heavy dependencies, and an import-time report.
+
+Pages import CrewAI and LangChain only on the code path that needs them, so
+a page paints as soon as Streamlit itself is loaded. The first crew run or
+PDF upload would then pay those imports instead. ``start()`` (called by every
+page, a no-op after the first call) avoids that: it imports them on a daemon
+thread and pre-builds one agent per role while the user is still filling in
+the page. Set ``HEALTH_TWIN_PRELOAD=0`` to turn it off.
+
+See where cold-start time goes with::
+
+    python -m health_twin.warmup              # preload steps, timed in a fresh process
+    python -m health_twin.warmup --pages      # cold import time of every page
+    python -m health_twin.warmup --top 15     # heaviest modules (python -X importtime)
+"""
+import argparse
+import ast
+import importlib
+import os
+import subprocess
+import sys
+import threading
+import time
+
+PRELOAD = os.getenv("HEALTH_TWIN_PRELOAD", "1") == "1"
+
+# Imported in this order; later groups reuse what earlier ones pulled in
+PRELOAD_MODULES = (
+    "crewai",
+    "crewai.events",
+    "health_twin.embeddings",
+    "health_twin.retrieval",
+    "langchain.text_splitter",
+    "langchain.chains",
+    "langchain.memory",
+    "langchain_community.chat_models",
+    "langchain_community.vectorstores",
+    "fitz",
+)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_lock = threading.Lock()
+_state = {"thread": None, "started": None, "finished": None}
+# (step, seconds, error or None) in completion order
+_report = []
+
+
+def _step(name, fn):
+    started = time.perf_counter()
+    error = None
+    try:
+        fn()
+    except Exception as exc:  # a failed warm-up step only means a slower first request
+        error = f"{type(exc).__name__}: {exc}"
+    with _lock:
+        _report.append((name, time.perf_counter() - started, error))
+
+
+def _warm_agents():
+    from health_twin.agents import AGENT_SPECS, lease_agents
+
+    with lease_agents(*AGENT_SPECS):
+        pass
+
+
+def _warm_sessions():
+    from health_twin import sessions
+
+    sessions.warm()
+
+
+def preload(modules=PRELOAD_MODULES, agents=True):
+    """Import ``modules`` and pre-build the agent registry; returns the report."""
+    from dotenv import load_dotenv
+
+    with _lock:
+        _state["started"] = time.time()
+    # Agents read the model name from the environment; the survey page never loads .env itself
+    _step("load .env", load_dotenv)
+    for name in modules:
+        _step(f"import {name}", lambda name=name: importlib.import_module(name))
+    if agents:
+        _step("build agents", _warm_agents)
+        _step("build therapist session crew", _warm_sessions)
+    with _lock:
+        _state["finished"] = time.time()
+    return report()
+
+
+def start(modules=PRELOAD_MODULES, agents=True):
+    """Run ``preload`` once per process on a daemon thread (when ``HEALTH_TWIN_PRELOAD`` is on)."""
+    if not PRELOAD:
+        return None
+    with _lock:
+        if _state["thread"] is None:
+            _state["thread"] = threading.Thread(
+                target=preload, args=(modules, agents), name="health-twin-preload", daemon=True
+            )
+            _state["thread"].start()
+        return _state["thread"]
+
+
+def wait(timeout=None):
+    """Block until a started preload finishes; returns ``True`` when it has."""
+    thread = _state["thread"]
+    if thread is not None:
+        thread.join(timeout)
+    return _state["finished"] is not None
+
+
+def report():
+    """``{"steps": [(step, seconds, error)], "started", "finished"}`` for this process."""
+    with _lock:
+        return {"steps": list(_report), "started": _state["started"], "finished": _state["finished"]}
+
+
+def page_imports(path):
+    """Source of the module-level import statements of the script at ``path``."""
+    with open(path, encoding="utf-8") as source:
+        tree = ast.parse(source.read(), path)
+    return "\n".join(ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+_TIMER = (
+    "import time, streamlit\n"
+    "started = time.perf_counter()\n"
+    "exec(compile({code!r}, 'page', 'exec'))\n"
+    "print(time.perf_counter() - started)\n"
+)
+
+
+def cold_import_seconds(path, cwd=ROOT):
+    """Seconds a fresh interpreter spends on the imports of ``path``, past Streamlit itself."""
+    result = subprocess.run(
+        [sys.executable, "-c", _TIMER.format(code=page_imports(path))],
+        cwd=cwd, capture_output=True, text=True, check=True,
+    )
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def heaviest_imports(modules=PRELOAD_MODULES, top=15, cwd=ROOT):
+    """``[(module, cumulative_seconds)]`` for the slowest imports, from ``python -X importtime``."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "; ".join(f"import {name}" for name in modules)],
+        cwd=cwd, capture_output=True, text=True,
+    )
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = (part.strip() for part in line[len("import time:"):].split("|"))
+        # Only top-level packages, so nested modules are not counted twice
+        if "." not in module.strip():
+            timings.append((module.strip(), int(cumulative) / 1e6))
+    return sorted(timings, key=lambda item: -item[1])[:top]
+
+
+def page_paths(root=ROOT):
+    pages = os.path.join(root, "pages")
+    return sorted(os.path.join(pages, name) for name in os.listdir(pages) if name.endswith(".py"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m health_twin.warmup", description=__doc__.split("\n")[0])
+    parser.add_argument("--pages", action="store_true", help="cold import time of every page")
+    parser.add_argument("--top", type=int, default=0, help="list the N heaviest top-level imports")
+    parser.add_argument("--no-agents", action="store_true", help="skip pre-building agents")
+    args = parser.parse_args(argv)
+
+    if args.pages:
+        for path in page_paths():
+            print(f"{cold_import_seconds(path) * 1000:9.0f} ms  {os.path.relpath(path, ROOT)}")
+    elif args.top:
+        for module, seconds in heaviest_imports(top=args.top):
+            print(f"{seconds * 1000:9.0f} ms  {module}")
+    else:
+        total = 0.0
+        for step, seconds, error in preload(agents=not args.no_agents)["steps"]:
+            total += seconds
+            print(f"{seconds * 1000:9.0f} ms  {step}" + (f"  (failed: {error})" if error else ""))
+        print(f"{total * 1000:9.0f} ms  total")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import streamlit as st
+from dotenv import load_dotenv
+from health_twin import assessments, jobs, report_store, telemetry, warmup
+from health_twin.crews import ASSESSMENT_SECTIONS, owner_trends
+from health_twin.profile import HealthProfile, ProfileError, parse_profile
+from health_twin.result_cache import profile_hash
+
+# Load environment variables
+load_dotenv()
+# Import CrewAI and build the agents in the background, once per server process
+warmup.start()
+
+# Step 1: Set up Streamlit UI
+st.set_page_config(page_title="AI Health Twin", layout="wide")
+
+st.markdown(
+    """
+    <style>
+        [data-testid="stSidebarNav"] {display: none;} /* Hides default Streamlit sidebar navigation */
+    </style>
+    """,
+    unsafe_allow_html=True
+)
+
+st.sidebar.markdown('<h1 class="centered">👨‍⚕️ AI Health Twin</h1>', unsafe_allow_html=True)
+# Sidebar Navigation Buttons
+st.sidebar.page_link("main_app.py", label="🏠 Home")
+st.sidebar.page_link("pages/health_analysis_agent.py", label="🩺 Health Analysis")
+st.sidebar.page_link("pages/lifestyle_coach_agent.py", label="🏋️‍♂️ Lifestyle Recommendations")
+st.sidebar.page_link("pages/health_educator.py", label="📖 General Educator")
+st.sidebar.page_link("pages/risk_factor_agent.py", label="⚠️ Risk Factor Detection")
+st.sidebar.page_link("pages/full_assessment.py", label="🧾 Full Assessment")
+st.sidebar.page_link("pages/therapist.py", label="💙 Emotional Support")
+
+# Add a small footer
+st.sidebar.markdown("---")
+st.sidebar.caption("© 2025 AI Health Twin | Your Digital Health Companion")
+col1, col2 = st.columns([30, 2])  # Adjust column width to push button to the right
+with col2:
+    if st.button("🏠"):
+        st.switch_page("main_app.py")
+st.title("🧾 AI Health Twin - Full Health Assessment")
+st.write("Upload your health data file (JSON format) to get the health analysis and the future risk assessment in one report.")
+
+# Step 2: File Upload for Health Data
+uploaded_file = st.file_uploader("📄 Upload your Health Data file (JSON format):", type=["json"])
+
+# Step 3: Run the analysis and risk crews side by side in a background job
+# Both chains start at once; each section appears as soon as its crew finishes.
+# The job id is kept in the URL, so a reload picks the same run up again
+# A profile opened on another page (survey, analysis, risk) needs no new upload
+current_assessment = assessments.st_current()
+if uploaded_file is None and current_assessment is not None:
+    st.caption("📋 Using the profile from your current assessment. Upload a file to assess another one.")
+if st.button("🧾 Get Full Health Assessment"):
+    if uploaded_file is None and current_assessment is None:
+        st.error("⚠️ Please upload a valid JSON health data file.")
+    else:
+        # Parse and validate the upload once (cached by file hash)
+        try:
+            if uploaded_file is not None:
+                profile = parse_profile(uploaded_file.getvalue())
+            else:
+                profile = HealthProfile.from_dict(current_assessment["profile"])
+        except ProfileError as exc:
+            st.error(f"⚠️ {exc}")
+            st.stop()
+        # Sections the analysis or risk page already produced for this profile are reused
+        assessments.st_open(profile.to_dict())
+
+        # An identical assessment already running (same profile and survey trends) is joined
+        # instead of started again
+        owner = report_store.st_owner()
+        with telemetry.st_request("full_assessment"):
+            st.query_params["job"] = jobs.get_default().submit(
+                "full_assessment", {"profile": profile.to_dict(), "trends": owner_trends(owner)}, owner
+            )
+
+
+def show_sections(job):
+    for key, title, _ in ASSESSMENT_SECTIONS:
+        if key in job["progress"]:
+            st.markdown(f"### {title}\n\n{job['progress'][key]}")
+        else:
+            st.info(f"⏳ {title} in progress...")
+
+
+if "job" in st.query_params:
+    st.subheader("🤖 AI Health Twin Full Assessment:")
+    job = jobs.st_job(st.query_params["job"], show_sections)
+    if job is not None:
+        # Combined report, kept in this user's report store (once per job) and downloaded from there
+        reports = report_store.get_default()
+        saved = st.session_state.setdefault("saved_jobs", {})
+        if job["id"] not in saved:
+            saved[job["id"]] = reports.save(
+                report_store.st_owner(), profile_hash(job["payload"]["profile"]), "assessment", job["result"]
+            )
+        st.download_button(
+            label="📥 Download Full Assessment",
+            data=reports.get(saved[job["id"]]).encode("utf-8"),
+            file_name="health_assessment.md",
+            mime="text/markdown"
+        )
+
+# Timing breakdown of the last request (open the page with ?debug=1)
+telemetry.st_debug_panel()
@@ -1,10 +1,21 @@
+import time
 import streamlit as st
-import json
-from crewai import Agent, Task, Crew, Process
 from dotenv import load_dotenv
+from health_twin import assessments, jobs, report_store, telemetry, warmup
+from health_twin.crews import (
+    analysis_task_specs,
+    fused_analysis_task_specs,
+    incremental_task_specs,
+    owner_trends,
+    render_result,
+)
+from health_twin.profile import HealthProfile, ProfileError, parse_profile
+from health_twin.result_cache import profile_hash
 
 # Load environment variables
 load_dotenv()
+# Import CrewAI and build the agents in the background, once per server process
+warmup.start()
 
 # Step 1: Set up Streamlit UI
 st.set_page_config(page_title="AI Health Twin", layout="wide")
@@ -25,6 +36,7 @@ st.sidebar.page_link("pages/health_analysis_agent.py", label="🩺 Health Analys
 st.sidebar.page_link("pages/lifestyle_coach_agent.py", label="🏋️‍♂️ Lifestyle Recommendations")
 st.sidebar.page_link("pages/health_educator.py", label="📖 General Educator")
 st.sidebar.page_link("pages/risk_factor_agent.py", label="⚠️ Risk Factor Detection")
+st.sidebar.page_link("pages/full_assessment.py", label="🧾 Full Assessment")
 st.sidebar.page_link("pages/therapist.py", label="💙 Emotional Support")
 
 # Add a small footer
@@ -54,91 +66,114 @@ st.write("Upload your medical history file (JSON format), and the AI will provid
 
 # Step 2: File Upload for Health Data
 uploaded_file = st.file_uploader("📄 Upload your Health Data file (JSON format):", type=["json"])
-
-# Step 3: Define the Health Analyst Agent
-health_analyst_agent = Agent(
-    role="Health Data Analyst",
-    goal="Analyze patient health metrics and generate a comprehensive health report.",
-    backstory="An AI-powered health specialist trained in analyzing patient lifestyle, medical history, and risk factors to generate insightful recommendations.",
-    verbose=False,
-    memory=True
-)
-
-# Step 4: Define the Health Advisor Agent
-health_advisor_agent = Agent(
-    role="AI Health Advisor",
-    goal="Recommend personalized lifestyle changes to optimize health and prevent future diseases.",
-    backstory="An AI-driven preventive healthcare expert focusing on personalized diet, exercise, and stress management strategies.",
-    verbose=False,
-    memory=True
-)
-
-# Step 5: Process File Upload & AI Analysis
+stream_output = st.checkbox("⚡ Show the analysis as it is generated", value=True)
+fused_mode = st.checkbox("🧩 Fused mode: analysis and lifestyle plan in one structured AI call (faster)", value=False)
+
+
+def show_download(profile_data, health_report_text, job_id=None):
+    # Save the report in this user's report store (once per background job); the write
+    # happens in the background and an identical report is stored only once
+    reports = report_store.get_default()
+    saved = st.session_state.setdefault("saved_jobs", {})
+    digest = saved.get(job_id) if job_id else None
+    if digest is None:
+        digest = reports.save(report_store.st_owner(), profile_hash(profile_data), "analysis", health_report_text)
+        if job_id:
+            saved[job_id] = digest
+
+    # Download Button, served from the report store
+    st.download_button(
+        label="📥 Download Full Health Report",
+        data=reports.get(digest).encode("utf-8"),  # Convert to bytes
+        file_name="health_report.md",
+        mime="text/markdown"
+    )
+
+
+# Step 3: Process File Upload & AI Analysis
+# Agents come from the shared registry; identical profiles are served from the result cache
+# A profile opened on another page (survey, risk, full assessment) needs no new upload
+current_assessment = assessments.st_current()
+if uploaded_file is None and current_assessment is not None:
+    st.caption("📋 Using the profile from your current assessment. Upload a file to analyze another one.")
 if st.button("🧑‍⚕️ Get AI Health Analysis"):
-    if uploaded_file is None:
+    if uploaded_file is None and current_assessment is None:
         st.error("⚠️ Please upload a valid health data file.")
     else:
-        # Read JSON file content
-        health_data = json.load(uploaded_file)
-
-        # Define AI Tasks
-        health_analysis_task = Task(
-            description=f"""
-            Analyze the following health data:
-            Age: {health_data["age"]}, Gender: {health_data["gender"]}
-            Height: {health_data["height"]} cm, Weight: {health_data["weight"]} kg
-            Sleep: {health_data["sleep"]} hours, Water Intake: {health_data["water"]} glasses
-            Exercise: {health_data["exercise"]}, Diet: {health_data["diet"]}
-            Alcohol: {health_data["alcohol"]}, Smoking: {health_data["smoking"]}
-            Chronic Conditions: {', '.join(health_data["chronic_conditions"])}
-            Family History: {', '.join(health_data["family_history"])}
-            Stress Level: {health_data["stress_level"]}/10, Mental Health: {health_data["mental_health"]}
-            Medications: {', '.join([med['name'] for med in health_data['medications']])}
-            Supplements: {', '.join(health_data['supplements'])}
-            Health Goals: {', '.join(health_data['health_goals'])}
-
-            Evaluate key health trends, risks, and potential concerns based on this data.
-            """,
-            expected_output="A structured report summarizing the health risks, key observations, and insights.",
-            agent=health_analyst_agent
-        )
-
-        lifestyle_recommendation_task = Task(
-            description="""
-            Based on the patient's health metrics, provide a personalized lifestyle plan including:
-            - Ideal sleep patterns and stress management strategies.
-            - Recommended diet based on their chronic conditions.
-            - Optimal exercise routine and hydration goals.
-            - Preventive measures for risks like diabetes and heart disease.
-            """,
-            expected_output="A structured health improvement plan with specific, actionable recommendations.",
-            agent=health_advisor_agent
-        )
-
-        # Create and Run the Crew
-        healthcare_crew = Crew(
-            agents=[health_analyst_agent, health_advisor_agent],
-            tasks=[health_analysis_task, lifestyle_recommendation_task],
-            process=Process.sequential
-        )
-
-        final_response = healthcare_crew.kickoff(inputs={"health_data": health_data})
-
-        # Convert CrewOutput to string
-        health_report_text = str(final_response)
-
-        # Display AI Health Insights
-        st.subheader("🤖 AI Health Twin Recommendations:")
-        st.success(health_report_text)
-
-        # Save report to file
-        with open("health_report.md", "w") as report_file:
-            report_file.write(health_report_text)
-
-        # Corrected Download Button
-        st.download_button(
-            label="📥 Download Full Health Report",
-            data=health_report_text.encode("utf-8"),  # Convert to bytes
-            file_name="health_report.md",
-            mime="text/markdown"
-        )
+        # Parse and validate the upload once (cached by file hash)
+        try:
+            if uploaded_file is not None:
+                profile = parse_profile(uploaded_file.getvalue())
+            else:
+                profile = HealthProfile.from_dict(current_assessment["profile"])
+        except ProfileError as exc:
+            st.error(f"⚠️ {exc}")
+            st.stop()
+        # A new request replaces the background run shown from an earlier one
+        st.query_params.pop("job", None)
+        # The profile's shared assessment: findings any page already produced for this user
+        # (from the same inputs) are not run again
+        assessment = assessments.st_open(profile.to_dict())
+
+        # Trends from the surveys this user submitted earlier: only the precomputed
+        # changes go into the prompt, never the raw history (the full assessment uses the same)
+        trends = owner_trends(report_store.st_owner())
+        if trends:
+            st.info(f"📈 {trends}")
+
+        # Run the Crew (cached on the canonical profile, task definitions and model)
+        # and display AI Health Insights
+        if fused_mode:
+            known, task_specs = [], fused_analysis_task_specs(profile, trends)
+        else:
+            known, task_specs = incremental_task_specs(
+                analysis_task_specs(profile, trends), assessment["findings"], assessment["bases"]
+            )
+        with telemetry.st_request("health_analysis"):
+            if not task_specs:
+                st.subheader("🤖 AI Health Twin Recommendations:")
+                assessments.st_show(assessment["findings"], known, final=st.success)
+                show_download(profile.to_dict(), assessment["findings"][known[-1]])
+            else:
+                # Runs on the background workers and is polled below, so no script thread waits on the crew;
+                # a streamed run shows its text as it is generated (a fused answer is one JSON object,
+                # so it is never streamed)
+                st.query_params["job"] = jobs.get_default().submit(
+                    "crew",
+                    {
+                        "tasks": task_specs,
+                        "profile": profile.to_dict(),
+                        "known": [[name, assessment["findings"][name]] for name in known],
+                        "stream": stream_output and not fused_mode,
+                    },
+                    report_store.st_owner()
+                )
+
+# A background run (from above, or from before a reload) is polled here
+if "job" in st.query_params:
+    st.subheader("🤖 AI Health Twin Recommendations:")
+    job = jobs.st_crew_job(st.query_params["job"], ["🔎 Health Analysis", "📝 Lifestyle Plan"], final=st.success)
+    if job is not None:
+        report_text = render_result(job["payload"]["tasks"], job["result"])
+        show_download(job["payload"]["profile"], report_text, job["id"])
+
+# Step 4: Reports saved earlier from this browser (or by this signed-in user)
+reports = report_store.get_default()
+saved_reports = reports.list(report_store.st_owner(), limit=10)
+if saved_reports:
+    with st.expander(f"🗂️ Your saved reports ({len(saved_reports)})"):
+        for report in saved_reports:
+            saved_text = reports.get(report["digest"])
+            if saved_text is None:  # evicted in the meantime
+                continue
+            saved_at = time.strftime("%Y-%m-%d %H:%M", time.localtime(report["created"]))
+            st.download_button(
+                label=f"📥 {report['kind'].title()} report from {saved_at}",
+                data=saved_text.encode("utf-8"),
+                file_name=f"health_report_{report['digest'][:8]}.md",
+                mime="text/markdown",
+                key=f"saved_report_{report['digest']}"
+            )
+
+# Timing breakdown of the last request (open the page with ?debug=1)
+telemetry.st_debug_panel()
@@ -1,9 +1,12 @@
+import os
 import streamlit as st
-from crewai import Agent, Task, Crew, Process
 from dotenv import load_dotenv
+from health_twin import jobs, report_store, telemetry, warmup
 
 # Load environment variables
 load_dotenv()
+# Import CrewAI and build the agents in the background, once per server process
+warmup.start()
 
 # Step 1: Set up Streamlit UI
 st.set_page_config(page_title="AI Health Educator", layout="wide")
@@ -24,6 +27,7 @@ st.sidebar.page_link("pages/health_analysis_agent.py", label="🩺 Health Analys
 st.sidebar.page_link("pages/lifestyle_coach_agent.py", label="🏋️‍♂️ Lifestyle Recommendations")
 st.sidebar.page_link("pages/health_educator.py", label="📖 General Educator")
 st.sidebar.page_link("pages/risk_factor_agent.py", label="⚠️ Risk Factor Detection")
+st.sidebar.page_link("pages/full_assessment.py", label="🧾 Full Assessment")
 st.sidebar.page_link("pages/therapist.py", label="💙 Emotional Support")
 
 # Add a small footer
@@ -36,45 +40,49 @@ with col2:
 st.title("💡 AI Health Educator - Ask Me Anything!")
 st.write("Chat with an AI-powered health educator to get answers on general health topics.")
 
-# Step 2: Define the Health Educator Agent
-health_educator_agent = Agent(
-    role="AI Health Educator",
-    goal="Provide accurate, science-backed answers to general health-related questions.",
-    backstory=(
-        "You are a highly knowledgeable AI health educator with expertise in nutrition, fitness, "
-        "mental health, disease prevention, and wellness. You provide reliable, friendly, and easy-to-understand answers."
-    ),
-    verbose=False,  # Ensures minimal logging
-    memory=True  # Keeps track of previous user queries for better context
-)
-
-# Step 3: Chat Interface for User Queries
+# Step 2: Chat Interface for User Queries
+# The educator agent comes from the shared registry, built once per server process
 user_query = st.text_input("📝 Ask a health-related question:")
+stream_output = st.checkbox("⚡ Show the answer as it is generated", value=True)
 
 if st.button("💬 Get AI Answer"):
     if user_query.strip() == "":
         st.warning("⚠️ Please enter a health question.")
     else:
-        # Define AI Task
-        health_education_task = Task(
-            description=f"Answer this health-related question in a clear and concise manner: {user_query}",
-            expected_output="A well-researched and easy-to-understand answer to the user's health query.",
-            agent=health_educator_agent
-        )
+        # Near-duplicate questions are answered from the semantic cache in milliseconds
+        with telemetry.st_request("health_educator"):
+            # NumPy-backed cache; imported on the first question so the page paints without it
+            from health_twin import semantic_cache
+
+            # A new question replaces the background run shown for an earlier one
+            st.query_params.pop("job", None)
+            cached = semantic_cache.get_default().lookup(user_query)
+            if cached is not None:
+                final_answer, similarity = cached
+                st.subheader("🤖 AI Health Educator's Answer:")
+                st.write(final_answer)
+                st.caption(f"⚡ Answered from a similar question (similarity {similarity:.2f})")
+            else:
+                # Runs on the background workers (which also cache the answer) and is polled below,
+                # so no script thread waits on the crew
+                st.query_params["job"] = jobs.get_default().submit(
+                    "educator", {"question": user_query, "stream": stream_output}, report_store.st_owner()
+                )
 
-        # Create a Crew with just the Health Educator
-        health_crew = Crew(
-            agents=[health_educator_agent],
-            tasks=[health_education_task],
-            process=Process.sequential
-        )
+# A background answer (from above, or from before a reload) is polled here
+if "job" in st.query_params:
+    st.subheader("🤖 AI Health Educator's Answer:")
+    jobs.st_crew_job(st.query_params["job"], ["📖 Answer"], final=st.write)
 
-        # Execute Crew to get AI response
-        ai_response = health_crew.kickoff()
+# Answer cache counters, enabled on the server with HEALTH_TWIN_ADMIN_VIEW=1. Cached questions are
+# other users' health questions, so they are never shown here (see python -m health_twin.semantic_cache stats)
+if os.getenv("HEALTH_TWIN_ADMIN_VIEW") == "1":
+    from health_twin import semantic_cache
 
-        # Convert CrewOutput to a clean string
-        final_answer = str(ai_response).strip()
+    stats = semantic_cache.get_default().stats(top=0)
+    with st.sidebar.expander("📊 Answer cache", expanded=True):
+        st.metric("Hit rate", f"{stats['hit_rate']:.0%}", help=f"{stats['hits']} of {stats['lookups']} lookups since start")
+        st.metric("Cached answers", stats["entries"])
 
-        # Display AI's response (Only the final answer)
-        st.subheader("🤖 AI Health Educator's Answer:")
-        st.write(final_answer)
+# Timing breakdown of the last request (open the page with ?debug=1)
+telemetry.st_debug_panel()
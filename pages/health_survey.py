@@ -1,9 +1,13 @@
 import streamlit as st
 import json
+from health_twin import warmup
 
 # Set page title
 st.set_page_config(page_title="Health Survey", page_icon="📋", layout="wide")
 
+# The survey needs no heavy libraries; warm them up for the agent pages while the user fills it in
+warmup.start()
+
 st.markdown(
     """
     <style>
@@ -20,6 +24,7 @@ st.sidebar.page_link("pages/health_analysis_agent.py", label="🩺 Health Analys
 st.sidebar.page_link("pages/lifestyle_coach_agent.py", label="🏋️‍♂️ Lifestyle Recommendations")
 st.sidebar.page_link("pages/health_educator.py", label="📖 General Educator")
 st.sidebar.page_link("pages/risk_factor_agent.py", label="⚠️ Risk Factor Detection")
+st.sidebar.page_link("pages/full_assessment.py", label="🧾 Full Assessment")
 st.sidebar.page_link("pages/therapist.py", label="💙 Emotional Support")
 
 # Add a small footer
@@ -114,6 +119,28 @@ if st.button("✅ Submit & Download"):
     if not all([age, gender, height, weight, exercise, sleep, water, diet, alcohol, smoking, stress_level, mental_health]):
         st.error("❌ Please fill in all required fields!")
     else:
+        # Append this snapshot to the user's survey history; trends are updated incrementally
+        from health_twin import assessments, history, report_store
+        from health_twin.profile import HealthProfile
+
+        trends = history.get_default().append(report_store.st_owner(), survey_data)
+        # Open the profile's shared assessment, so the agent pages can use it without an upload
+        assessments.st_open(HealthProfile.from_dict(survey_data).to_dict())
         json_data = json.dumps(survey_data, indent=4)
         st.download_button(label="📂 Download JSON", data=json_data, file_name="health_survey.json", mime="application/json")
         st.success("✅ Survey successfully completed! Download your responses.")
+        if history.trend_summary(trends):
+            st.info(f"📈 {history.trend_summary(trends)}")
+
+# Progress across the surveys submitted from this browser (or by this signed-in user). The
+# history store reads its columns with NumPy, so it is imported only when the chart is asked for
+if st.checkbox("📈 Show my progress across past surveys"):
+    from health_twin import history, report_store
+
+    past = history.get_default().columns(report_store.st_owner())
+    if len(past["time"]) >= 2:
+        st.line_chart(
+            {"Weight (kg)": past["weight"], "Sleep (h)": past["sleep_hours"], "Stress (1-10)": past["stress_level"]}
+        )
+    else:
+        st.caption("Submit the survey at least twice to see your progress.")
@@ -1,79 +1,167 @@
 import os
+from collections import deque
 import streamlit as st
-import fitz  # PyMuPDF for PDF text extraction
-from langchain_community.embeddings import OpenAIEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.chat_models import ChatOpenAI
-from langchain.chains import ConversationalRetrievalChain
-from langchain.memory import ConversationBufferMemory
 from dotenv import load_dotenv
+from health_twin import library, report_store, telemetry, warmup
+from health_twin.pdf_pipeline import file_sha256, iter_pages
 
 load_dotenv()
+# LangChain is imported only once a PDF is processed; warm it up in the background meanwhile
+warmup.start()
+
+# Chunks passed to the LLM per question (see benchmarks/retrieval_bench.py)
+RETRIEVAL_K = int(os.getenv("HEALTH_TWIN_RETRIEVAL_K", 4))
+
+# Conversation memory: recent turns are kept verbatim up to this many tokens and
+# older turns are folded into a running summary. 0 keeps the full, unbounded buffer.
+MEMORY_TOKEN_BUDGET = int(os.getenv("HEALTH_TWIN_CHAT_TOKEN_BUDGET", 1200))
+
+# Chat transcript kept per session, and how many messages are rendered per page
+MAX_STORED_MESSAGES = 500
+HISTORY_PAGE_SIZE = 20
 
 # Streamlit UI
 def main():
     st.set_page_config(page_title="Chat with your PDF", layout="wide")
     st.title("📄 AI PDF Chatbot")
-    
-    # Upload PDF
-    uploaded_file = st.file_uploader("Upload a PDF file", type=["pdf"])
-    
-    if uploaded_file is not None:
-        st.success("File uploaded successfully!")
-        
-        if "pdf_text" not in st.session_state:
-            st.session_state.pdf_text = extract_text_from_pdf(uploaded_file)
-        
-        if st.button("Process PDF and Start Chat"):
-            setup_chatbot()
+    # Documents are kept in this user's library, so earlier uploads are searched too
+    owner = report_store.st_owner()
+
+    # Upload PDFs
+    uploaded_files = st.file_uploader("Upload PDF files", type=["pdf"], accept_multiple_files=True)
+    if uploaded_files:
+        st.success(f"{len(uploaded_files)} file(s) uploaded successfully!")
+        doc_type = st.selectbox("Document type", library.DOCUMENT_TYPES)
+        doc_date = st.date_input("Document date", value=None)
+
+    filters = library_panel(owner)
+
+    if st.button("Process PDFs and Start Chat"):
+        if uploaded_files:
+            add_documents(owner, uploaded_files, doc_type, doc_date)
+        setup_chatbot(owner, filters)
 
     # If chatbot is initialized, show chat interface
     if "qa_chain" in st.session_state:
+        # Deleted documents or a new filter swap the retriever; the conversation is kept
+        refresh_retriever(owner, filters)
         chat_interface()
 
-# Function to extract text from PDF
-def extract_text_from_pdf(uploaded_file):
-    doc = fitz.open(stream=uploaded_file.read(), filetype="pdf")
-    text = "".join(page.get_text("text") for page in doc)
-    return text.strip()
+    # Timing breakdown of the last request (open the page with ?debug=1)
+    telemetry.st_debug_panel()
+
+# Document library: list, delete and filter this user's documents
+def library_panel(owner):
+    documents = library.get_default().documents(owner)
+    if not documents:
+        return {}
+    with st.expander(f"🗂️ My documents ({len(documents)})"):
+        for doc in documents:
+            col1, col2 = st.columns([12, 1])
+            col1.write(f"**{doc['name']}** · {doc['doc_type']} · {doc['doc_date'] or 'undated'} · {doc['chunks']} chunks")
+            if col2.button("🗑️", key=f"delete_{doc['doc_id']}"):
+                library.get_default().delete(owner, doc["doc_id"])
+                st.rerun()
+    doc_types = st.multiselect("Search only these document types", sorted({doc["doc_type"] for doc in documents}))
+    dates = st.date_input("Search only documents dated between", value=())
+    since, until = (dates[0], dates[-1]) if len(dates) == 2 else (None, None)
+    return {"doc_types": doc_types or None, "since": since, "until": until}
+
+# Add uploaded PDFs to the library; only new documents are split and embedded
+def add_documents(owner, uploaded_files, doc_type, doc_date):
+    with st.spinner("Processing PDFs... Please wait."), telemetry.st_request("pdf_index"):
+        progress = st.empty()
+        for uploaded_file in uploaded_files:
+            # Pages stream from extraction into the splitter and embedder, so indexing
+            # starts before the last page is read and only a window of pages is held
+            doc_id = library.get_default().add(
+                owner,
+                iter_pages(uploaded_file),
+                uploaded_file.name,
+                doc_type,
+                doc_date,
+                content_hash=file_sha256(uploaded_file),
+                on_progress=lambda n, name=uploaded_file.name: progress.caption(f"{name}: indexed {n} chunks..."),
+            )
+            if doc_id is None:
+                st.error(f"No text could be extracted from {uploaded_file.name}.")
+        progress.empty()
+
+def library_retriever(owner, filters):
+    # Exact-term questions are answered from BM25 without embedding the query; the retriever
+    # is reused until this user's documents change
+    return library.get_default().retriever(owner, k=RETRIEVAL_K, **filters)
+
+def refresh_retriever(owner, filters):
+    retriever = library_retriever(owner, filters)
+    if st.session_state.qa_chain.retriever is not retriever:
+        st.session_state.qa_chain.retriever = retriever
 
 # Setup Chatbot Function
-def setup_chatbot():
-    with st.spinner("Processing PDF... Please wait."):
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-        text_chunks = text_splitter.split_text(st.session_state.pdf_text)
+def setup_chatbot(owner, filters):
+    from langchain.chains import ConversationalRetrievalChain
+    from health_twin import gateway
 
-        embeddings = OpenAIEmbeddings()
-        vector_store = FAISS.from_texts(text_chunks, embeddings)
-        retriever = vector_store.as_retriever()
-        memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
+    if not library.get_default().documents(owner, **filters):
+        st.error("⚠️ Please upload a PDF (or widen the document filters).")
+        return
+
+    with st.spinner("Preparing chat... Please wait."), telemetry.st_request("pdf_chat_setup"):
+        retriever = library_retriever(owner, filters)
+
+        # Shares the process-wide LLM limits with the crews; chat turns go in the interactive lane
+        llm = gateway.chat_openai(model="gpt-3.5-turbo", temperature=0, callbacks=[telemetry.langchain_callback()])
+        memory = build_memory(llm)
 
         st.session_state.qa_chain = ConversationalRetrievalChain.from_llm(
-            llm=ChatOpenAI(model="gpt-3.5-turbo", temperature=0),
+            llm=llm,
             retriever=retriever,
             memory=memory
         )
     
     st.success("Chatbot is ready! Start asking questions.")
 
+# Memory Function
+def build_memory(llm):
+    from langchain.memory import ConversationBufferMemory, ConversationSummaryBufferMemory
+
+    if MEMORY_TOKEN_BUDGET <= 0:
+        return ConversationBufferMemory(memory_key="chat_history", return_messages=True)
+    # Pruned turns are merged into the existing summary one step at a time, so the
+    # question-condensing prompt stays within the budget however long the chat runs
+    return ConversationSummaryBufferMemory(
+        llm=llm,
+        max_token_limit=MEMORY_TOKEN_BUDGET,
+        memory_key="chat_history",
+        return_messages=True
+    )
+
 # Chat Interface Function
 def chat_interface():
-    st.subheader("💬 Chat with your PDF")
+    st.subheader("💬 Chat with your documents")
 
     if "chat_history" not in st.session_state:
-        st.session_state.chat_history = []
+        st.session_state.chat_history = deque(maxlen=MAX_STORED_MESSAGES)
+        st.session_state.history_shown = HISTORY_PAGE_SIZE
 
-    # Display previous chat messages
-    for msg in st.session_state.chat_history:
+    # Display previous chat messages, newest page only; older pages load on demand
+    history = st.session_state.chat_history
+    shown = min(st.session_state.history_shown, len(history))
+    if shown < len(history):
+        if st.button(f"⬆️ Show earlier messages ({len(history) - shown} hidden)"):
+            st.session_state.history_shown += HISTORY_PAGE_SIZE
+            st.rerun()
+    for index in range(len(history) - shown, len(history)):
+        msg = history[index]
         st.chat_message(msg["role"]).write(msg["content"])
 
     # User input
-    user_input = st.chat_input("Ask something about the PDF...")
+    user_input = st.chat_input("Ask something about your documents...")
     if user_input:
         st.chat_message("user").write(user_input)
 
-        response = st.session_state.qa_chain({"question": user_input})
+        with telemetry.st_request("pdf_chat"), telemetry.span("qa_chain"):
+            response = st.session_state.qa_chain({"question": user_input})
         bot_reply = response["answer"]
 
         st.chat_message("assistant").write(bot_reply)
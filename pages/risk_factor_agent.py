@@ -1,10 +1,13 @@
 import streamlit as st
-import json
-from crewai import Agent, Task, Crew, Process
 from dotenv import load_dotenv
+from health_twin import assessments, jobs, report_store, telemetry, warmup
+from health_twin.crews import fused_risk_task_specs, incremental_task_specs, risk_task_specs
+from health_twin.profile import HealthProfile, ProfileError, parse_profile
 
 # Load environment variables
 load_dotenv()
+# Import CrewAI and build the agents in the background, once per server process
+warmup.start()
 
 
 # Step 1: Set up Streamlit UI
@@ -26,6 +29,7 @@ st.sidebar.page_link("pages/health_analysis_agent.py", label="🩺 Health Analys
 st.sidebar.page_link("pages/lifestyle_coach_agent.py", label="🏋️‍♂️ Lifestyle Recommendations")
 st.sidebar.page_link("pages/health_educator.py", label="📖 General Educator")
 st.sidebar.page_link("pages/risk_factor_agent.py", label="⚠️ Risk Factor Detection")
+st.sidebar.page_link("pages/full_assessment.py", label="🧾 Full Assessment")
 st.sidebar.page_link("pages/therapist.py", label="💙 Emotional Support")
 
 # Add a small footer
@@ -40,79 +44,74 @@ st.write("Upload your health data file (JSON format), and the AI will analyze po
 
 # Step 2: File Upload for Health Data
 uploaded_file = st.file_uploader("📄 Upload your Health Data file (JSON format):", type=["json"])
-
-# Step 3: Define the Risk Assessment Agent
-risk_assessment_agent = Agent(
-    role="Health Risk Specialist",
-    goal="Analyze patient health data and predict potential future risks.",
-    backstory="An AI-powered medical expert trained to identify potential health risks based on current health metrics, medical history, and lifestyle habits.",
-    verbose=False,
-    memory=True
-)
-
-# Step 4: Define the Preventive Care Agent
-preventive_care_agent = Agent(
-    role="Preventive Health Advisor",
-    goal="Recommend proactive health measures to reduce future risks.",
-    backstory="An AI-driven preventive care expert specializing in early disease prevention through lifestyle modifications and routine monitoring.",
-    verbose=False,
-    memory=True
-)
-
-# Step 5: Process File Upload & AI Analysis
+stream_output = st.checkbox("⚡ Show the assessment as it is generated", value=True)
+fused_mode = st.checkbox("🧩 Fused mode: risks and preventive care in one structured AI call (faster)", value=False)
+local_low_risk = st.checkbox("🧮 Answer clearly low-risk profiles instantly without AI", value=True)
+
+# Step 3: Process File Upload & AI Analysis
+# Agents come from the shared registry; identical profiles are served from the result cache
+# A profile opened on another page (survey, analysis, full assessment) needs no new upload
+current_assessment = assessments.st_current()
+if uploaded_file is None and current_assessment is not None:
+    st.caption("📋 Using the profile from your current assessment. Upload a file to assess another one.")
 if st.button("🔬 Analyze Future Health Risks"):
-    if uploaded_file is None:
+    if uploaded_file is None and current_assessment is None:
         st.error("⚠️ Please upload a valid JSON health data file.")
     else:
-        # Read JSON file contents
-        health_data = json.load(uploaded_file)
-
-        # Define AI Tasks
-        risk_analysis_task = Task(
-            description=f"""
-            Based on the patient's health data, analyze and outline possible future health risks.
-            Consider the following factors:
-            - Age: {health_data["age"]}, Gender: {health_data["gender"]}
-            - Height: {health_data["height"]} cm, Weight: {health_data["weight"]} kg
-            - Sleep: {health_data["sleep"]} hours, Water Intake: {health_data["water"]} glasses
-            - Exercise: {health_data["exercise"]}, Diet: {health_data["diet"]}
-            - Alcohol: {health_data["alcohol"]}, Smoking: {health_data["smoking"]}
-            - Chronic Conditions: {', '.join(health_data["chronic_conditions"])}
-            - Family History: {', '.join(health_data["family_history"])}
-            - Stress Level: {health_data["stress_level"]}/10, Mental Health: {health_data["mental_health"]}
-            - Medications: {', '.join([med['name'] for med in health_data['medications']])}
-            - Supplements: {', '.join(health_data['supplements'])}
-            - Health Goals: {', '.join(health_data['health_goals'])}
-
-            Predict potential future health risks based on trends in their data.
-            Identify diseases or conditions they may be susceptible to over time.
-            """,
-            expected_output="A detailed health risk assessment report listing potential future health risks and explanations.",
-            agent=risk_assessment_agent
-        )
-
-        preventive_care_task = Task(
-            description="""
-            Based on the predicted health risks, provide actionable preventive measures.
-            Suggest lifestyle adjustments, dietary improvements, medical check-ups, and fitness routines
-            to reduce the likelihood of future health issues.
-            """,
-            expected_output="A structured preventive care guide with clear steps to reduce health risks.",
-            agent=preventive_care_agent
-        )
-
-        # Create and Run the Crew
-        healthcare_crew = Crew(
-            agents=[risk_assessment_agent, preventive_care_agent],
-            tasks=[risk_analysis_task, preventive_care_task],
-            process=Process.sequential  # Tasks execute one after another
-        )
-
-        final_response = healthcare_crew.kickoff(inputs={"health_data": health_data})
-
-        # Convert CrewOutput to string
-        health_risk_report = str(final_response)
-
-        # Display AI Health Risk Assessment
-        st.subheader("🩺 AI Health Risk Prediction:")
-        st.write(health_risk_report)
+        # Parse and validate the upload once (cached by file hash)
+        try:
+            if uploaded_file is not None:
+                profile = parse_profile(uploaded_file.getvalue())
+            else:
+                profile = HealthProfile.from_dict(current_assessment["profile"])
+        except ProfileError as exc:
+            st.error(f"⚠️ {exc}")
+            st.stop()
+        # A new request replaces the background run shown from an earlier one
+        st.query_params.pop("job", None)
+        # The profile's shared assessment: its metrics, and the base analysis when another page
+        # produced it, so the risk specialist builds on it instead of starting over
+        assessment = assessments.st_open(profile.to_dict())
+
+        # Rule-based pre-score (computed once per profile, in the assessment); clearly
+        # low-risk profiles don't need an LLM call
+        from health_twin.scoring import low_risk_report
+
+        risk_score = assessment["metrics"]
+
+        # Run the Crew (cached on the canonical profile, task definitions and model)
+        # and display AI Health Risk Assessment
+        if fused_mode:
+            known, task_specs = [], fused_risk_task_specs(profile)
+        else:
+            known, task_specs = incremental_task_specs(risk_task_specs(profile), assessment["findings"], assessment["bases"])
+        with telemetry.st_request("risk_assessment"):
+            if local_low_risk and risk_score["low_risk"]:
+                health_risk_report = low_risk_report(risk_score)
+                st.subheader("🩺 Health Risk Prediction:")
+                st.write(health_risk_report)
+            elif not task_specs:
+                st.subheader("🩺 AI Health Risk Prediction:")
+                assessments.st_show(assessment["findings"], known)
+            else:
+                # Runs on the background workers and is polled below, so no script thread waits on the crew;
+                # a streamed run shows its text as it is generated (a fused answer is one JSON object,
+                # so it is never streamed)
+                st.query_params["job"] = jobs.get_default().submit(
+                    "crew",
+                    {
+                        "tasks": task_specs,
+                        "profile": profile.to_dict(),
+                        "known": [[name, assessment["findings"][name]] for name in known],
+                        "stream": stream_output and not fused_mode,
+                    },
+                    report_store.st_owner()
+                )
+
+# A background run (from above, or from before a reload) is polled here
+if "job" in st.query_params:
+    st.subheader("🩺 AI Health Risk Prediction:")
+    jobs.st_crew_job(st.query_params["job"], ["⚠️ Risk Assessment", "🛡️ Preventive Care Guide"], final=st.write)
+
+# Timing breakdown of the last request (open the page with ?debug=1)
+telemetry.st_debug_panel()
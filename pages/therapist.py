@@ -1,9 +1,11 @@
 import streamlit as st
-from crewai import Agent, Task, Crew, Process
 from dotenv import load_dotenv
+from health_twin import jobs, report_store, sessions, telemetry, warmup
 
 # Load environment variables
 load_dotenv()
+# Import CrewAI and build the agents in the background, once per server process
+warmup.start()
 
 # Step 1: Set up Streamlit UI
 st.set_page_config(page_title="AI Therapist", layout="wide")
@@ -24,6 +26,7 @@ st.sidebar.page_link("pages/health_analysis_agent.py", label="🩺 Health Analys
 st.sidebar.page_link("pages/lifestyle_coach_agent.py", label="🏋️‍♂️ Lifestyle Recommendations")
 st.sidebar.page_link("pages/health_educator.py", label="📖 General Educator")
 st.sidebar.page_link("pages/risk_factor_agent.py", label="⚠️ Risk Factor Detection")
+st.sidebar.page_link("pages/full_assessment.py", label="🧾 Full Assessment")
 st.sidebar.page_link("pages/therapist.py", label="💙 Emotional Support")
 
 # Add a small footer
@@ -36,46 +39,45 @@ with col2:
 st.title("🧠 AI Therapist - Your Virtual Mental Health Companion")
 st.write("Chat with a friendly, non-judgmental AI therapist about stress, motivation, and well-being.")
 
-# Step 2: Define the AI Therapist Agent
-therapist_agent = Agent(
-    role="AI Therapist",
-    goal="Provide empathetic, supportive, and helpful mental health conversations.",
-    backstory=(
-        "You are a compassionate and understanding AI therapist. You provide emotional support, "
-        "help users manage stress, and encourage self-care practices. You are not a substitute for a professional therapist, "
-        "but you offer thoughtful advice and encouragement."
-    ),
-    verbose=False,  # Ensures a clean, conversational experience
-    memory=True  # Enables conversational flow and remembering past responses
-)
+# Step 2: Conversation state
+# Recent turns and a rolling summary live in a server-side session that survives reruns
+if "therapist_session_id" not in st.session_state:
+    st.session_state.therapist_session_id = sessions.new_session_id()
+session = sessions.get_session(st.session_state.therapist_session_id)
+
+history = session.history()
+if history:
+    with st.expander(f"🗂️ Earlier in this conversation ({session.turns} messages so far)"):
+        for previous_message, previous_reply in history:
+            st.markdown(f"**You:** {previous_message}")
+            st.markdown(f"**AI Therapist:** {previous_reply}")
+    if st.button("🧹 Start a new conversation"):
+        sessions.end_session(st.session_state.therapist_session_id)
+        del st.session_state.therapist_session_id
+        st.query_params.pop("job", None)
+        st.rerun()
 
 # Step 3: Chat Interface for User Conversations
 user_input = st.text_input("💬 Share your thoughts or ask for advice:")
+stream_output = st.checkbox("⚡ Show the response as it is generated", value=True)
 
 if st.button("🗣️ Talk to AI Therapist"):
     if user_input.strip() == "":
         st.warning("⚠️ Please enter something to start the conversation.")
     else:
-        # Define AI Task
-        therapy_session_task = Task(
-            description=f"Engage in a supportive, empathetic conversation. The user says: {user_input}",
-            expected_output="A warm, thoughtful, and encouraging response that fosters emotional well-being.",
-            agent=therapist_agent
-        )
-
-        # Create a Crew with the AI Therapist
-        therapy_crew = Crew(
-            agents=[therapist_agent],
-            tasks=[therapy_session_task],
-            process=Process.sequential
-        )
-
-        # Execute Crew to get AI response
-        ai_response = therapy_crew.kickoff()
+        # A pooled session crew answers on the background workers and the reply is polled below,
+        # so no script thread waits on the crew
+        with telemetry.st_request("therapist"):
+            st.query_params["job"] = jobs.get_default().submit(
+                "therapist_turn",
+                {"session": session.session_id, "message": user_input, "stream": stream_output},
+                report_store.st_owner()
+            )
 
-        # Convert CrewOutput to a clean string
-        final_answer = str(ai_response).strip()
+# The reply in progress (or the last one) is polled here
+if "job" in st.query_params:
+    st.subheader("🤖 AI Therapist's Response:")
+    jobs.st_crew_job(st.query_params["job"], ["💙 Response"], final=st.write)
 
-        # Display AI's response
-        st.subheader("🤖 AI Therapist's Response:")
-        st.write(final_answer)
+# Timing breakdown of the last request (open the page with ?debug=1)
+telemetry.st_debug_panel()
@@ -0,0 +1,10 @@
+"""Keep the suite offline: hashing embeddings, no agent memory and a throwaway cache directory."""
+import os
+import tempfile
+
+# Read at import time by health_twin modules, so set before any test imports them
+os.environ.setdefault("HEALTH_TWIN_CACHE_DIR", tempfile.mkdtemp(prefix="health_twin_tests_"))
+os.environ.setdefault("HEALTH_TWIN_TRACE_LOG", "")
+os.environ.setdefault("HEALTH_TWIN_EMBEDDINGS", "hashing")
+os.environ.setdefault("HEALTH_TWIN_AGENT_MEMORY", "0")
+os.environ.setdefault("HEALTH_TWIN_STREAM_LLM", "0")
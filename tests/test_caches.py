@@ -0,0 +1,65 @@
+import time
+
+import pytest
+
+from health_twin.embeddings import HashingEmbeddings
+from health_twin.result_cache import ResultCache
+from health_twin.semantic_cache import SemanticCache
+
+
+class Clock:
+    def __init__(self, monkeypatch):
+        self.now = 1_000_000.0
+        monkeypatch.setattr(time, "time", lambda: self.now)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    return Clock(monkeypatch)
+
+
+def test_result_cache_expires_entries(tmp_path, clock):
+    cache = ResultCache(str(tmp_path / "results.sqlite3"), ttl=60)
+    cache.put("k", "v")
+    clock.now += 30
+    assert cache.get("k") == "v"
+    clock.now += 31
+    assert cache.get("k") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_result_cache_evicts_least_recently_used(tmp_path, clock):
+    cache = ResultCache(str(tmp_path / "results.sqlite3"), ttl=0, max_entries=2)
+    cache.put("a", "1")
+    clock.now += 1
+    cache.put("b", "2")
+    clock.now += 1
+    assert cache.get("a") == "1"
+    clock.now += 1
+    cache.put("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.get("c") == "3"
+
+
+def test_semantic_cache_expires_entries(tmp_path, clock):
+    cache = SemanticCache(str(tmp_path / "semantic.sqlite3"), HashingEmbeddings(), threshold=0.5, ttl=60)
+    cache.put("What is a healthy BMI?", "18.5 to 25")
+    assert cache.lookup("What is a healthy BMI?")[0] == "18.5 to 25"
+    clock.now += 61
+    assert cache.lookup("What is a healthy BMI?") is None
+    assert not cache.contains("What is a healthy BMI?")
+
+
+def test_semantic_cache_evicts_least_recently_used(tmp_path, clock):
+    cache = SemanticCache(str(tmp_path / "semantic.sqlite3"), HashingEmbeddings(), ttl=0, max_entries=2)
+    cache.put("How much water should I drink?", "About 2L")
+    clock.now += 1
+    cache.put("How long should I sleep?", "7-9 hours")
+    clock.now += 1
+    assert cache.lookup("How much water should I drink?") is not None
+    clock.now += 1
+    cache.put("How often should I exercise?", "3-5 times a week")
+    assert not cache.contains("How long should I sleep?")
+    assert cache.contains("How much water should I drink?")
+    assert cache.stats()["entries"] == 2
@@ -0,0 +1,78 @@
+import threading
+
+import pytest
+
+from health_twin.gateway import Gateway
+
+
+def unlimited():
+    return Gateway(rpm=0, tpm=0, concurrency=0)
+
+
+def run_concurrently(gateway, keys, fn):
+    """Start ``gateway.call`` for every key, hold the leaders until all callers joined; returns the outcomes."""
+    started = threading.Event()
+    release = threading.Event()
+    outcomes = [None] * len(keys)
+
+    def leader_fn():
+        started.set()
+        release.wait(5)
+        return fn()
+
+    def call(index):
+        try:
+            outcomes[index] = ("ok", gateway.call(keys[index], leader_fn, tokens=10))
+        except Exception as exc:
+            outcomes[index] = ("error", exc)
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(len(keys))]
+    threads[0].start()
+    assert started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    # Followers register under the gateway's lock before blocking on the leader's result
+    while gateway.calls + gateway.coalesced < len(keys):
+        threading.Event().wait(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    return outcomes
+
+
+def test_identical_calls_run_once():
+    gateway = unlimited()
+    runs = []
+    outcomes = run_concurrently(gateway, ["same"] * 4, lambda: runs.append(1) or "answer")
+    assert runs == [1]
+    assert outcomes == [("ok", "answer")] * 4
+    assert gateway.calls == 1 and gateway.coalesced == 3
+
+
+def test_different_keys_each_run():
+    gateway = unlimited()
+    runs = []
+    gateway.call("a", lambda: runs.append("a") or "A", tokens=10)
+    gateway.call("b", lambda: runs.append("b") or "B", tokens=10)
+    assert runs == ["a", "b"]
+    assert gateway.calls == 2 and gateway.coalesced == 0
+
+
+def test_finished_call_is_not_reused():
+    gateway = unlimited()
+    assert gateway.call("k", lambda: 1, tokens=10) == 1
+    assert gateway.call("k", lambda: 2, tokens=10) == 2
+
+
+def test_leader_error_reaches_followers():
+    gateway = unlimited()
+
+    def fail():
+        raise RuntimeError("provider down")
+
+    outcomes = run_concurrently(gateway, ["same"] * 3, fail)
+    assert [kind for kind, _ in outcomes] == ["error"] * 3
+    assert all(str(exc) == "provider down" for _, exc in outcomes)
+    assert gateway.stats()["active"] == 0
+    with pytest.raises(ValueError):
+        gateway.call("same", lambda: (_ for _ in ()).throw(ValueError("again")), tokens=10)
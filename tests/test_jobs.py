@@ -0,0 +1,82 @@
+import threading
+import time
+
+import pytest
+
+from health_twin import jobs
+
+release = threading.Event()
+
+
+@jobs.runner("test_echo")
+def _echo(payload, job):
+    release.wait(5)
+    return payload["text"]
+
+
+@pytest.fixture
+def queue(tmp_path):
+    release.clear()
+    yield jobs.JobQueue(str(tmp_path / "jobs.sqlite3"), workers=1, ttl=60)
+    release.set()
+
+
+def test_identical_payloads_share_a_job(queue):
+    first = queue.submit("test_echo", {"text": "hi"}, owner="alice")
+    second = queue.submit("test_echo", {"text": "hi"}, owner="bob")
+    other = queue.submit("test_echo", {"text": "bye"}, owner="alice")
+    assert first == second
+    assert other != first
+    assert queue._owners(first) == ["alice", "bob"]
+
+    release.set()
+    assert queue.wait(first, timeout=5)["result"] == "hi"
+    # A finished job is not reused; the next submit runs again
+    assert queue.submit("test_echo", {"text": "hi"}, owner="alice") != first
+
+
+def test_cancel_keeps_job_while_a_subscriber_waits(queue):
+    job_id = queue.submit("test_echo", {"text": "hi"}, owner="alice")
+    queue.submit("test_echo", {"text": "hi"}, owner="bob")
+    assert queue.cancel(job_id, owner="alice") in jobs.ACTIVE
+    release.set()
+    assert queue.wait(job_id, timeout=5)["status"] == "done"
+
+
+def test_unknown_kind_is_rejected(queue):
+    with pytest.raises(ValueError):
+        queue.submit("no_such_kind", {})
+
+
+def test_stale_running_job_is_requeued(tmp_path):
+    # No workers: claim by hand, as a server that then went away would have
+    queue = jobs.JobQueue(str(tmp_path / "jobs.sqlite3"), workers=0, ttl=60)
+    job_id = queue.submit("test_echo", {"text": "hi"}, owner="alice")
+    assert queue._claim()[0] == job_id
+    queue._running.discard(job_id)
+
+    queue.maintain()
+    assert queue.get(job_id)["status"] == "running"
+    queue.maintain(now=time.time() + 4 * jobs.HEARTBEAT)
+    assert queue.get(job_id)["status"] == "queued"
+
+
+def test_heartbeat_keeps_own_running_jobs(tmp_path):
+    queue = jobs.JobQueue(str(tmp_path / "jobs.sqlite3"), workers=0, ttl=60)
+    job_id = queue.submit("test_echo", {"text": "hi"}, owner="alice")
+    queue._claim()
+    later = time.time() + 4 * jobs.HEARTBEAT
+    queue.maintain(now=later - jobs.HEARTBEAT)
+    queue.maintain(now=later)
+    assert queue.get(job_id)["status"] == "running"
+
+
+def test_finished_jobs_expire_after_ttl(queue):
+    job_id = queue.submit("test_echo", {"text": "hi"}, owner="alice")
+    release.set()
+    queue.wait(job_id, timeout=5)
+    queue.maintain()
+    assert queue.get(job_id) is not None
+    queue.maintain(now=time.time() + 61)
+    assert queue.get(job_id) is None
+    assert queue._owners(job_id) == []
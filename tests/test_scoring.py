@@ -0,0 +1,99 @@
+import math
+
+import numpy as np
+import pytest
+
+from benchmarks.corpus import sample_profile
+from health_twin import scoring
+
+
+def reference_score(profile):
+    """The scoring rules written out one profile at a time, as plain Python."""
+    unknown = False
+    lifestyle = 0
+    for key, table in scoring.LIFESTYLE_FIELDS:
+        value = str(profile.get(key, ""))
+        points = table.get(value, -1)
+        if points < 0 and key == "sleep":
+            points = scoring._sleep_hours_points(value)
+        if points < 0:
+            unknown = True
+        else:
+            lifestyle += points
+    stress = profile.get("stress_level", "")
+    if stress in ("", None):
+        unknown, stress = True, 5
+    lifestyle += 0 if stress < 4 else 1 if stress < 7 else 2
+
+    height, weight = profile.get("height", ""), profile.get("weight", "")
+    bmi = weight / (height / 100) ** 2 if height not in ("", None) and weight not in ("", None) and height > 0 else None
+    if bmi is None:
+        bmi_class = 4
+    else:
+        bmi_class = 0 if bmi < 18.5 else 1 if bmi < 25 else 2 if bmi < 30 else 3
+    bmi_points = [1, 0, 1, 3, 0][bmi_class]
+
+    age = profile.get("age", "")
+    age = 0 if age in ("", None) else age
+    age_points = 0 if age < 40 else 1 if age < 55 else 2 if age < 70 else 3
+
+    def listed(value):
+        return "|".join(value) if isinstance(value, (list, tuple)) else str(value)
+
+    chronic = [c for c in scoring.CONDITIONS if c in listed(profile.get("chronic_conditions", ""))]
+    family = [c for c in scoring.CONDITIONS if c.lower() in listed(profile.get("family_history", "")).lower()]
+    total = lifestyle + bmi_points + age_points + 3 * len(chronic) + len(family)
+    tier = 0 if total < 4 else 1 if total < 10 else 2
+    return {
+        "bmi": None if bmi is None else round(bmi, 1),
+        "bmi_class": str(scoring.BMI_CLASSES[bmi_class]),
+        "lifestyle_score": lifestyle,
+        "chronic_conditions": chronic,
+        "family_history": family,
+        "total_score": total,
+        "risk_tier": str(scoring.RISK_TIERS[tier]),
+        "low_risk": tier == 0 and not chronic and bmi_class == 1 and not unknown,
+        "incomplete": unknown,
+    }
+
+
+def edge_profiles():
+    base = sample_profile(0)
+    return [
+        dict(base, sleep="6.5"),
+        dict(base, sleep="4"),
+        dict(base, sleep="10"),
+        dict(base, sleep="lots"),
+        dict(base, stress_level=""),
+        dict(base, height="", weight=""),
+        dict(base, age=""),
+        dict(base, age=40, stress_level=4),
+        dict(base, age=70, stress_level=7),
+        dict(base, chronic_conditions=["diabetes"], family_history=["HEART DISEASE"]),
+        dict(base, chronic_conditions="Diabetes, Hypertension", family_history="None"),
+        {"age": 30, "height": 175, "weight": 70, "exercise": "Daily", "sleep": "7-9", "water": "More than 2L",
+         "diet": "Balanced", "alcohol": "No", "smoking": "No", "mental_health": "No", "stress_level": 2,
+         "chronic_conditions": ["None"], "family_history": ["None"]},
+    ]
+
+
+COHORT = [sample_profile(seed) for seed in range(200)] + edge_profiles()
+
+
+@pytest.mark.parametrize("index", range(len(COHORT)))
+def test_score_profile_matches_reference(index):
+    profile = COHORT[index]
+    assert scoring.score_profile(profile) == reference_score(profile)
+
+
+def test_cohort_scores_match_single_profiles():
+    scores = scoring.score_columns(scoring.profiles_to_columns(COHORT))
+    for i, profile in enumerate(COHORT):
+        single = scoring.score_profile(profile)
+        bmi = float(scores["bmi"][i])
+        assert (None if math.isnan(bmi) else bmi) == single["bmi"]
+        assert int(scores["total_score"][i]) == single["total_score"]
+        assert str(scoring.RISK_TIERS[scores["risk_tier"][i]]) == single["risk_tier"]
+        assert bool(scores["low_risk"][i]) == single["low_risk"]
+    assert np.any(scores["low_risk"])
+    assert set(scores["risk_tier"].tolist()) == {0, 1, 2}
@@ -0,0 +1,49 @@
+import pytest
+
+from health_twin.embeddings import HashingEmbeddings
+from health_twin.semantic_cache import SemanticCache, guard_terms, normalize_question
+
+
+def terms(question):
+    return guard_terms(normalize_question(question))
+
+
+@pytest.mark.parametrize("cached, asked", [
+    ("Can I take ibuprofen with food?", "Can I take ibuprofen without food?"),
+    ("Can I exercise after eating?", "Can't I exercise after eating?"),
+    ("Should I eat sugar?", "Should I never eat sugar?"),
+    ("Is 5 mg of melatonin safe?", "Is 10 mg of melatonin safe?"),
+    ("Is 5 mg of melatonin safe?", "Is 50 mg of melatonin safe?"),
+])
+def test_guard_terms_differ(cached, asked):
+    assert terms(cached) != terms(asked)
+
+
+def test_guard_terms_ignore_wording():
+    assert terms("Is 5 mg of melatonin safe?") == terms("is 5 MG melatonin safe for me")
+    assert terms("Why can't I sleep?") == terms("why cant I sleep")
+
+
+@pytest.fixture
+def cache(tmp_path):
+    # A threshold low enough that only the guard terms can turn a lookup away
+    cache = SemanticCache(str(tmp_path / "semantic.sqlite3"), HashingEmbeddings(), threshold=0.3)
+    cache.put("Can I take ibuprofen with food?", "Yes, with food is best.")
+    cache.put("Is 5 mg of melatonin safe?", "5 mg is a common dose.")
+    return cache
+
+
+@pytest.mark.parametrize("asked", [
+    "Can I take ibuprofen without food?",
+    "Can't I take ibuprofen with food?",
+    "Is 10 mg of melatonin safe?",
+    "Is 5 mg of melatonin safe twice, 2 nights in a row?",
+])
+def test_lookup_rejects_negation_and_number_mismatches(cache, asked):
+    assert cache.lookup(asked) is None
+
+
+def test_lookup_accepts_rephrasing_with_same_terms(cache):
+    found = cache.lookup("is it ok to take ibuprofen with food")
+    assert found is not None and found[0] == "Yes, with food is best."
+    assert cache.lookup("Is 5 mg melatonin safe for adults?")[0] == "5 mg is a common dose."